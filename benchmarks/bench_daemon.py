@@ -0,0 +1,174 @@
+import argparse
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+ROLES = ["web", "api", "worker", "db", "cache"]
+
+
+def write_config(workdir: Path, count: int, args) -> Path:
+    playbooks = workdir / "playbooks"
+    playbooks.mkdir()
+    rules = [{"name": "base", "playbook": str(playbooks / "base.yml")}]
+    (playbooks / "base.yml").write_text("- hosts: all\n  tasks: []\n")
+    groups = {}
+    for role in ROLES:
+        (playbooks / f"{role}.yml").write_text("- hosts: all\n  tasks: []\n")
+        rules.append({"name": f"{role}-app", "playbook": str(playbooks / f"{role}.yml")})
+        groups[role] = {"match": {"role": role}, "rules": ["base", f"{role}-app"]}
+    config = {
+        "daemon": {
+            "state_file": str(workdir / "state.json"),
+            "log_dir": str(workdir / "logs"),
+            "interval": 0,
+            "max_retries": 3,
+            "executor": "fake",
+            "ui": False,
+            "fake_duration": args.duration,
+            "fake_duration_distribution": args.distribution,
+            "fake_failure_rate": args.failure_rate,
+            "fake_seed": 1,
+            "fact_cache_ttl": 0,
+            "state_flush_interval": args.state_flush_interval,
+        },
+        "detectors": {
+            "synthetic": {
+                "count": count,
+                "churn": args.churn,
+                "tag_churn": args.tag_churn,
+                "seed": 1,
+            }
+        },
+        "rules": rules,
+        "groups": groups,
+    }
+    path = workdir / "config.yml"
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+
+def settled(state) -> bool:
+    from ansible_autoprovisioner.state import InstanceStatus
+
+    busy = (InstanceStatus.PENDING, InstanceStatus.RUNNING)
+    return not any(i.overall_status in busy for i in state.get_instances())
+
+
+def run_single(count: int, args) -> dict:
+    from ansible_autoprovisioner.config import DaemonConfig
+    from ansible_autoprovisioner.daemon import ProvisioningDaemon
+    from ansible_autoprovisioner.state import InstanceStatus
+
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        config = DaemonConfig.load(str(write_config(Path(tmp), count, args)))
+        config.validate()
+        daemon = ProvisioningDaemon(config)
+        loops = []
+        start = time.perf_counter()
+        deadline = start + args.timeout
+        timed_out = False
+        while True:
+            loop_start = time.perf_counter()
+            daemon.run_once()
+            loops.append(time.perf_counter() - loop_start)
+            if len(loops) >= args.min_loops and settled(daemon.state):
+                break
+            if time.perf_counter() > deadline:
+                timed_out = True
+                break
+            time.sleep(args.loop_pause)
+        elapsed = time.perf_counter() - start
+        daemon.executor.shutdown()
+        instances = daemon.state.get_instances()
+        done = sum(1 for i in instances if i.overall_status == InstanceStatus.SUCCESS)
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            max_rss //= 1024
+        return {
+            "instances": count,
+            "provisioned": done,
+            "timed_out": timed_out,
+            "elapsed_sec": round(elapsed, 3),
+            "hosts_per_sec": round(done / elapsed, 2) if elapsed else None,
+            "loops": len(loops),
+            "loop_p50_sec": round(statistics.median(loops), 4),
+            "loop_max_sec": round(max(loops), 4),
+            "playbook_runs": daemon.executor.runs,
+            "state_writes": daemon.state.writes,
+            "state_bytes_written": daemon.state.bytes_written,
+            "state_write_sec": round(daemon.state.write_seconds, 3),
+            "state_write_ms_avg": round(
+                daemon.state.write_seconds * 1000 / max(1, daemon.state.writes), 3
+            ),
+            "state_write_share": (round(daemon.state.write_seconds / elapsed, 3)
+                                  if elapsed else None),
+            "state_file_bytes": os.path.getsize(config.state_file),
+            "max_rss_kb": max_rss,
+        }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="End-to-end daemon throughput benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--duration", type=float, default=0.0, help="Mean fake playbook seconds")
+    parser.add_argument("--distribution", default="fixed",
+                        choices=["fixed", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--churn", type=float, default=0.0, help="Hosts replaced per loop")
+    parser.add_argument("--tag-churn", type=float, default=0.0, help="Hosts retagged per loop")
+    parser.add_argument("--state-flush-interval", type=float, default=1.0,
+                        help="daemon.state_flush_interval; 0 rewrites state on every change")
+    parser.add_argument("--min-loops", type=int, default=2)
+    parser.add_argument("--loop-pause", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds allowed per size")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines only")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(args.single, args)))
+        return 0
+
+    for size in args.sizes:
+        cmd = [sys.executable, __file__, "--single", str(size)] + [
+            a for a in sys.argv[1:] if a != "--json"
+        ]
+        if "--sizes" in cmd:
+            i = cmd.index("--sizes")
+            j = i + 1
+            while j < len(cmd) and not cmd[j].startswith("--"):
+                j += 1
+            del cmd[i:j]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            return proc.returncode
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(
+                f"{result['instances']:>7} hosts  {result['hosts_per_sec']:>9} hosts/s  "
+                f"loop p50 {result['loop_p50_sec']:.4f}s max {result['loop_max_sec']:.4f}s  "
+                f"state {result['state_writes']} writes / "
+                f"{result['state_bytes_written'] / 1e6:.1f} MB, "
+                f"{result['state_write_ms_avg']:.1f} ms each "
+                f"({result['state_write_share']:.0%} of run)  "
+                f"rss {result['max_rss_kb'] / 1024:.0f} MB"
+                + ("  TIMEOUT" if result["timed_out"] else "")
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+TARGETS = {
+    "cli": "ansible_autoprovisioner.main",
+    "daemon": "ansible_autoprovisioner.daemon",
+    "inventory": "ansible_autoprovisioner.inventory",
+}
+HEAVY = ("ansible", "requests", "boto3", "botocore")
+
+
+def parse_importtime(stderr: str):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def measure(module: str):
+    env = dict(os.environ)
+    src = str(Path(__file__).resolve().parent.parent / "src")
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (src, env.get("PYTHONPATH")) if p)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    rows = parse_importtime(proc.stderr)
+    top = [r for r in rows if r[2] == module]
+    return {
+        "cumulative_us": top[-1][1] if top else sum(r[0] for r in rows),
+        "modules": len(rows),
+        "heavy": sorted({r[2] for r in rows if r[2].split(".")[0] in HEAVY}),
+        "slowest": sorted(rows, reverse=True)[:5],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import time of the entry points")
+    parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), default=sorted(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print JSON lines only")
+    args = parser.parse_args()
+
+    for target in args.targets:
+        runs = [measure(TARGETS[target]) for _ in range(args.repeat)]
+        result = {
+            "target": target,
+            "module": TARGETS[target],
+            "median_ms": round(statistics.median(r["cumulative_us"] for r in runs) / 1000, 1),
+            "modules": runs[-1]["modules"],
+            "heavy": runs[-1]["heavy"],
+            "slowest": [{"module": n, "self_us": s} for s, _, n in runs[-1]["slowest"]],
+        }
+        if args.json:
+            print(json.dumps(result))
+            continue
+        heavy = sorted({m.split(".")[0] for m in result["heavy"]})
+        print(
+            f"{target:>9}  {result['median_ms']:>7} ms  {result['modules']:>4} modules  "
+            f"heavy: {', '.join(heavy) or '-'}"
+        )
+        for row in result["slowest"]:
+            print(f"{'':>11}{row['self_us']:>8} us  {row['module']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    def __init__(self, max_load: Optional[float] = None,
+                 min_available_memory_mb: Optional[int] = None,
+                 max_open_files: Optional[int] = None,
+                 proc_dir: str = "/proc"):
+        self.max_load = max_load
+        self.min_available_memory_mb = min_available_memory_mb
+        self.max_open_files = max_open_files
+        self.proc_dir = Path(proc_dir)
+
+    @property
+    def enabled(self) -> bool:
+        return any(v is not None for v in (
+            self.max_load, self.min_available_memory_mb, self.max_open_files
+        ))
+
+    def _read(self, name: str) -> Optional[str]:
+        try:
+            return (self.proc_dir / name).read_text()
+        except OSError:
+            return None
+
+    def load_avg(self) -> Optional[float]:
+        raw = self._read("loadavg")
+        return float(raw.split()[0]) if raw else None
+
+    def available_memory_mb(self) -> Optional[int]:
+        raw = self._read("meminfo")
+        if not raw:
+            return None
+        for line in raw.splitlines():
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) // 1024
+        return None
+
+    def open_files(self) -> Optional[int]:
+        raw = self._read("sys/fs/file-nr")
+        return int(raw.split()[0]) if raw else None
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        return {
+            "load_avg": self.load_avg(),
+            "available_memory_mb": self.available_memory_mb(),
+            "open_files": self.open_files(),
+        }
+
+    def check(self) -> Optional[str]:
+        if not self.enabled:
+            return None
+        if self.max_load is not None:
+            load = self.load_avg()
+            if load is not None and load > self.max_load:
+                return f"load {load:.2f} > {self.max_load}"
+        if self.min_available_memory_mb is not None:
+            mem = self.available_memory_mb()
+            if mem is not None and mem < self.min_available_memory_mb:
+                return f"available memory {mem}MB < {self.min_available_memory_mb}MB"
+        if self.max_open_files is not None:
+            files = self.open_files()
+            if files is not None and files > self.max_open_files:
+                return f"open files {files} > {self.max_open_files}"
+        return None
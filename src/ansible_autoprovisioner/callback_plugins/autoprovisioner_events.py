@@ -0,0 +1,77 @@
+import json
+import os
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = '''
+    name: autoprovisioner_events
+    type: aggregate
+    short_description: Write per-task events as JSON lines for ansible-autoprovisioner
+    description:
+      - Records task start/end, host, status and duration to the file named by
+        AUTOPROVISIONER_EVENTS_FILE.
+'''
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "autoprovisioner_events"
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super().__init__()
+        path = os.environ.get("AUTOPROVISIONER_EVENTS_FILE")
+        self._out = open(path, "w", buffering=1, encoding="utf-8") if path else None
+        self._started = {}
+
+    def _emit(self, event: str, **data):
+        if self._out is None:
+            return
+        data["event"] = event
+        data["ts"] = time.time()
+        self._out.write(json.dumps(data, default=str) + "\n")
+
+    def _task_start(self, task):
+        self._started[task._uuid] = time.time()
+        self._emit("task_start", task=task.get_name(), uuid=task._uuid, action=task.action)
+
+    def _task_end(self, result, status: str):
+        task = result._task
+        started = self._started.get(task._uuid)
+        self._emit(
+            "task_end",
+            task=task.get_name(),
+            uuid=task._uuid,
+            action=task.action,
+            host=result._host.get_name(),
+            status=status,
+            changed=bool(result._result.get("changed", False)),
+            failed=status in ("failed", "unreachable"),
+            duration=round(time.time() - started, 3) if started else None,
+        )
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._task_start(task)
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self._task_start(task)
+
+    def v2_runner_on_ok(self, result):
+        self._task_end(result, "ok")
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._task_end(result, "ignored" if ignore_errors else "failed")
+
+    def v2_runner_on_skipped(self, result):
+        self._task_end(result, "skipped")
+
+    def v2_runner_on_unreachable(self, result):
+        self._task_end(result, "unreachable")
+
+    def v2_playbook_on_stats(self, stats):
+        self._emit("playbook_end")
+        if self._out is not None:
+            self._out.close()
+            self._out = None
@@ -5,8 +5,14 @@ from typing import List, Dict, Optional, Any
 
 import yaml
 
+from ansible_autoprovisioner.dag import find_cycle
+from ansible_autoprovisioner.rollout import parse_limit
+
 logger = logging.getLogger(__name__)
 
+RESTART_POLICIES = ("resume", "fail")
+EXECUTORS = ("local", "queue", "fake")
+
 
 @dataclass
 class Rule:
@@ -14,6 +20,10 @@ class Rule:
     playbook: str
     match: Dict[str, Any] = field(default_factory=dict)
     vars: Dict[str, Any] = field(default_factory=dict)
+    depends_on: Optional[List[str]] = None
+    timeout: Optional[int] = None
+    rate: Optional[float] = None
+    reapply_every: Optional[int] = None
 
 
 @dataclass
@@ -24,6 +34,7 @@ class Group:
     jump_host: Optional[Dict[str, Any]] = None
     key: Optional[str] = None
     vars: Dict[str, Any] = field(default_factory=dict)
+    rate: Optional[float] = None
 
 
 @dataclass
@@ -46,6 +57,49 @@ class DaemonConfig:
     log_dir: str = "/var/log/ansible-autoprovisioner/"
     max_retries: int = 3
     ui: bool = True
+    fact_cache_ttl: int = 3600
+    fact_cache_dir: Optional[str] = None
+    inventory_cache_dir: Optional[str] = None
+    inventory_cache_ttl: int = 86400
+    restart_policy: str = "resume"
+    shutdown_grace: int = 0
+    detach_on_shutdown: bool = False
+    executor: str = "local"
+    job_queue: Optional[str] = None
+    job_lease_sec: int = 60
+    job_max_attempts: int = 3
+    queue_max_in_flight: int = 64
+    worker_concurrency: int = 2
+    cluster_store: Optional[str] = None
+    member_id: Optional[str] = None
+    member_ttl: int = 30
+    fake_duration: float = 0.0
+    fake_duration_distribution: str = "fixed"
+    fake_failure_rate: float = 0.0
+    fake_seed: Optional[int] = None
+    max_parallel_playbooks: int = 2
+    playbook_timeout: int = 0
+    playbook_kill_grace: int = 10
+    max_load_avg: Optional[float] = None
+    min_available_memory_mb: Optional[int] = None
+    max_open_files: Optional[int] = None
+    admission_poll_interval: int = 5
+    provision_rate: Optional[float] = None
+    provision_burst: Optional[int] = None
+    ssh_probe: bool = False
+    ssh_probe_timeout: float = 5
+    ssh_probe_banner: bool = True
+    ssh_probe_concurrency: int = 256
+    ssh_probe_backoff: int = 15
+    ssh_probe_backoff_max: int = 600
+    rollout_max_in_flight: Any = "25%"
+    rollout_canary: int = 1
+    rollout_max_failure_rate: Optional[float] = 0.25
+    drift_max_in_flight: int = 4
+    full_resync_interval: int = 600
+    orphan_after_misses: int = 2
+    orphan_grace_period: float = 0
+    state_flush_interval: float = 0
     detectors: List[DetectorConfig] = field(default_factory=list)
     rules: Dict[str, Rule] = field(default_factory=dict)
     groups: Dict[str, Group] = field(default_factory=dict)
@@ -74,6 +128,63 @@ class DaemonConfig:
         self.log_dir = data.get('log_dir', self.log_dir)
         self.max_retries = data.get('max_retries', self.max_retries)
         self.ui = data.get('ui', self.ui)
+        self.fact_cache_ttl = data.get('fact_cache_ttl', self.fact_cache_ttl)
+        self.fact_cache_dir = data.get('fact_cache_dir', self.fact_cache_dir)
+        self.inventory_cache_dir = data.get('inventory_cache_dir', self.inventory_cache_dir)
+        self.inventory_cache_ttl = data.get('inventory_cache_ttl', self.inventory_cache_ttl)
+        self.restart_policy = data.get('restart_policy', self.restart_policy)
+        self.shutdown_grace = data.get('shutdown_grace', self.shutdown_grace)
+        self.detach_on_shutdown = data.get('detach_on_shutdown', self.detach_on_shutdown)
+        self.executor = data.get('executor', self.executor)
+        self.job_queue = data.get('job_queue', self.job_queue)
+        self.job_lease_sec = data.get('job_lease_sec', self.job_lease_sec)
+        self.job_max_attempts = data.get('job_max_attempts', self.job_max_attempts)
+        self.queue_max_in_flight = data.get('queue_max_in_flight', self.queue_max_in_flight)
+        self.worker_concurrency = data.get('worker_concurrency', self.worker_concurrency)
+        self.cluster_store = data.get('cluster_store', self.cluster_store)
+        self.member_id = data.get('member_id', self.member_id)
+        self.member_ttl = data.get('member_ttl', self.member_ttl)
+        self.fake_duration = data.get('fake_duration', self.fake_duration)
+        self.fake_duration_distribution = data.get(
+            'fake_duration_distribution', self.fake_duration_distribution
+        )
+        self.fake_failure_rate = data.get('fake_failure_rate', self.fake_failure_rate)
+        self.fake_seed = data.get('fake_seed', self.fake_seed)
+        self.max_parallel_playbooks = data.get(
+            'max_parallel_playbooks', self.max_parallel_playbooks
+        )
+        self.playbook_timeout = data.get('playbook_timeout', self.playbook_timeout)
+        self.playbook_kill_grace = data.get('playbook_kill_grace', self.playbook_kill_grace)
+        self.max_load_avg = data.get('max_load_avg', self.max_load_avg)
+        self.min_available_memory_mb = data.get(
+            'min_available_memory_mb', self.min_available_memory_mb
+        )
+        self.max_open_files = data.get('max_open_files', self.max_open_files)
+        self.admission_poll_interval = data.get(
+            'admission_poll_interval', self.admission_poll_interval
+        )
+        self.provision_rate = data.get('provision_rate', self.provision_rate)
+        self.provision_burst = data.get('provision_burst', self.provision_burst)
+        self.ssh_probe = data.get('ssh_probe', self.ssh_probe)
+        self.ssh_probe_timeout = data.get('ssh_probe_timeout', self.ssh_probe_timeout)
+        self.ssh_probe_banner = data.get('ssh_probe_banner', self.ssh_probe_banner)
+        self.ssh_probe_concurrency = data.get('ssh_probe_concurrency', self.ssh_probe_concurrency)
+        self.ssh_probe_backoff = data.get('ssh_probe_backoff', self.ssh_probe_backoff)
+        self.ssh_probe_backoff_max = data.get('ssh_probe_backoff_max', self.ssh_probe_backoff_max)
+        self.rollout_max_in_flight = data.get('rollout_max_in_flight', self.rollout_max_in_flight)
+        self.rollout_canary = data.get('rollout_canary', self.rollout_canary)
+        self.rollout_max_failure_rate = data.get(
+            'rollout_max_failure_rate', self.rollout_max_failure_rate
+        )
+        self.drift_max_in_flight = data.get('drift_max_in_flight', self.drift_max_in_flight)
+        self.full_resync_interval = data.get('full_resync_interval', self.full_resync_interval)
+        self.orphan_after_misses = int(data.get('orphan_after_misses', self.orphan_after_misses))
+        self.orphan_grace_period = float(
+            data.get('orphan_grace_period', self.orphan_grace_period)
+        )
+        self.state_flush_interval = float(
+            data.get('state_flush_interval', self.state_flush_interval)
+        )
 
     def _load_detectors_section(self, data: Dict[str, Any]):
         for name, options in data.items():
@@ -90,24 +201,29 @@ class DaemonConfig:
                         NotifierConfig(name=item['name'], options=item.get('options', {}))
                     )
 
+    def _build_rule(self, rule_name: str, rule_data: Dict[str, Any]) -> Rule:
+        depends_on = rule_data.get('depends_on')
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        return Rule(
+            name=rule_name,
+            playbook=rule_data['playbook'],
+            match=rule_data.get('match', {}),
+            vars=rule_data.get('vars', {}),
+            depends_on=depends_on,
+            timeout=rule_data.get('timeout'),
+            rate=rule_data.get('rate'),
+            reapply_every=rule_data.get('reapply_every')
+        )
+
     def _load_rules_section(self, data: Any):
         if isinstance(data, list):
             for rule_data in data:
                 rule_name = rule_data['name']
-                self.rules[rule_name] = Rule(
-                    name=rule_name,
-                    playbook=rule_data['playbook'],
-                    match=rule_data.get('match', {}),
-                    vars=rule_data.get('vars', {})
-                )
+                self.rules[rule_name] = self._build_rule(rule_name, rule_data)
         elif isinstance(data, dict):
             for rule_name, rule_data in data.items():
-                self.rules[rule_name] = Rule(
-                    name=rule_name,
-                    playbook=rule_data['playbook'],
-                    match=rule_data.get('match', {}),
-                    vars=rule_data.get('vars', {})
-                )
+                self.rules[rule_name] = self._build_rule(rule_name, rule_data)
 
     def _load_groups_section(self, data: Dict[str, Any]):
         for group_name, group_data in data.items():
@@ -118,7 +234,8 @@ class DaemonConfig:
                 rules=rule_names,
                 jump_host=group_data.get('jump_host'),
                 key=group_data.get('key'),
-                vars=group_data.get('vars', {})
+                vars=group_data.get('vars', {}),
+                rate=group_data.get('rate')
             )
             self.groups[group_name] = group
 
@@ -130,12 +247,7 @@ class DaemonConfig:
             elif isinstance(rule_ref, dict) and 'name' in rule_ref:
                 rule_name = rule_ref['name']
                 if rule_name not in self.rules:
-                    self.rules[rule_name] = Rule(
-                        name=rule_name,
-                        playbook=rule_ref['playbook'],
-                        match=rule_ref.get('match', {}),
-                        vars=rule_ref.get('vars', {})
-                    )
+                    self.rules[rule_name] = self._build_rule(rule_name, rule_ref)
                 rule_names.append(rule_name)
         return rule_names
 
@@ -163,6 +275,46 @@ class DaemonConfig:
                         f"Group '{group_name}' references unknown rule: '{rule_name}'"
                     )
 
+        if self.restart_policy not in RESTART_POLICIES:
+            raise ValueError(
+                f"Unknown restart_policy '{self.restart_policy}', "
+                f"expected one of: {', '.join(RESTART_POLICIES)}"
+            )
+
+        if self.executor not in EXECUTORS:
+            raise ValueError(
+                f"Unknown executor '{self.executor}', expected one of: {', '.join(EXECUTORS)}"
+            )
+
+        try:
+            parse_limit(self.rollout_max_in_flight, 100)
+        except (TypeError, ValueError):
+            raise ValueError(
+                f"Invalid rollout_max_in_flight '{self.rollout_max_in_flight}', "
+                f"expected a count or a percentage such as '25%'"
+            )
+
+        if self.orphan_after_misses < 1:
+            raise ValueError("orphan_after_misses must be at least 1")
+        if self.orphan_grace_period < 0:
+            raise ValueError("orphan_grace_period must not be negative")
+        if self.state_flush_interval < 0:
+            raise ValueError("state_flush_interval must not be negative")
+
+        for rule in self.rules.values():
+            if rule.reapply_every is not None and rule.reapply_every <= 0:
+                raise ValueError(f"Rule '{rule.name}' reapply_every must be positive")
+            for dep in rule.depends_on or []:
+                if dep not in self.rules:
+                    raise ValueError(
+                        f"Rule '{rule.name}' depends on unknown rule: '{dep}'"
+                    )
+        cycle = find_cycle({
+            name: rule.depends_on or [] for name, rule in self.rules.items()
+        })
+        if cycle:
+            raise ValueError(f"Rule dependency cycle: {' -> '.join(cycle)}")
+
         logger.info("Configuration loaded successfully")
         logger.info(f"  Detectors: {len(self.detectors)}")
         logger.info(f"  Rules: {len(self.rules)}")
@@ -214,6 +366,15 @@ class DaemonConfig:
                 return False
         return True
 
+    def get_fact_cache_dir(self) -> str:
+        return self.fact_cache_dir or str(Path(self.log_dir) / ".facts")
+
+    def get_inventory_cache_dir(self) -> str:
+        return self.inventory_cache_dir or str(Path(self.log_dir) / ".inventory")
+
+    def get_job_queue_path(self) -> str:
+        return self.job_queue or str(Path(self.state_file).with_suffix(".jobs.db"))
+
     def has_groups(self) -> bool:
         return len(self.groups) > 0
 
@@ -225,6 +386,49 @@ class DaemonConfig:
             'log_dir': self.log_dir,
             'max_retries': self.max_retries,
             'ui': self.ui,
+            'fact_cache_ttl': self.fact_cache_ttl,
+            'fact_cache_dir': self.get_fact_cache_dir(),
+            'inventory_cache_dir': self.get_inventory_cache_dir(),
+            'inventory_cache_ttl': self.inventory_cache_ttl,
+            'restart_policy': self.restart_policy,
+            'shutdown_grace': self.shutdown_grace,
+            'detach_on_shutdown': self.detach_on_shutdown,
+            'executor': self.executor,
+            'job_queue': self.get_job_queue_path(),
+            'job_lease_sec': self.job_lease_sec,
+            'job_max_attempts': self.job_max_attempts,
+            'queue_max_in_flight': self.queue_max_in_flight,
+            'worker_concurrency': self.worker_concurrency,
+            'cluster_store': self.cluster_store,
+            'member_id': self.member_id,
+            'member_ttl': self.member_ttl,
+            'fake_duration': self.fake_duration,
+            'fake_duration_distribution': self.fake_duration_distribution,
+            'fake_failure_rate': self.fake_failure_rate,
+            'fake_seed': self.fake_seed,
+            'max_parallel_playbooks': self.max_parallel_playbooks,
+            'playbook_timeout': self.playbook_timeout,
+            'playbook_kill_grace': self.playbook_kill_grace,
+            'max_load_avg': self.max_load_avg,
+            'min_available_memory_mb': self.min_available_memory_mb,
+            'max_open_files': self.max_open_files,
+            'admission_poll_interval': self.admission_poll_interval,
+            'provision_rate': self.provision_rate,
+            'provision_burst': self.provision_burst,
+            'ssh_probe': self.ssh_probe,
+            'ssh_probe_timeout': self.ssh_probe_timeout,
+            'ssh_probe_banner': self.ssh_probe_banner,
+            'ssh_probe_concurrency': self.ssh_probe_concurrency,
+            'ssh_probe_backoff': self.ssh_probe_backoff,
+            'ssh_probe_backoff_max': self.ssh_probe_backoff_max,
+            'rollout_max_in_flight': self.rollout_max_in_flight,
+            'rollout_canary': self.rollout_canary,
+            'rollout_max_failure_rate': self.rollout_max_failure_rate,
+            'drift_max_in_flight': self.drift_max_in_flight,
+            'full_resync_interval': self.full_resync_interval,
+            'orphan_after_misses': self.orphan_after_misses,
+            'orphan_grace_period': self.orphan_grace_period,
+            'state_flush_interval': self.state_flush_interval,
             'detectors': [{'name': d.name, 'options': d.options} for d in self.detectors],
             'rules': {name: rule.name for name, rule in self.rules.items()},
             'groups': {
@@ -234,7 +438,8 @@ class DaemonConfig:
                     'rules': group.rules,
                     'jump_host': group.jump_host,
                     'key': group.key,
-                    'vars': group.vars
+                    'vars': group.vars,
+                    'rate': group.rate
                 }
                 for name, group in self.groups.items()
             },
@@ -1,13 +1,24 @@
 import logging
 import signal
+import threading
 import time
+from datetime import datetime
 
 from ansible_autoprovisioner.config import DaemonConfig
 from ansible_autoprovisioner.detectors import DetectorManager
-from ansible_autoprovisioner.executor import AnsibleExecutor
+from ansible_autoprovisioner.drift import DriftScheduler
+from ansible_autoprovisioner.executor import create_executor
+from ansible_autoprovisioner.inventory import connection_params
 from ansible_autoprovisioner.matcher import RuleMatcher
 from ansible_autoprovisioner.notifications.notifier import NotifierManager
-from ansible_autoprovisioner.state import StateManager, InstanceStatus
+from ansible_autoprovisioner.probe import ReachabilityProber
+from ansible_autoprovisioner.rollout import RolloutController, changed_rules
+from ansible_autoprovisioner.sharding import ShardCoordinator
+from ansible_autoprovisioner.state import (
+    FAILED_PLAYBOOK_STATUSES,
+    InstanceStatus,
+    StateManager,
+)
 from ansible_autoprovisioner.utils.api import ApiInterface
 from ansible_autoprovisioner.utils.ui import UIServer
 
@@ -20,13 +31,34 @@ class ProvisioningDaemon:
         self.ui_server = None
         self.running = False
         self.notifier = None
+        self.wake = threading.Event()
+        self._missing = {}
 
         logger.info("Daemon Start")
-        self.state = StateManager(state_file=config.state_file)
-        self.detectors = DetectorManager(config.detectors)
+        self.state = StateManager(
+            state_file=config.state_file, flush_interval=config.state_flush_interval
+        )
+        self.detectors = DetectorManager(
+            config.detectors, resync_interval=config.full_resync_interval
+        )
+        self.detectors.configure_matching([g.match for g in config.groups.values()])
         self.matcher = RuleMatcher(self.config)
-        self.executor = AnsibleExecutor(self.state, self.config)
-        self.management = ApiInterface(self.state, self.config)
+        self.executor = create_executor(self.state, self.config)
+        self.executor.recover()
+        self.rollouts = RolloutController(self.state, self.config)
+        self.drift = DriftScheduler(self.state, self.config)
+        self.shards = None
+        if self.config.cluster_store:
+            self.shards = ShardCoordinator.from_config(
+                self.config, is_active=self.executor.is_active
+            )
+            self.shards.start()
+        self.management = ApiInterface(
+            self.state, self.config, self.executor, self.shards, self.rollouts
+        )
+        self.prober = None
+        if self.config.ssh_probe:
+            self.prober = ReachabilityProber(self.config, connection_params)
 
         if len(self.config.notifications):
             self.notifier = NotifierManager(self.config.notifications)
@@ -40,6 +72,7 @@ class ProvisioningDaemon:
     def _signal_handler(self, s, f):
         logger.info(f"Signal {s}")
         self.running = False
+        self.wake.set()
 
     def run(self):
         self.running = True
@@ -54,68 +87,180 @@ class ProvisioningDaemon:
         finally:
             self._cleanup()
 
+    def _on_source_change(self):
+        logger.info("Detector source changed, waking up")
+        self.wake.set()
+
     def _run_loop(self):
+        self.detectors.watch(self._on_source_change)
         while self.running:
-            logger.info("Detecting...")
-            detected = self.detectors.detect_all()
-            det_ids = {d.instance_id for d in detected}
-            state_insts = self.state.get_instances()
-            state_ids = {s.instance_id for s in state_insts}
-
-            for inst in detected:
-                groups, tasks = self.matcher.match(inst)
-                current_inst = self.state.get_instance(inst.instance_id)
-
-                if inst.instance_id not in state_ids:
-                    if not tasks:
-                        logger.warning(f"Ignored {inst.instance_id}: No matching playbooks")
-                        continue
-                    self.state.detect_instance(
-                        instance_id=inst.instance_id,
-                        ip=inst.ip_address,
-                        detector=inst.detector,
-                        tags=inst.tags,
-                        groups=groups,
-                        playbook_tasks=tasks
-                    )
-                    logger.info(f"New {inst.instance_id} ({len(tasks)} tasks)")
-
-                elif (len(current_inst.playbook_tasks) != len(tasks) or
-                      current_inst.groups != groups):
-                    self.state.update_instance(
-                        instance_id=inst.instance_id,
-                        groups=groups,
-                        playbook_tasks=tasks
+            self.wake.clear()
+            self.run_once()
+            if self.running and self.config.interval > 0:
+                self.wake.wait(self.config.interval)
+
+    def run_once(self):
+        previous = self.matcher.revisions
+        if self.matcher.refresh() != previous:
+            self.detectors.request_resync()
+        if self.shards and self.shards.ring_changed():
+            self.detectors.request_resync()
+        logger.info("Detecting...")
+        result = self.detectors.poll()
+        stream = result.instances
+        if self.shards:
+            batch = list(stream)
+            owned, adopted = self._owned(self.detectors.known_ids())
+            stream = ((inst, changed or inst.instance_id in adopted)
+                      for inst, changed in batch if inst.instance_id in owned)
+
+        for inst, changed_fingerprint in stream:
+            current_inst = self.state.get_instance(inst.instance_id)
+            if self._missing.pop(inst.instance_id, None):
+                logger.info(f"{inst.instance_id} is back")
+            orphaned = (current_inst is not None and
+                        current_inst.overall_status == InstanceStatus.ORPHANED)
+            if current_inst is not None and not changed_fingerprint and not orphaned:
+                continue
+            groups, tasks = self.matcher.match(inst)
+            if orphaned and tasks:
+                status = self.state.resurrect(inst.instance_id, inst.ip_address, inst.tags)
+                logger.info(f"Resurrected {inst.instance_id} as {status.value}")
+
+            if current_inst is None:
+                if not tasks:
+                    logger.warning(f"Ignored {inst.instance_id}: No matching playbooks")
+                    continue
+                self.state.detect_instance(
+                    instance_id=inst.instance_id,
+                    ip=inst.ip_address,
+                    detector=inst.detector,
+                    tags=inst.tags,
+                    groups=groups,
+                    playbook_tasks=tasks
+                )
+                logger.info(f"New {inst.instance_id} ({len(tasks)} tasks)")
+
+            else:
+                changed = changed_rules(current_inst.playbook_tasks, tasks)
+                if (changed or current_inst.groups != groups or
+                        len(current_inst.playbook_tasks) != len(tasks)):
+                    self.state.stage_update(inst.instance_id, groups, tasks, changed)
+                    logger.info(
+                        f"Updated {inst.instance_id} ({len(tasks)} tasks"
+                        + (f", changed: {', '.join(changed)})" if changed else ")")
                     )
-                    logger.info(f"Updated {inst.instance_id} ({len(tasks)} tasks)")
+        logger.info(f"Detected {result.seen} instances, {len(result.removed)} removed")
 
-            for s_inst in state_insts:
-                if (s_inst.instance_id not in det_ids and
-                        s_inst.overall_status != InstanceStatus.ORPHANED):
-                    logger.info(f"Orphaned {s_inst.instance_id}")
-                    self.state.mark_final_status(s_inst.instance_id, InstanceStatus.ORPHANED)
+        self._orphan_missing(result)
 
-            logger.info("Reconciling...")
+        logger.info("Reconciling...")
+        self.rollouts.step(self.matcher.revisions, self.executor.is_active)
 
-            pending = self.state.get_instances(status=InstanceStatus.PENDING)
-            if pending:
-                logger.info(f"Prioritizing {len(pending)} PENDING instances")
-                self.executor.provision(pending)
+        pending = self._reachable(self.state.get_instances(status=InstanceStatus.PENDING))
+        if pending:
+            logger.info(f"Prioritizing {len(pending)} PENDING instances")
+            self.executor.provision(pending)
 
-            failed = self.state.get_instances(status=InstanceStatus.FAILED)
-            to_retry = [
-                i for i in failed 
-                if sum(p.retry_count for p in i.playbook_results.values()) < self.config.max_retries
-            ]
-            if to_retry:
-                logger.info(f"Retrying {len(to_retry)} FAILED instances")
-                self.executor.provision(to_retry)
+        failed = (self.state.get_instances(status=InstanceStatus.FAILED) +
+                  self.state.get_instances(status=InstanceStatus.PARTIAL_FAILURE))
+        to_retry = self._reachable([
+            i for i in failed
+            if not i.outdated and
+            sum(p.retry_count for p in i.playbook_results.values()) < self.config.max_retries
+        ])
+        if to_retry:
+            logger.info(f"Retrying {len(to_retry)} FAILED/PARTIAL_FAILURE instances")
+            self.executor.provision(to_retry)
 
-            if self.notifier:
-                self._check_notifications()
+        due = self.drift.due(is_active=self.executor.is_active)
+        if due:
+            reachable = {i.instance_id for i in self._reachable([inst for inst, _ in due])}
+            due = [(inst, tasks) for inst, tasks in due if inst.instance_id in reachable]
+            logger.info(f"Re-applying drift-prone rules on {len(due)} instances")
+            self.executor.reapply(due)
 
-            if self.running and self.config.interval > 0:
-                time.sleep(self.config.interval)
+        self.executor.inventories.gc()
+
+        if self.notifier:
+            self._check_notifications()
+
+        self.state.flush()
+
+    def _orphan_missing(self, result):
+        now = time.monotonic()
+        known = self.detectors.known_ids()
+        for s_inst in self.state.get_instances():
+            instance_id = s_inst.instance_id
+            if s_inst.overall_status == InstanceStatus.ORPHANED:
+                self._missing.pop(instance_id, None)
+                continue
+            gone = instance_id in result.removed or (
+                instance_id not in known and (result.complete or instance_id in self._missing)
+            )
+            if not gone:
+                self._missing.pop(instance_id, None)
+                continue
+            misses, since = self._missing.get(instance_id, (0, now))
+            misses += 1
+            if (misses < self.config.orphan_after_misses or
+                    now - since < self.config.orphan_grace_period):
+                self._missing[instance_id] = (misses, since)
+                logger.info(f"Missing {instance_id} ({misses} polls)")
+                continue
+            self._missing.pop(instance_id, None)
+            logger.info(f"Orphaned {instance_id}")
+            self.state.orphan(instance_id)
+            self.executor.facts.invalidate(instance_id)
+
+    def _owned(self, detected_ids):
+        owned = self.shards.claim(
+            detected_ids, handoff=lambda held: self._hand_off(detected_ids, held)
+        )
+        adopted = self.shards.adopt(
+            i for i in owned if self.state.get_instance(i) is None
+        )
+        for instance_id, data in adopted.items():
+            inst = self.state.import_instance(data)
+            if inst:
+                logger.info(f"Adopted {instance_id} ({inst.overall_status.value})")
+        logger.info(f"Owning {len(owned)} of {len(detected_ids)} instances")
+        return owned, set(adopted)
+
+    def _hand_off(self, detected_ids, held):
+        handed = [
+            s_inst for s_inst in self.state.get_instances()
+            if s_inst.instance_id in detected_ids and s_inst.instance_id not in held
+            and not self.executor.is_active(s_inst.instance_id)
+        ]
+        self.shards.export({s_inst.instance_id: s_inst.to_dict() for s_inst in handed})
+        for s_inst in handed:
+            logger.info(f"Handed off {s_inst.instance_id}")
+            self.state.delete_instance(s_inst.instance_id)
+
+    def _reachable(self, instances):
+        if not self.prober or not instances:
+            return instances
+        now = datetime.utcnow()
+        candidates = [
+            i for i in instances
+            if not self.executor.is_active(i.instance_id)
+            and (i.next_probe_at is None or i.next_probe_at <= now)
+        ]
+        results = self.prober.probe(candidates)
+        reachable = []
+        for inst in candidates:
+            ok = results.get(inst.instance_id, False)
+            next_at = self.state.record_probe(
+                inst.instance_id, ok,
+                backoff=self.config.ssh_probe_backoff,
+                backoff_max=self.config.ssh_probe_backoff_max,
+            )
+            if ok:
+                reachable.append(inst)
+            else:
+                logger.info(f"Unreachable {inst.instance_id}, next probe at {next_at}")
+        return reachable
 
     def start_ui(self):
         try:
@@ -128,8 +273,19 @@ class ProvisioningDaemon:
             logger.exception("UI error")
 
     def _cleanup(self):
-        self.state.mark_all_running_failed()
+        self.detectors.close()
         self.executor.shutdown()
+        if self.config.restart_policy != "resume":
+            self.state.mark_all_running_failed()
+        self.state.flush()
+        if self.shards:
+            try:
+                self.shards.export({
+                    inst.instance_id: inst.to_dict() for inst in self.state.get_instances()
+                })
+            except Exception:
+                logger.exception("Cannot export instances to the cluster store")
+            self.shards.stop()
         if self.ui_server:
             self.ui_server.stop()
         logger.info("Daemon stop")
@@ -138,7 +294,8 @@ class ProvisioningDaemon:
         final_statuses = (
             InstanceStatus.SUCCESS,
             InstanceStatus.PARTIAL_FAILURE,
-            InstanceStatus.FAILED
+            InstanceStatus.FAILED,
+            InstanceStatus.CANCELLED
         )
         for inst in self.state.get_instances():
             if inst.overall_status in final_statuses and not inst.notified:
@@ -146,7 +303,7 @@ class ProvisioningDaemon:
                 if inst.overall_status != InstanceStatus.SUCCESS:
                     failed_tasks = [
                         n for n, r in inst.playbook_results.items()
-                        if r.status == "error"
+                        if r.status in FAILED_PLAYBOOK_STATUSES
                     ]
                     if failed_tasks:
                         details = f"Failed tasks: {', '.join(failed_tasks)}"
@@ -0,0 +1,61 @@
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def unique_tasks(tasks) -> list:
+    kept = {}
+    result = []
+    for task in tasks:
+        first = kept.get(task.name)
+        if first is None:
+            kept[task.name] = task
+            result.append(task)
+        elif (first.key, first.jump_host, first.vars) != (task.key, task.jump_host, task.vars):
+            logger.warning(
+                f"Rule {task.name} matched through groups {first.group} and {task.group} "
+                f"with different settings, running it once with those of {first.group}"
+            )
+    return result
+
+
+def build_dependencies(tasks) -> Dict[str, List[str]]:
+    tasks = unique_tasks(tasks)
+    names = {t.name for t in tasks}
+    deps = {}
+    previous = None
+    for task in tasks:
+        if task.depends_on is None:
+            deps[task.name] = [previous] if previous else []
+        else:
+            deps[task.name] = [d for d in task.depends_on if d in names and d != task.name]
+        previous = task.name
+    return deps
+
+
+def find_cycle(deps: Dict[str, List[str]]) -> Optional[List[str]]:
+    visiting, done = set(), set()
+    path: List[str] = []
+
+    def visit(name) -> Optional[List[str]]:
+        if name in done:
+            return None
+        if name in visiting:
+            return path[path.index(name):] + [name]
+        visiting.add(name)
+        path.append(name)
+        for dep in deps.get(name, []):
+            cycle = visit(dep)
+            if cycle:
+                return cycle
+        path.pop()
+        visiting.discard(name)
+        done.add(name)
+        return None
+
+    for name in deps:
+        cycle = visit(name)
+        if cycle:
+            return cycle
+    return None
@@ -1,10 +1,11 @@
 from .base import BaseDetector, DetectedInstance
 from .manager import DetectorManager
 from .registry import DetectorRegistry
-from .static import StaticDetector
-from .aws import AWSDetector
-DetectorRegistry.register("static", StaticDetector)
-DetectorRegistry.register("aws", AWSDetector)
+DetectorRegistry.register("static", f"{__name__}.static:StaticDetector")
+DetectorRegistry.register("aws", f"{__name__}.aws:AWSDetector")
+DetectorRegistry.register("synthetic", f"{__name__}.synthetic:SyntheticDetector")
+DetectorRegistry.register("webhook", f"{__name__}.webhook:WebhookDetector")
+DetectorRegistry.register("http", f"{__name__}.http_json:HTTPDetector")
 __all__ = [
     "BaseDetector",
     "DetectedInstance",
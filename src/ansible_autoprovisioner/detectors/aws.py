@@ -1,60 +1,279 @@
 import logging
-from typing import List
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
-from .base import BaseDetector, DetectedInstance
+from .base import STREAMING, BaseDetector, DetectedInstance
 
 logger = logging.getLogger(__name__)
 
+PUSHDOWN_KEYS = {
+    "aws_instance_id": "instance-id",
+    "aws_az": "availability-zone",
+}
+LOCAL_KEYS = {"aws_region", "aws_account"}
+ROLE_REFRESH = timedelta(minutes=5)
+
+
+def _pushable(pattern: str) -> bool:
+    return "[" not in pattern
+
+
+def match_filters(criteria: Dict[str, Any]) -> List[Dict[str, Any]]:
+    filters = []
+    for key, value in (criteria or {}).items():
+        pattern = str(value)
+        if key in LOCAL_KEYS or not _pushable(pattern):
+            continue
+        name = PUSHDOWN_KEYS.get(key, f"tag:{key}")
+        filters.append({"Name": name, "Values": [pattern]})
+    return filters
+
+
+def plan_queries(criteria: List[Dict[str, Any]], max_queries: int) -> List[List[Dict[str, Any]]]:
+    if not criteria or any(not c for c in criteria):
+        return [[]]
+    queries = [match_filters(c) for c in criteria]
+    if any(not q for q in queries):
+        return [[]]
+    if len(queries) <= max_queries:
+        unique = []
+        for q in queries:
+            if q not in unique:
+                unique.append(q)
+        return unique
+    common = set.intersection(*(set(c) for c in criteria))
+    for key in sorted(common):
+        patterns = sorted({str(c[key]) for c in criteria})
+        if key not in LOCAL_KEYS and all(_pushable(p) for p in patterns):
+            name = PUSHDOWN_KEYS.get(key, f"tag:{key}")
+            return [[{"Name": name, "Values": patterns}]]
+    return [[]]
+
 
 class AWSDetector(BaseDetector):
-    def __init__(self, region: str):
-        self.region = region
-        logger.info("Initializing AWS Detector")
-        self._require_boto3()
+    capabilities = frozenset({STREAMING})
+
+    def __init__(self, region: Optional[str] = None, regions: Optional[List[str]] = None,
+                 profile: Optional[str] = None, accounts: Optional[List[Dict[str, Any]]] = None,
+                 states: Optional[List[str]] = None, filters: Optional[List[Dict]] = None,
+                 max_workers: int = 8, page_size: int = 1000, max_filter_queries: int = 5,
+                 pushdown: bool = True, session_factory: Optional[Callable] = None):
+        self.regions = list(regions or ([region] if region else []))
+        if not self.regions:
+            raise ValueError("AWSDetector requires 'region' or 'regions'")
+        self.profile = profile
+        self.accounts = accounts or [{}]
+        self.states = states or ["running"]
+        self.filters = filters or []
+        self.page_size = page_size
+        self.max_filter_queries = max_filter_queries
+        self.pushdown = pushdown
+        self.queries: List[List[Dict[str, Any]]] = [[]]
+        self.max_workers = max_workers
+        self._session_factory = session_factory or self._require_boto3()
+        self._lock = threading.Lock()
+        self._clients: Dict[tuple, Any] = {}
+        self._sessions: Dict[str, tuple] = {}
+        self._sts_client = None
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="aws")
+        logger.info(
+            f"Initializing AWS Detector ({len(self.accounts)} accounts, "
+            f"regions: {', '.join(self.regions)})"
+        )
         self._require_credentials()
 
     def _require_boto3(self):
         try:
-            import boto3  
+            import boto3
         except ImportError as e:
             raise RuntimeError(
                 "AWSDetector requires boto3. Install with: pip install boto3"
             ) from e
+        return boto3.Session
 
     def _require_credentials(self):
-        import boto3
         try:
-            sts = boto3.client("sts", region_name=self.region)
-            sts.get_caller_identity()
+            self._sts().get_caller_identity()
         except Exception as e:
             raise RuntimeError(
                 "AWS credentials not found. Configure via aws configure / env vars / IAM role"
             ) from e
 
-    def detect(self) -> List[DetectedInstance]:
-        import boto3
-        ec2 = boto3.client("ec2", region_name=self.region)
-        response = ec2.describe_instances(
-            Filters=[{"Name": "instance-state-name", "Values": ["running"]}]
+    def configure_matching(self, criteria: List[Dict[str, Any]]):
+        if not self.pushdown:
+            return
+        self.queries = plan_queries(criteria, self.max_filter_queries)
+        if self.queries != [[]]:
+            logger.info(f"AWS detector pushing down {len(self.queries)} tag filter sets")
+
+    def _base_session(self):
+        with self._lock:
+            entry = self._sessions.get("")
+            if entry is None:
+                kwargs = {"profile_name": self.profile} if self.profile else {}
+                entry = (self._session_factory(**kwargs), None)
+                self._sessions[""] = entry
+            return entry[0]
+
+    def _sts(self):
+        session = self._base_session()
+        with self._lock:
+            if self._sts_client is None:
+                self._sts_client = session.client("sts", region_name=self.regions[0])
+            return self._sts_client
+
+    def _session(self, account: Dict[str, Any]):
+        role_arn = account.get("role_arn")
+        if not role_arn:
+            return self._base_session()
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            entry = self._sessions.get(role_arn)
+        if entry and entry[1] - now > ROLE_REFRESH:
+            return entry[0]
+        params = {
+            "RoleArn": role_arn,
+            "RoleSessionName": account.get("session_name", "ansible-autoprovisioner"),
+        }
+        if account.get("external_id"):
+            params["ExternalId"] = account["external_id"]
+        creds = self._sts().assume_role(**params)["Credentials"]
+        session = self._session_factory(
+            aws_access_key_id=creds["AccessKeyId"],
+            aws_secret_access_key=creds["SecretAccessKey"],
+            aws_session_token=creds["SessionToken"],
+        )
+        expires = creds["Expiration"]
+        if expires.tzinfo is None:
+            expires = expires.replace(tzinfo=timezone.utc)
+        logger.info(f"Assumed {role_arn} until {expires.isoformat()}")
+        with self._lock:
+            self._sessions[role_arn] = (session, expires)
+            for key in [k for k in self._clients if k[0] == role_arn]:
+                del self._clients[key]
+        return session
+
+    def _client(self, account: Dict[str, Any], region: str):
+        session = self._session(account)
+        key = (account.get("role_arn", ""), region)
+        with self._lock:
+            client = self._clients.get(key)
+        if client is not None:
+            return client
+        kwargs = {"region_name": region}
+        try:
+            from botocore.config import Config
+            kwargs["config"] = Config(
+                max_pool_connections=self.max_workers,
+                retries={"max_attempts": 10, "mode": "adaptive"},
+            )
+        except ImportError:
+            pass
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = session.client("ec2", **kwargs)
+                self._clients[key] = client
+        return client
+
+    def _targets(self):
+        for account in self.accounts:
+            for region in account.get("regions") or self.regions:
+                for query in self.queries:
+                    yield account, region, query
+
+    def _pages(self, account: Dict[str, Any], region: str,
+               query: List[Dict[str, Any]]) -> Iterator[List[DetectedInstance]]:
+        client = self._client(account, region)
+        filters = [{"Name": "instance-state-name", "Values": self.states}]
+        filters += self.filters + query
+        paginator = client.get_paginator("describe_instances")
+        count = pages = 0
+        for page in paginator.paginate(
+            Filters=filters, PaginationConfig={"PageSize": self.page_size}
+        ):
+            pages += 1
+            instances = []
+            for reservation in page.get("Reservations", []):
+                for inst in reservation.get("Instances", []):
+                    detected = self._to_instance(inst, region, account)
+                    if detected:
+                        instances.append(detected)
+            count += len(instances)
+            yield instances
+        logger.debug(
+            f"AWS {account.get('name', 'default')}/{region}: "
+            f"{count} instances in {pages} pages"
+        )
+
+    def _produce(self, target, pages: queue.Queue, stop: threading.Event):
+        try:
+            for batch in self._pages(*target):
+                while not stop.is_set():
+                    try:
+                        pages.put(batch, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            item = None
+        except Exception as e:
+            item = e
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _to_instance(self, inst: Dict[str, Any], region: str,
+                     account: Dict[str, Any]) -> Optional[DetectedInstance]:
+        ip = inst.get("PublicIpAddress") or inst.get("PrivateIpAddress")
+        if not ip:
+            return None
+        tags = {t["Key"]: t["Value"] for t in inst.get("Tags", [])}
+        tags.update({
+            "aws_instance_id": inst["InstanceId"],
+            "aws_region": region,
+            "aws_az": inst["Placement"]["AvailabilityZone"],
+        })
+        if account.get("name"):
+            tags["aws_account"] = account["name"]
+        return DetectedInstance(
+            instance_id=f"aws-{inst['InstanceId']}",
+            ip_address=ip,
+            detector="aws",
+            tags=tags,
         )
-        instances = []
-        for reservation in response.get("Reservations", []):
-            for inst in reservation.get("Instances", []):
-                ip = inst.get("PublicIpAddress") or inst.get("PrivateIpAddress")
-                if not ip:
-                    continue
-                tags = {t["Key"]: t["Value"] for t in inst.get("Tags", [])}
-                instances.append(
-                    DetectedInstance(
-                        instance_id=f"aws-{inst['InstanceId']}",
-                        ip_address=ip,
-                        detector="aws",
-                        tags={
-                            **tags,
-                            "aws_instance_id": inst["InstanceId"],
-                            "aws_region": self.region,
-                            "aws_az": inst["Placement"]["AvailabilityZone"],
-                        },
-                    )
-                )
-        return instances
+
+    def iter_instances(self) -> Iterator[DetectedInstance]:
+        targets = list(self._targets())
+        pages: queue.Queue = queue.Queue(maxsize=self.max_workers * 2)
+        stop = threading.Event()
+        for target in targets:
+            self.pool.submit(self._produce, target, pages, stop)
+        remaining = len(targets)
+        try:
+            while remaining:
+                batch = pages.get()
+                if batch is None:
+                    remaining -= 1
+                elif isinstance(batch, Exception):
+                    raise batch
+                else:
+                    yield from batch
+        finally:
+            stop.set()
+
+    def detect(self) -> List[DetectedInstance]:
+        instances = {}
+        for inst in self.iter_instances():
+            instances[inst.instance_id] = inst
+        return list(instances.values())
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -1,13 +1,80 @@
-from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import asyncio
+import hashlib
+import json
+from abc import ABC
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional
+from dataclasses import dataclass, field
+INCREMENTAL = "incremental"
+STREAMING = "streaming"
+ASYNC = "async"
 @dataclass(frozen=True)
 class DetectedInstance:
     instance_id: str
     ip_address: str
     detector: str
     tags: Dict[str, str]
+@dataclass
+class DetectionDelta:
+    added: Iterable[DetectedInstance] = field(default_factory=list)
+    modified: Iterable[DetectedInstance] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    token: Optional[str] = None
+    full: bool = False
+def snapshot_token(instances: Dict[str, DetectedInstance]) -> str:
+    payload = json.dumps(
+        [[i.instance_id, i.ip_address, i.tags] for _, i in sorted(instances.items())],
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+def instance_fingerprint(inst: DetectedInstance) -> bytes:
+    payload = json.dumps([inst.ip_address, inst.tags], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest()
+def iterate(items) -> Iterator[DetectedInstance]:
+    if not hasattr(items, "__aiter__"):
+        yield from items
+        return
+    loop = asyncio.new_event_loop()
+    iterator = items.__aiter__()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+def capabilities(detector) -> FrozenSet[str]:
+    declared = set(getattr(detector, "capabilities", ()) or ())
+    if not isinstance(detector, BaseDetector):
+        if not hasattr(detector, "detect_changes"):
+            declared.discard(INCREMENTAL)
+        if not hasattr(detector, "iter_instances"):
+            declared -= {STREAMING, ASYNC}
+    return frozenset(declared)
+def diff_instances(old: Dict[str, DetectedInstance], new: Dict[str, DetectedInstance],
+                   token: Optional[str] = None) -> DetectionDelta:
+    return DetectionDelta(
+        added=[inst for i, inst in new.items() if i not in old],
+        modified=[inst for i, inst in new.items() if i in old and old[i] != inst],
+        removed=[i for i in old if i not in new],
+        token=token,
+    )
 class BaseDetector(ABC):
-    @abstractmethod
+    capabilities: FrozenSet[str] = frozenset()
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.detect is BaseDetector.detect and cls.iter_instances is BaseDetector.iter_instances:
+            raise TypeError(f"{cls.__name__} must implement detect() or iter_instances()")
     def detect(self) -> List[DetectedInstance]:
+        return list(iterate(self.iter_instances()))
+    def iter_instances(self) -> Iterable[DetectedInstance]:
+        return self.detect()
+    def detect_changes(self, token: Optional[str] = None) -> DetectionDelta:
+        return DetectionDelta(added=iterate(self.iter_instances()), full=True)
+    def configure_matching(self, criteria: List[Dict[str, Any]]):
+        pass
+    def watch(self, callback: Callable[[], None]):
+        pass
+    def close(self):
         pass
@@ -0,0 +1,218 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .base import (
+    INCREMENTAL,
+    BaseDetector,
+    DetectedInstance,
+    DetectionDelta,
+    diff_instances,
+    snapshot_token,
+)
+
+logger = logging.getLogger(__name__)
+
+PATH_TOKEN = re.compile(r"\.\*|\.([^.\[\]]+)|\[(\*|-?\d+|'[^']*'|\"[^\"]*\")\]")
+WILDCARD = object()
+PAGINATION = (None, "link", "url", "cursor")
+
+
+def compile_path(expr: str) -> Tuple:
+    expr = expr.strip()
+    if expr.startswith("$"):
+        expr = expr[1:]
+    elif expr and not expr.startswith((".", "[")):
+        expr = "." + expr
+    steps, pos = [], 0
+    while pos < len(expr):
+        match = PATH_TOKEN.match(expr, pos)
+        if not match:
+            raise ValueError(f"Invalid JSON path: ${expr}")
+        if match.group(0) == ".*" or match.group(2) == "*":
+            steps.append(WILDCARD)
+        elif match.group(1) is not None:
+            steps.append(match.group(1))
+        elif match.group(2).lstrip("-").isdigit():
+            steps.append(int(match.group(2)))
+        else:
+            steps.append(match.group(2)[1:-1])
+        pos = match.end()
+    return tuple(steps)
+
+
+def select(steps: Tuple, data: Any) -> List[Any]:
+    nodes = [data]
+    for step in steps:
+        found = []
+        for node in nodes:
+            if step is WILDCARD:
+                if isinstance(node, list):
+                    found.extend(node)
+                elif isinstance(node, dict):
+                    found.extend(node.values())
+            elif isinstance(step, int):
+                if isinstance(node, list) and -len(node) <= step < len(node):
+                    found.append(node[step])
+            elif isinstance(node, dict) and step in node:
+                found.append(node[step])
+        nodes = found
+    return nodes
+
+
+def first(steps: Tuple, data: Any) -> Any:
+    found = select(steps, data)
+    return found[0] if found else None
+
+
+class HTTPDetector(BaseDetector):
+    capabilities = frozenset({INCREMENTAL})
+
+    def __init__(self, url: str, items: str = "$", instance_id: str = "$.id",
+                 ip_address: str = "$.ip_address", tags: Optional[Dict[str, str]] = None,
+                 tags_path: Optional[str] = None, id_prefix: str = "http-",
+                 headers: Optional[Dict[str, str]] = None,
+                 params: Optional[Dict[str, Any]] = None, paginate: Optional[str] = None,
+                 next_path: Optional[str] = None, cursor_param: str = "cursor",
+                 max_pages: int = 1000, timeout: float = 10, verify: bool = True,
+                 pool_size: int = 4, retries: int = 3):
+        if paginate not in PAGINATION:
+            raise ValueError("paginate must be one of: link, url, cursor")
+        if paginate in ("url", "cursor") and not next_path:
+            raise ValueError(f"paginate: {paginate} requires next_path")
+        self.url = url
+        self.params = dict(params or {})
+        self.items = compile_path(items)
+        self.instance_id = compile_path(instance_id)
+        self.ip_address = compile_path(ip_address)
+        self.tags = {key: compile_path(path) for key, path in (tags or {}).items()}
+        self.tags_path = compile_path(tags_path) if tags_path else None
+        self.id_prefix = id_prefix
+        self.paginate = paginate
+        self.next_path = compile_path(next_path) if next_path else None
+        self.cursor_param = cursor_param
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.verify = verify
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            max_retries=Retry(total=retries, backoff_factor=0.5,
+                              status_forcelist=(429, 502, 503, 504),
+                              allowed_methods=["GET"]),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pages: Dict[str, Tuple] = {}
+        self._snapshot: Dict[str, DetectedInstance] = {}
+        self._token: Optional[str] = None
+        self.requests = 0
+        self.not_modified = 0
+        logger.info(f"Initializing HTTP Detector ({url})")
+
+    def _page(self, url: str, params: Dict[str, Any]):
+        key = f"{url}?{urlencode(sorted(params.items()))}"
+        cached = self._pages.get(key)
+        headers = {}
+        if cached and cached[0]:
+            headers["If-None-Match"] = cached[0]
+        if cached and cached[1]:
+            headers["If-Modified-Since"] = cached[1]
+        resp = self.session.get(url, params=params or None, headers=headers,
+                                timeout=self.timeout, verify=self.verify)
+        self.requests += 1
+        if resp.status_code == 304 and cached:
+            self.not_modified += 1
+            return key, cached, True
+        resp.raise_for_status()
+        payload = resp.json()
+        entry = (
+            resp.headers.get("ETag"),
+            resp.headers.get("Last-Modified"),
+            self._instances(payload),
+            self._next(url, params, payload, resp),
+        )
+        return key, entry, False
+
+    def _next(self, url: str, params: Dict[str, Any], payload: Any, resp):
+        if self.paginate == "link":
+            link = resp.links.get("next", {}).get("url")
+            return (urljoin(url, link), {}) if link else None
+        value = first(self.next_path, payload) if self.next_path else None
+        if value in (None, ""):
+            return None
+        if self.paginate == "url":
+            return urljoin(url, str(value)), {}
+        return url, {**params, self.cursor_param: value}
+
+    def _instances(self, payload: Any) -> List[DetectedInstance]:
+        items = select(self.items, payload)
+        if len(items) == 1 and isinstance(items[0], list):
+            items = items[0]
+        instances = []
+        for item in items:
+            instance_id = first(self.instance_id, item)
+            ip = first(self.ip_address, item)
+            if instance_id in (None, "") or not ip:
+                logger.debug(f"Skipped HTTP item without id or address: {item!r:.200}")
+                continue
+            tags = {}
+            if self.tags_path:
+                extra = first(self.tags_path, item)
+                if isinstance(extra, dict):
+                    tags.update(extra)
+            for key, path in self.tags.items():
+                value = first(path, item)
+                if value is not None:
+                    tags[key] = value
+            instances.append(DetectedInstance(
+                instance_id=f"{self.id_prefix}{instance_id}",
+                ip_address=str(ip),
+                detector="http",
+                tags=tags,
+            ))
+        return instances
+
+    def fetch(self) -> Tuple[List[DetectedInstance], bool]:
+        url, params = self.url, dict(self.params)
+        pages: Dict[str, Tuple] = {}
+        instances: List[DetectedInstance] = []
+        unchanged = True
+        while url and len(pages) < self.max_pages:
+            key, entry, hit = self._page(url, params)
+            if key in pages:
+                logger.warning(f"HTTP detector pagination loops at {key}")
+                break
+            pages[key] = entry
+            unchanged = unchanged and hit
+            instances.extend(entry[2])
+            url, params = entry[3] or (None, None)
+        unchanged = unchanged and len(pages) == len(self._pages)
+        self._pages = pages
+        return instances, unchanged
+
+    def detect(self) -> List[DetectedInstance]:
+        instances, _ = self.fetch()
+        return list({i.instance_id: i for i in instances}.values())
+
+    def detect_changes(self, token: Optional[str] = None) -> DetectionDelta:
+        instances, unchanged = self.fetch()
+        if unchanged and token is not None and token == self._token:
+            return DetectionDelta(token=token)
+        current = {i.instance_id: i for i in instances}
+        new_token = snapshot_token(current)
+        if token is None or token != self._token:
+            delta = DetectionDelta(added=list(current.values()), token=new_token, full=True)
+        else:
+            delta = diff_instances(self._snapshot, current, new_token)
+        self._snapshot, self._token = current, new_token
+        return delta
+
+    def close(self):
+        self.session.close()
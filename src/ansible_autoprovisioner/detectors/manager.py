@@ -1,8 +1,31 @@
 from .registry  import DetectorRegistry
+import itertools
 import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from .base import (
+    ASYNC,
+    INCREMENTAL,
+    STREAMING,
+    DetectedInstance,
+    DetectionDelta,
+    capabilities,
+    instance_fingerprint,
+    iterate,
+)
+@dataclass
+class DetectionResult:
+    instances: Iterator[Tuple[DetectedInstance, bool]] = iter(())
+    resync: bool = True
+    generation: int = 0
+    removed: Set[str] = field(default_factory=set)
+    complete: bool = False
+    seen: int = 0
 class DetectorManager:
-    def __init__(self, detectors):
+    def __init__(self, detectors, resync_interval: float = 0):
         self.detectors = []
+        self.resync_interval = resync_interval
         for d in detectors:
             try:
                 self.detectors.append(
@@ -14,12 +37,86 @@ class DetectorManager:
                     d.name,
                     e,
                 )
-    def detect_all(self):
-        instances = {}
-        for detector in self.detectors:
+        self.capabilities = [capabilities(d) for d in self.detectors]
+        for d, caps in zip(self.detectors, self.capabilities):
+            logging.info(
+                "Detector %s: %s", type(d).__name__, ", ".join(sorted(caps)) or "full listing"
+            )
+        self._tokens: List[Optional[str]] = [None for _ in self.detectors]
+        self._index: Dict[str, Tuple[int, int, bytes]] = {}
+        self._generation = 0
+        self._last_resync: Optional[float] = None
+        self._rematch = False
+    def _hooks(self, name):
+        return [getattr(d, name) for d in self.detectors if hasattr(d, name)]
+    def configure_matching(self, criteria):
+        for configure in self._hooks("configure_matching"):
+            configure(criteria)
+    def watch(self, callback):
+        for watch in self._hooks("watch"):
+            try:
+                watch(callback)
+            except Exception:
+                logging.exception("Detector %s cannot be watched", watch.__self__)
+    def close(self):
+        for close in self._hooks("close"):
+            close()
+    def request_resync(self):
+        self._last_resync = None
+        self._rematch = True
+    def known_ids(self):
+        return self._index.keys()
+    def is_current(self, instance_id: str, generation: int) -> bool:
+        entry = self._index.get(instance_id)
+        return entry is not None and entry[1] == generation
+    def poll(self) -> DetectionResult:
+        now = time.monotonic()
+        resync = (self._last_resync is None or
+                  now - self._last_resync >= self.resync_interval)
+        if resync:
+            self._last_resync = now
+        self._generation += 1
+        result = DetectionResult(resync=resync, generation=self._generation)
+        result.instances = self._stream(result, self._rematch)
+        self._rematch = False
+        return result
+    def _stream(self, result: DetectionResult, rematch: bool):
+        generation = result.generation
+        listed = set()
+        for index, detector in enumerate(self.detectors):
             try:
-                for inst in detector.detect():
-                    instances[inst.instance_id] = inst
+                delta = self._changes(index, None if result.resync else self._tokens[index])
+                for inst in itertools.chain(delta.added, delta.modified):
+                    entry = self._index.get(inst.instance_id)
+                    if entry is not None and entry[1] == generation:
+                        continue
+                    fingerprint = instance_fingerprint(inst)
+                    self._index[inst.instance_id] = (index, generation, fingerprint)
+                    result.seen += 1
+                    yield inst, rematch or entry is None or entry[2] != fingerprint
+                for instance_id in delta.removed:
+                    entry = self._index.get(instance_id)
+                    if entry is not None and entry[0] == index:
+                        del self._index[instance_id]
+                        result.removed.add(instance_id)
             except Exception:
                 logging.exception("Detector %s failed during detect()", detector)
-        return list(instances.values())
+                continue
+            self._tokens[index] = delta.token
+            if delta.full:
+                listed.add(index)
+        result.complete = len(listed) == len(self.detectors)
+        for instance_id, (index, seen, _) in list(self._index.items()):
+            if index in listed and seen != generation:
+                del self._index[instance_id]
+                result.removed.add(instance_id)
+    def _changes(self, index: int, token: Optional[str]) -> DetectionDelta:
+        detector = self.detectors[index]
+        caps = self.capabilities[index]
+        if INCREMENTAL in caps:
+            return detector.detect_changes(token)
+        if STREAMING in caps or ASYNC in caps:
+            return DetectionDelta(added=iterate(detector.iter_instances()), full=True)
+        return DetectionDelta(added=detector.detect(), full=True)
+    def detect_all(self):
+        return [inst for inst, _ in self.poll().instances]
@@ -1,10 +1,29 @@
+from ansible_autoprovisioner.utils.loader import entry_points, resolve
+ENTRY_POINT_GROUP = "ansible_autoprovisioner.detectors"
 class DetectorRegistry:
     _registry = {}
+    _discovered = False
     @classmethod
     def create(cls, name: str, **options):
+        return cls.load(name)(**options)
+    @classmethod
+    def load(cls, name: str):
+        if name not in cls._registry:
+            cls.discover()
         if name not in cls._registry:
             raise ValueError(f"Unknown detector: {name}")
-        return cls._registry[name](**options)
+        detector_cls = cls._registry[name]
+        if not isinstance(detector_cls, type):
+            detector_cls = resolve(detector_cls)
+            cls._registry[name] = detector_cls
+        return detector_cls
+    @classmethod
+    def discover(cls):
+        if cls._discovered:
+            return
+        cls._discovered = True
+        for name, ep in entry_points(ENTRY_POINT_GROUP).items():
+            cls._registry.setdefault(name, ep)
     @classmethod
     def register(cls , name  , detector_cls):
         if name in cls._registry:
@@ -12,4 +31,5 @@ class DetectorRegistry:
         cls._registry[name]  =  detector_cls
     @classmethod
     def available(cls):
+        cls.discover()
         return  list(cls._registry.keys())
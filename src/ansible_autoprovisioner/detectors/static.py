@@ -1,27 +1,77 @@
 import logging
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, List, Optional, Tuple
 
-from ansible.inventory.manager import InventoryManager
-from ansible.parsing.dataloader import DataLoader
-from ansible.plugins.loader import init_plugin_loader
+from ansible_autoprovisioner.watch import FileWatcher, fingerprint
 
-from .base import BaseDetector, DetectedInstance
+from .base import (
+    BaseDetector,
+    DetectedInstance,
+    DetectionDelta,
+    INCREMENTAL,
+    diff_instances,
+    snapshot_token,
+)
 
-init_plugin_loader([])
 logger = logging.getLogger(__name__)
+_plugin_loader_ready = False
+
+
+def load_inventory(path: str):
+    global _plugin_loader_ready
+    from ansible.inventory.manager import InventoryManager
+    from ansible.parsing.dataloader import DataLoader
+    if not _plugin_loader_ready:
+        from ansible.plugins.loader import init_plugin_loader
+        init_plugin_loader([])
+        _plugin_loader_ready = True
+    return InventoryManager(loader=DataLoader(), sources=[path])
 
 
 class StaticDetector(BaseDetector):
-    def __init__(self, inventory: str = "inventory.ini"):
+    capabilities = frozenset({INCREMENTAL})
+
+    def __init__(self, inventory: str = "inventory.ini", watch: bool = True,
+                 poll_interval: float = 5.0):
         self.inventory_path = inventory
+        self.watch_enabled = watch
+        self.poll_interval = poll_interval
+        self.watcher: Optional[FileWatcher] = None
+        self._snapshot: Dict[str, DetectedInstance] = {}
+        self._token: Optional[str] = None
+        self._cache: Optional[List[DetectedInstance]] = None
+        self._cache_key: Optional[Tuple] = None
+        self.parses = 0
         logger.info("Initializing Static Detector")
         if not Path(inventory).exists():
             raise RuntimeError(f"Inventory file not found: {inventory}")
 
+    def sources(self) -> List[Path]:
+        path = Path(self.inventory_path)
+        base = path if path.is_dir() else path.parent
+        return [path, base / "group_vars", base / "host_vars"]
+
+    def watch(self, callback: Callable[[], None]):
+        if not self.watch_enabled or self.watcher:
+            return
+        self.watcher = FileWatcher(self.sources(), callback, self.poll_interval)
+        self.watcher.start()
+
+    def close(self):
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+
     def detect(self) -> List[DetectedInstance]:
-        loader = DataLoader()
-        inventory = InventoryManager(loader=loader, sources=[self.inventory_path])
+        key = fingerprint(self.sources())
+        if self._cache is None or key != self._cache_key:
+            self._cache = self._parse()
+            self._cache_key = key
+        return list(self._cache)
+
+    def _parse(self) -> List[DetectedInstance]:
+        self.parses += 1
+        inventory = load_inventory(self.inventory_path)
         instances = {}
         for host in inventory.hosts.values():
             ip = host.vars.get("ansible_host", host.name)
@@ -36,3 +86,16 @@ class StaticDetector(BaseDetector):
             inst = instances[instance_id]
             inst.tags.update(host.vars)
         return list(instances.values())
+
+    def detect_changes(self, token: Optional[str] = None) -> DetectionDelta:
+        if (token is not None and token == self._token and
+                fingerprint(self.sources()) == self._cache_key):
+            return DetectionDelta(token=token)
+        current = {i.instance_id: i for i in self.detect()}
+        new_token = snapshot_token(current)
+        if token is None or token != self._token:
+            delta = DetectionDelta(added=list(current.values()), token=new_token, full=True)
+        else:
+            delta = diff_instances(self._snapshot, current, new_token)
+        self._snapshot, self._token = current, new_token
+        return delta
@@ -0,0 +1,66 @@
+import logging
+import random
+from typing import Dict, List, Optional
+
+from .base import BaseDetector, DetectedInstance
+
+logger = logging.getLogger(__name__)
+
+ROLES = ["web", "api", "worker", "db", "cache"]
+ENVS = ["prod", "staging", "dev"]
+ZONES = ["a", "b", "c"]
+
+
+class SyntheticDetector(BaseDetector):
+    def __init__(self, count: int = 1000, churn: float = 0.0, tag_churn: float = 0.0,
+                 seed: Optional[int] = 0, roles: Optional[List[str]] = None):
+        self.count = int(count)
+        self.churn = float(churn)
+        self.tag_churn = float(tag_churn)
+        self.roles = roles or ROLES
+        self.random = random.Random(seed)
+        self._next_id = 0
+        self._hosts: Dict[str, DetectedInstance] = {}
+        for _ in range(self.count):
+            self._add()
+        logger.info(f"Initializing Synthetic Detector ({self.count} hosts)")
+
+    def _add(self):
+        n = self._next_id
+        self._next_id += 1
+        instance_id = f"synthetic-{n:07d}"
+        self._hosts[instance_id] = DetectedInstance(
+            instance_id=instance_id,
+            ip_address=f"10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}",
+            detector="synthetic",
+            tags={
+                "role": self.roles[n % len(self.roles)],
+                "env": ENVS[(n // len(self.roles)) % len(ENVS)],
+                "zone": ZONES[n % len(ZONES)],
+                "build": "1",
+            },
+        )
+
+    def _replace_tags(self, instance_id: str):
+        inst = self._hosts[instance_id]
+        tags = dict(inst.tags)
+        tags["build"] = str(int(tags.get("build", "0")) + 1)
+        self._hosts[instance_id] = DetectedInstance(
+            inst.instance_id, inst.ip_address, inst.detector, tags
+        )
+
+    def detect(self) -> List[DetectedInstance]:
+        if self.churn and self._hosts:
+            gone = self.random.sample(
+                list(self._hosts), min(len(self._hosts), int(len(self._hosts) * self.churn))
+            )
+            for instance_id in gone:
+                del self._hosts[instance_id]
+            for _ in gone:
+                self._add()
+        if self.tag_churn and self._hosts:
+            for instance_id in self.random.sample(
+                list(self._hosts), int(len(self._hosts) * self.tag_churn)
+            ):
+                self._replace_tags(instance_id)
+        return list(self._hosts.values())
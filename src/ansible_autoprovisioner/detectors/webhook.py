@@ -0,0 +1,155 @@
+import hmac
+import json
+import logging
+import os
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from .base import INCREMENTAL, BaseDetector, DetectedInstance, DetectionDelta
+
+logger = logging.getLogger(__name__)
+
+REMOVE_ACTIONS = ("remove", "delete", "terminated", "stopped")
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        detector = self.server.detector
+        if self.path.split("?")[0] != detector.path:
+            return self.send_error(404)
+        if detector.secret and not hmac.compare_digest(
+            self.headers.get("Authorization", "").encode("utf-8"),
+            f"Bearer {detector.secret}".encode("utf-8"),
+        ):
+            return self.send_error(401)
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length) or b"[]")
+            if isinstance(data, dict):
+                data = data.get("events", [data])
+            accepted = detector.push(data)
+        except (ValueError, KeyError, TypeError) as e:
+            return self.send_error(400, str(e))
+        body = json.dumps({"accepted": accepted}).encode("utf-8")
+        self.send_response(202)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt % args)
+
+
+class WebhookDetector(BaseDetector):
+    capabilities = frozenset({INCREMENTAL})
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081, path: str = "/events",
+                 secret: Optional[str] = None, store: Optional[str] = None,
+                 max_log: int = 10000):
+        self.path = path
+        self.secret = secret
+        self.store = store
+        self._lock = threading.Lock()
+        self._instances: Dict[str, DetectedInstance] = {}
+        self._seq = 0
+        self._floor = 0
+        self._log = deque()
+        self._max_log = max_log
+        if store and os.path.exists(store):
+            with open(store) as f:
+                for instance_id, data in json.load(f).items():
+                    self._instances[instance_id] = DetectedInstance(
+                        instance_id, data["ip_address"], "webhook", data.get("tags", {})
+                    )
+        self.server = None
+        if port is not None:
+            self.server = ThreadingHTTPServer((host, port), WebhookHandler)
+            self.server.detector = self
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            port = self.server.server_address[1]
+        logger.info(
+            f"Initializing Webhook Detector (port {port}, {len(self._instances)} instances)"
+        )
+
+    def push(self, events: List[Dict[str, Any]]) -> int:
+        parsed = [self._parse(event) for event in events]
+        with self._lock:
+            for instance_id, inst in parsed:
+                self._apply(instance_id, inst)
+            self._save()
+        return len(parsed)
+
+    def _parse(self, event: Dict[str, Any]):
+        instance_id = str(event["instance_id"])
+        action = str(event.get("action", "upsert")).lower()
+        if action in REMOVE_ACTIONS:
+            return instance_id, None
+        ip = event.get("ip_address") or event.get("ip")
+        if not ip:
+            raise ValueError(f"Missing ip_address for {instance_id}")
+        return instance_id, DetectedInstance(
+            instance_id, str(ip), "webhook", dict(event.get("tags") or {})
+        )
+
+    def _apply(self, instance_id: str, inst: Optional[DetectedInstance]):
+        existed = instance_id in self._instances
+        if inst is None:
+            if not existed:
+                return
+            del self._instances[instance_id]
+            kind = "removed"
+        else:
+            if self._instances.get(instance_id) == inst:
+                return
+            self._instances[instance_id] = inst
+            kind = "modified" if existed else "added"
+        self._seq += 1
+        self._log.append((self._seq, instance_id, kind))
+        while len(self._log) > self._max_log:
+            self._floor = self._log.popleft()[0]
+
+    def _save(self):
+        if not self.store:
+            return
+        tmp = self.store + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                i: {"ip_address": inst.ip_address, "tags": inst.tags}
+                for i, inst in self._instances.items()
+            }, f)
+        os.replace(tmp, self.store)
+
+    def detect(self) -> List[DetectedInstance]:
+        with self._lock:
+            return list(self._instances.values())
+
+    def detect_changes(self, token: Optional[str] = None) -> DetectionDelta:
+        with self._lock:
+            since = int(token) if token and token.isdigit() else None
+            if since is None or since < self._floor or since > self._seq:
+                return DetectionDelta(
+                    added=list(self._instances.values()), token=str(self._seq), full=True
+                )
+            first: Dict[str, str] = {}
+            for seq, instance_id, kind in self._log:
+                if seq > since:
+                    first.setdefault(instance_id, kind)
+            delta = DetectionDelta(token=str(self._seq))
+            for instance_id, kind in first.items():
+                inst = self._instances.get(instance_id)
+                if inst is None:
+                    if kind != "added":
+                        delta.removed.append(instance_id)
+                elif kind == "added":
+                    delta.added.append(inst)
+                else:
+                    delta.modified.append(inst)
+            return delta
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
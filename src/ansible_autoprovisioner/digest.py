@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+import yaml
+
+FILE_INCLUDE_KEYS = {
+    "import_playbook",
+    "include_tasks",
+    "import_tasks",
+    "include_vars",
+    "include",
+}
+ROLE_INCLUDE_KEYS = {"include_role", "import_role"}
+
+
+def _hash_json(data: Any) -> str:
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def instance_fingerprint(ip_address: str, tags: Dict[str, Any]) -> str:
+    return _hash_json({"ip": ip_address, "tags": tags or {}})
+
+
+def _short_key(key: str) -> str:
+    return key.rsplit(".", 1)[-1]
+
+
+def _is_templated(value: str) -> bool:
+    return "{{" in value or "{%" in value
+
+
+def _collect_references(node: Any, files: List[str], roles: List[str]):
+    if isinstance(node, list):
+        for item in node:
+            _collect_references(item, files, roles)
+        return
+    if not isinstance(node, dict):
+        return
+    for key, value in node.items():
+        short = _short_key(str(key))
+        if short in FILE_INCLUDE_KEYS:
+            if isinstance(value, dict):
+                value = value.get("file")
+            if isinstance(value, str):
+                files.append(value)
+        elif short in ROLE_INCLUDE_KEYS and isinstance(value, dict):
+            if isinstance(value.get("name"), str):
+                roles.append(value["name"])
+        elif short == "vars_files" and isinstance(value, list):
+            files.extend(v for v in value if isinstance(v, str))
+        elif short == "roles" and isinstance(value, list):
+            for role in value:
+                if isinstance(role, str):
+                    roles.append(role)
+                elif isinstance(role, dict):
+                    name = role.get("role") or role.get("name")
+                    if isinstance(name, str):
+                        roles.append(name)
+        else:
+            _collect_references(value, files, roles)
+
+
+def _hash_file(path: Path, h, seen: Set[Path], playbook_dir: Path):
+    path = path.resolve()
+    if path in seen:
+        return
+    seen.add(path)
+    name = os.path.relpath(path, playbook_dir)
+    if not path.is_file():
+        h.update(f"missing:{name}\n".encode("utf-8"))
+        return
+    content = path.read_bytes()
+    h.update(f"file:{name}\n".encode("utf-8"))
+    h.update(content)
+
+    if path.suffix not in (".yml", ".yaml"):
+        return
+    try:
+        data = yaml.safe_load(content)
+    except yaml.YAMLError:
+        return
+
+    files, roles = [], []
+    _collect_references(data, files, roles)
+    for ref in files:
+        if _is_templated(ref):
+            continue
+        candidates = [path.parent / ref, path.parent / "tasks" / ref, playbook_dir / ref]
+        target = next((c for c in candidates if c.exists()), candidates[0])
+        _hash_file(target, h, seen, playbook_dir)
+    for role in roles:
+        if _is_templated(role):
+            continue
+        _hash_role(playbook_dir / "roles" / role, h, seen, playbook_dir)
+
+
+def _hash_role(role_dir: Path, h, seen: Set[Path], playbook_dir: Path):
+    role_dir = role_dir.resolve()
+    if role_dir in seen:
+        return
+    seen.add(role_dir)
+    if not role_dir.is_dir():
+        h.update(f"missing-role:{os.path.relpath(role_dir, playbook_dir)}\n".encode("utf-8"))
+        return
+    for path in sorted(p for p in role_dir.rglob("*") if p.is_file()):
+        _hash_file(path, h, seen, playbook_dir)
+
+
+def playbook_digest(playbook: str) -> str:
+    path = Path(playbook)
+    h = hashlib.sha256()
+    _hash_file(path, h, set(), path.resolve().parent)
+    return h.hexdigest()
+
+
+def task_digest(playbook: str, task_vars: Dict[str, Any],
+                inventory: Optional[str] = None) -> str:
+    return _hash_json({
+        "playbook": playbook_digest(playbook),
+        "vars": task_vars or {},
+        "inventory": inventory or "",
+    })
+
+
+def rule_digest(playbook: str, definition: Dict[str, Any]) -> str:
+    return _hash_json({"playbook": playbook_digest(playbook), "rule": definition})
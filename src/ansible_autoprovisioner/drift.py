@@ -0,0 +1,65 @@
+import hashlib
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from ansible_autoprovisioner.state import InstanceStatus, PlaybookStatus
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+ELIGIBLE = (InstanceStatus.SUCCESS, InstanceStatus.PARTIAL_FAILURE)
+
+
+def phase_offset(instance_id: str, rule: str, period: float) -> float:
+    digest = hashlib.sha1(f"{instance_id}:{rule}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64 * period
+
+
+def next_due(last_run: datetime, period: float, offset: float) -> datetime:
+    earliest = (last_run - EPOCH).total_seconds() + period / 2
+    slot = offset + math.ceil((earliest - offset) / period) * period
+    return EPOCH + timedelta(seconds=slot)
+
+
+class DriftScheduler:
+    def __init__(self, state, config):
+        self.state = state
+        self.config = config
+
+    def periods(self):
+        return {
+            name: rule.reapply_every
+            for name, rule in self.config.rules.items()
+            if rule.reapply_every
+        }
+
+    def due(self, now: Optional[datetime] = None,
+            is_active: Callable[[str], bool] = lambda instance_id: False
+            ) -> List[Tuple[object, list]]:
+        periods = self.periods()
+        if not periods:
+            return []
+        now = now or datetime.utcnow()
+        due = []
+        for inst in self.state.get_instances():
+            if (inst.overall_status not in ELIGIBLE or inst.outdated or
+                    is_active(inst.instance_id)):
+                continue
+            tasks = []
+            for task in inst.playbook_tasks:
+                period = periods.get(task.name)
+                result = inst.playbook_results.get(task.name)
+                if not period or not result or result.status != PlaybookStatus.SUCCESS:
+                    continue
+                last_run = result.completed_at or result.started_at
+                drift = inst.drift.get(task.name)
+                if drift and drift.last_run_at and drift.last_run_at > last_run:
+                    last_run = drift.last_run_at
+                offset = phase_offset(inst.instance_id, task.name, period)
+                if next_due(last_run, period, offset) <= now:
+                    tasks.append(task)
+            if tasks:
+                due.append((inst, tasks))
+        return due
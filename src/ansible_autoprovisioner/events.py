@@ -0,0 +1,54 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_PLUGIN_DIR = Path(__file__).parent / "callback_plugins"
+CALLBACK_NAME = "autoprovisioner_events"
+MAX_TASK_TIMINGS = 50
+
+
+def callback_env(events_file: str, env: Dict[str, str]) -> Dict[str, str]:
+    plugin_paths = [str(CALLBACK_PLUGIN_DIR)]
+    if env.get("ANSIBLE_CALLBACK_PLUGINS"):
+        plugin_paths.append(env["ANSIBLE_CALLBACK_PLUGINS"])
+    enabled = [CALLBACK_NAME]
+    if env.get("ANSIBLE_CALLBACKS_ENABLED"):
+        enabled.append(env["ANSIBLE_CALLBACKS_ENABLED"])
+    return {
+        "ANSIBLE_CALLBACK_PLUGINS": ":".join(plugin_paths),
+        "ANSIBLE_CALLBACKS_ENABLED": ",".join(enabled),
+        "AUTOPROVISIONER_EVENTS_FILE": events_file,
+    }
+
+
+def read_task_timings(events_file, limit: Optional[int] = MAX_TASK_TIMINGS) -> List[Dict[str, Any]]:
+    path = Path(events_file)
+    if not path.exists():
+        return []
+    timings = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("event") != "task_end" or event.get("duration") is None:
+                    continue
+                timings.append({
+                    "task": event.get("task"),
+                    "action": event.get("action"),
+                    "host": event.get("host"),
+                    "status": event.get("status"),
+                    "changed": event.get("changed", False),
+                    "failed": event.get("failed", False),
+                    "duration_sec": event["duration"],
+                })
+    except OSError:
+        logger.exception(f"Cannot read events {path}")
+        return []
+    timings.sort(key=lambda t: t["duration_sec"], reverse=True)
+    return timings[:limit]
@@ -1,26 +1,79 @@
 import logging
+import os
+import queue
+import signal
 import subprocess
-import tempfile
-from concurrent.futures import ThreadPoolExecutor
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, List, Optional
 
+from ansible_autoprovisioner.admission import AdmissionController
 from ansible_autoprovisioner.config import DaemonConfig
+from ansible_autoprovisioner.dag import build_dependencies, unique_tasks
+from ansible_autoprovisioner.digest import task_digest
+from ansible_autoprovisioner.events import callback_env, read_task_timings
+from ansible_autoprovisioner.facts import FactCache
+from ansible_autoprovisioner.inventory import InventoryCache, render_inventory
+from ansible_autoprovisioner.ratelimit import StartRateLimiter
 from ansible_autoprovisioner.state import InstanceStatus, PlaybookStatus
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class PlaybookRun:
+    rc: Optional[int] = None
+    timeout: Optional[int] = None
+    timed_out: bool = False
+    cancelled: bool = False
+    interrupted: bool = False
+    detached: bool = False
+    events_file: Optional[str] = None
+    log_file: Optional[str] = None
+    rc_file: Optional[str] = None
+    tapped: bool = False
+    tailing: bool = False
+    resources: Dict[str, float] = field(default_factory=dict)
+    task_timings: Optional[List[Dict]] = None
+    finished: threading.Event = field(default_factory=threading.Event)
+
+
 class AnsibleExecutor:
     def __init__(self, state, config: DaemonConfig, max_workers: int = 4):
         self.state = state
         self.config = config
         self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.facts = FactCache(config.get_fact_cache_dir(), ttl=config.fact_cache_ttl)
+        self.inventories = InventoryCache(
+            config.get_inventory_cache_dir(), ttl=config.inventory_cache_ttl
+        )
+        self._lock = threading.Lock()
+        self._active = set()
+        self._drifting = set()
+        self._cancelled: Dict[str, InstanceStatus] = {}
+        self._processes: Dict[str, Dict[str, tuple]] = {}
+        self._subscribers: Dict[str, List[queue.Queue]] = {}
+        self._stopping = threading.Event()
+        self._detaching = threading.Event()
+        self._queued: Dict[tuple, tuple] = {}
+        self.rate_limiter = StartRateLimiter.from_config(config)
+        self.admission = AdmissionController(
+            max_load=config.max_load_avg,
+            min_available_memory_mb=config.min_available_memory_mb,
+            max_open_files=config.max_open_files,
+        )
 
     def provision(self, instances: list):
-        for inst in instances:
+        for index, inst in enumerate(instances):
             if inst.overall_status in (InstanceStatus.RUNNING, InstanceStatus.SUCCESS):
                 continue
+            if self.is_active(inst.instance_id):
+                continue
 
             total_retries = sum(p.retry_count for p in inst.playbook_results.values())
             if total_retries >= self.config.max_retries:
@@ -28,148 +81,644 @@ class AnsibleExecutor:
                 self.state.mark_final_status(inst.instance_id, InstanceStatus.FAILED)
                 continue
 
+            reason = self.admission.check()
+            if reason:
+                logger.warning(f"Deferring {len(instances) - index} instances: {reason}")
+                return
+
             logger.info(f"Provisioning {inst.instance_id}")
             self.state.mark_running(inst.instance_id)
-            self.pool.submit(self._run_instance, inst)
+            queued_at = time.monotonic()
+            with self._lock:
+                self._active.add(inst.instance_id)
+                self._queued[(inst.instance_id, None)] = (queued_at, "worker")
+            self.pool.submit(self._run_instance, inst, queued_at)
 
-    def _run_instance(self, instance):
-        try:
-            for task in instance.playbook_tasks:
-                existing = instance.playbook_results.get(task.name)
-                if existing and existing.status == PlaybookStatus.SUCCESS:
+    def reapply(self, due: list) -> int:
+        reason = self.admission.check()
+        if reason:
+            logger.warning(f"Deferring drift runs: {reason}")
+            return 0
+        started = 0
+        for inst, tasks in due:
+            with self._lock:
+                if len(self._drifting) >= max(1, self.config.drift_max_in_flight):
+                    break
+                if inst.instance_id in self._active:
                     continue
+                self._active.add(inst.instance_id)
+                self._drifting.add(inst.instance_id)
+            logger.info(f"Re-applying {', '.join(t.name for t in tasks)} on {inst.instance_id}")
+            self.pool.submit(self._run_drift, inst, tasks)
+            started += 1
+        return started
 
-                playbook_state = self.state.start_playbook(
-                    instance.instance_id,
-                    name=task.name,
-                    file=task.file
+    def _run_drift(self, instance, tasks: list):
+        try:
+            if self.facts.enabled:
+                self.facts.prepare(instance)
+            for task in tasks:
+                if not self._await_start(instance.instance_id, task, time.monotonic()):
+                    break
+                started_at = datetime.utcnow()
+                run = self._run_playbook(instance, task)
+                if run.detached or run.interrupted or (run.cancelled and self._stopping.is_set()):
+                    break
+                status, error = self._outcome(run)
+                timings = run.task_timings
+                if timings is None and run.events_file:
+                    timings = read_task_timings(run.events_file, limit=None)
+                changed = sum(1 for t in timings or [] if t.get("changed"))
+                self.state.record_drift(
+                    instance.instance_id, task.name, status, started_at,
+                    error=error, changed_tasks=changed,
                 )
+                if status != PlaybookStatus.SUCCESS:
+                    logger.warning(f"Re-applying {task.name} on {instance.instance_id}: {error}")
+                elif changed:
+                    logger.info(
+                        f"Drift on {instance.instance_id}: {task.name} changed {changed} tasks"
+                    )
+        except Exception:
+            logger.exception(f"Error re-applying on {instance.instance_id}")
+        finally:
+            self._release(instance.instance_id)
 
-                rc = self._run_playbook(instance, task)
+    def is_active(self, instance_id: str) -> bool:
+        with self._lock:
+            return instance_id in self._active
 
-                if rc != 0:
-                    self.state.finish_playbook(
-                        instance.instance_id,
-                        playbook_state,
-                        PlaybookStatus.ERROR,
-                        error=f"Exit {rc}"
-                    )
-                    self.state.mark_final_status(instance.instance_id, InstanceStatus.FAILED)
-                    return
+    def cancel(self, instance_id: str,
+               status: InstanceStatus = InstanceStatus.CANCELLED) -> bool:
+        with self._lock:
+            if instance_id not in self._active:
+                return False
+            self._cancelled[instance_id] = status
+            running = list(self._processes.get(instance_id, {}).values())
+        logger.info(f"Cancelling {instance_id}")
+        for process, run in running:
+            self._stop_run(process, run, status)
+        return True
 
-                self.state.finish_playbook(
-                    instance.instance_id,
-                    playbook_state,
-                    PlaybookStatus.SUCCESS
-                )
+    def _stop_run(self, process, run: PlaybookRun, status: InstanceStatus):
+        if status == InstanceStatus.RUNNING:
+            return
+        if status == InstanceStatus.PENDING:
+            run.interrupted = True
+        else:
+            run.cancelled = True
+        self._terminate(process, run)
+
+    def subscribe(self, instance_id: str) -> queue.Queue:
+        q = queue.Queue(maxsize=1024)
+        with self._lock:
+            self._subscribers.setdefault(instance_id, []).append(q)
+            tails = []
+            for name, (_, run) in self._processes.get(instance_id, {}).items():
+                if not run.tapped and not run.tailing and run.log_file:
+                    run.tailing = True
+                    tails.append((name, run))
+        for name, run in tails:
+            threading.Thread(
+                target=self._tail, args=(instance_id, name, run), daemon=True
+            ).start()
+        return q
+
+    def _tail(self, instance_id: str, name: str, run: PlaybookRun):
+        try:
+            with open(run.log_file, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                while True:
+                    finished = run.finished.is_set()
+                    chunk = f.read(65536)
+                    if chunk:
+                        self._publish(instance_id, name, chunk)
+                    elif finished:
+                        break
+                    else:
+                        with self._lock:
+                            if not self._subscribers.get(instance_id):
+                                break
+                        run.finished.wait(0.2)
+        except OSError:
+            logger.exception(f"Cannot tail {run.log_file}")
+        finally:
+            with self._lock:
+                run.tailing = False
+
+    def unsubscribe(self, instance_id: str, q: queue.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(instance_id, [])
+            if q in subscribers:
+                subscribers.remove(q)
+            if not subscribers:
+                self._subscribers.pop(instance_id, None)
+
+    def _publish(self, instance_id: str, name: str, chunk: bytes):
+        with self._lock:
+            subscribers = list(self._subscribers.get(instance_id, []))
+        for q in subscribers:
+            try:
+                q.put_nowait((name, chunk))
+            except queue.Full:
+                pass
+
+    def _wants_tap(self, instance_id: str) -> bool:
+        with self._lock:
+            if self._subscribers.get(instance_id):
+                return True
+        return logger.isEnabledFor(logging.DEBUG)
 
-            self.state.mark_final_status(instance.instance_id, InstanceStatus.SUCCESS)
+    def queue_snapshot(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            queued = list(self._queued.items())
+        return [
+            {
+                "instance_id": instance_id,
+                "playbook": playbook,
+                "stage": stage,
+                "waiting_sec": round(now - since, 3),
+            }
+            for (instance_id, playbook), (since, stage) in queued
+        ]
+
+    def _set_queued(self, instance_id: str, playbook: Optional[str],
+                    since: Optional[float], stage: Optional[str] = None):
+        with self._lock:
+            if stage is None:
+                self._queued.pop((instance_id, playbook), None)
+            else:
+                self._queued[(instance_id, playbook)] = (since, stage)
+
+    def _is_cancelled(self, instance_id: str) -> bool:
+        with self._lock:
+            return instance_id in self._cancelled
+
+    def _run_instance(self, instance, queued_at: Optional[float] = None):
+        self._set_queued(instance.instance_id, None, None)
+        try:
+            if self._is_cancelled(instance.instance_id):
+                self._finish_instance(instance.instance_id, InstanceStatus.FAILED)
+                return
+            if self.facts.enabled:
+                self.facts.prepare(instance)
+            unique = unique_tasks(instance.playbook_tasks)
+            tasks = {t.name: t for t in unique}
+            deps = build_dependencies(unique)
+            outcomes = {}
+            pending = list(tasks)
+            running = {}
+            limit = max(1, self.config.max_parallel_playbooks)
+            ready_at = queued_at or time.monotonic()
+            with ThreadPoolExecutor(max_workers=limit) as pool:
+                while pending or running:
+                    changed = True
+                    while changed:
+                        changed = False
+                        for name in list(pending):
+                            dep_states = [outcomes.get(d) for d in deps[name]]
+                            blocked = [
+                                d for d, st in zip(deps[name], dep_states)
+                                if st not in (None, PlaybookStatus.SUCCESS, PlaybookStatus.RUNNING)
+                            ]
+                            if blocked:
+                                self._skip_task(
+                                    instance, tasks[name], f"Dependency failed: {blocked[0]}"
+                                )
+                                outcomes[name] = PlaybookStatus.SKIPPED
+                                pending.remove(name)
+                                changed = True
+                            elif self._is_cancelled(instance.instance_id):
+                                self._skip_task(instance, tasks[name], "Cancelled")
+                                outcomes[name] = PlaybookStatus.SKIPPED
+                                pending.remove(name)
+                            elif all(st == PlaybookStatus.SUCCESS for st in dep_states):
+                                future = pool.submit(
+                                    self._run_task, instance, tasks[name], ready_at
+                                )
+                                running[future] = name
+                                pending.remove(name)
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        outcomes[running.pop(future)] = future.result()
+                    ready_at = time.monotonic()
+
+            if PlaybookStatus.RUNNING in outcomes.values():
+                self._finish_instance(instance.instance_id, InstanceStatus.RUNNING)
+                return
+
+            for name in pending:
+                self._skip_task(instance, tasks[name], "Dependency cycle")
+                outcomes[name] = PlaybookStatus.SKIPPED
+
+            self._finish_instance(instance.instance_id, self._final_status(outcomes))
         except Exception:
             logger.exception(f"Error provisioning {instance.instance_id}")
-            self.state.mark_final_status(instance.instance_id, InstanceStatus.FAILED)
+            self._finish_instance(instance.instance_id, InstanceStatus.FAILED)
+
+    def _release(self, instance_id: str, status: Optional[InstanceStatus] = None):
+        with self._lock:
+            status = self._cancelled.pop(instance_id, status)
+            self._active.discard(instance_id)
+            self._drifting.discard(instance_id)
+            for key in [k for k in self._queued if k[0] == instance_id]:
+                del self._queued[key]
+        return status
+
+    def _finish_instance(self, instance_id: str, status: InstanceStatus):
+        status = self._release(instance_id, status)
+        if (self._stopping.is_set() and self.config.restart_policy == "resume" and
+                status not in (InstanceStatus.SUCCESS, InstanceStatus.RUNNING)):
+            status = InstanceStatus.PENDING
+        if status == InstanceStatus.RUNNING:
+            return
+        if status == InstanceStatus.PENDING:
+            self.state.requeue_instance(instance_id)
+        else:
+            self.state.mark_final_status(instance_id, status)
+
+    def _run_task(self, instance, task,
+                  ready_at: Optional[float] = None) -> PlaybookStatus:
+        try:
+            digest = self._task_digest(instance, task)
+            existing = instance.playbook_results.get(task.name)
+            if existing and existing.status == PlaybookStatus.SUCCESS:
+                if existing.content_hash in (None, digest):
+                    return PlaybookStatus.SUCCESS
+                logger.info(f"Content changed for {task.name} on {instance.instance_id}")
+
+            ready_at = ready_at or time.monotonic()
+            if not self._await_start(instance.instance_id, task, ready_at):
+                reason = "Cancelled" if self._is_cancelled(instance.instance_id) else "Shutting down"
+                self._skip_task(instance, task, reason)
+                return PlaybookStatus.SKIPPED
+
+            playbook_state = self.state.start_playbook(
+                instance.instance_id,
+                name=task.name,
+                file=task.file,
+                queue_wait_sec=round(time.monotonic() - ready_at, 3)
+            )
+
+            run = self._run_playbook(instance, task)
+            if run.detached:
+                logger.info(f"Detached {task.name} on {instance.instance_id}")
+                return PlaybookStatus.RUNNING
+            status, error = self._outcome(run)
+            self.state.finish_playbook(
+                instance.instance_id,
+                playbook_state,
+                status,
+                error=error,
+                content_hash=digest,
+                task_timings=self._task_timings(run),
+                resources=run.resources
+            )
+            return status
+        except Exception:
+            logger.exception(f"Error running {task.name} on {instance.instance_id}")
+            return PlaybookStatus.ERROR
+
+    @staticmethod
+    def _task_timings(run: PlaybookRun) -> List[Dict]:
+        if run.task_timings is not None:
+            return run.task_timings
+        return read_task_timings(run.events_file) if run.events_file else []
 
-    def _run_playbook(self, instance, task) -> int:
+    def _await_start(self, instance_id: str, task, ready_at: float) -> bool:
+        try:
+            delay = self.rate_limiter.reserve(task.group, task.name)
+            if delay > 0:
+                self._set_queued(instance_id, task.name, ready_at, "rate_limit")
+                deadline = time.monotonic() + delay
+                while not self._is_cancelled(instance_id) and not self._stopping.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._stopping.wait(min(remaining, 1.0))
+
+            logged = False
+            while not self._is_cancelled(instance_id) and not self._stopping.is_set():
+                reason = self.admission.check()
+                if not reason:
+                    return True
+                self._set_queued(instance_id, task.name, ready_at, "admission")
+                if not logged:
+                    logger.info(f"Waiting to start {instance_id}: {reason}")
+                    logged = True
+                self._stopping.wait(self.config.admission_poll_interval)
+            return False
+        finally:
+            self._set_queued(instance_id, task.name, None)
+
+    @staticmethod
+    def _outcome(run: PlaybookRun):
+        if run.interrupted:
+            return PlaybookStatus.INTERRUPTED, "Interrupted by daemon shutdown"
+        if run.cancelled:
+            return PlaybookStatus.CANCELLED, "Cancelled"
+        if run.timed_out:
+            return PlaybookStatus.TIMEOUT, f"Timed out after {run.timeout}s"
+        if run.rc != 0:
+            return PlaybookStatus.ERROR, f"Exit {run.rc}"
+        return PlaybookStatus.SUCCESS, None
+
+    def _skip_task(self, instance, task, reason: str):
+        logger.warning(f"Skipping {task.name} on {instance.instance_id}: {reason}")
+        self.state.skip_playbook(instance.instance_id, task.name, task.file, reason)
+
+    def _checkpoint(self, instance, task, pid: int, rc_file: Optional[str]):
+        self.state.checkpoint_playbook(instance.instance_id, task.name, pid, rc_file)
+
+    @staticmethod
+    def _final_status(outcomes: dict) -> InstanceStatus:
+        if all(st == PlaybookStatus.SUCCESS for st in outcomes.values()):
+            return InstanceStatus.SUCCESS
+        if any(st == PlaybookStatus.SUCCESS for st in outcomes.values()):
+            return InstanceStatus.PARTIAL_FAILURE
+        return InstanceStatus.FAILED
+
+    def _task_digest(self, instance, task) -> str:
+        return task_digest(task.file, task.vars, render_inventory(instance, task))
+
+    def _run_playbook(self, instance, task) -> PlaybookRun:
+        run = PlaybookRun(timeout=task.timeout or self.config.playbook_timeout or None)
         inventory_path = None
         try:
-            inventory_path = self._write_temp_inventory(instance, task)
+            inventory_path = self.inventories.acquire(render_inventory(instance, task))
             log_dir = Path(self.config.log_dir) / instance.instance_id
             log_dir.mkdir(parents=True, exist_ok=True)
             log_file = log_dir / f"{task.name}.log"
+            run.log_file = str(log_file)
+            run.events_file = str(log_dir / f"{task.name}.events.jsonl")
 
             cmd = ["ansible-playbook", str(task.file), "-i", str(inventory_path), "-v"]
+            if self.config.detach_on_shutdown:
+                run.rc_file = str(log_dir / f"{task.name}.rc")
+                cmd = detachable_command(cmd, run.rc_file)
 
-            with open(log_file, "a") as lf:
-                lf.write(f"\n=== {datetime.utcnow()} START {task.name} ===\n")
+            tap = not self.config.detach_on_shutdown and self._wants_tap(instance.instance_id)
+            run.tapped = tap
+            with open(log_file, "ab") as lf:
+                lf.write(f"\n=== {datetime.utcnow()} START {task.name} ===\n".encode())
+                lf.flush()
                 process = subprocess.Popen(
                     cmd,
-                    stdout=subprocess.PIPE,
+                    stdout=subprocess.PIPE if tap else lf,
                     stderr=subprocess.STDOUT,
-                    text=True,
-                    bufsize=1
+                    env=self._build_env(instance, run.events_file),
+                    start_new_session=True
                 )
-                if process.stdout:
-                    for line in process.stdout:
-                        lf.write(line)
-                        logger.debug(f"[{instance.instance_id}] {line.strip()}")
-                rc = process.wait()
-                lf.write(f"\n=== END rc={rc} ===\n")
-            return rc
+                self._checkpoint(instance, task, process.pid, run.rc_file)
+                timer = self._track(instance.instance_id, task.name, process, run)
+                try:
+                    if tap:
+                        self._pump_output(instance.instance_id, task.name, process, lf)
+                    self._wait(process, run)
+                finally:
+                    run.finished.set()
+                    self._untrack(instance.instance_id, task.name, timer)
+                if run.detached:
+                    lf.write(f"\n=== DETACHED pid={process.pid} ===\n".encode())
+                    return run
+                if run.timed_out:
+                    lf.write(f"\n=== TIMEOUT after {run.timeout}s ===\n".encode())
+                elif run.cancelled:
+                    lf.write(b"\n=== CANCELLED ===\n")
+                lf.write(f"\n=== END rc={run.rc} ===\n".encode())
+            return run
         except Exception:
             logger.exception(f"Fail {task.name}")
-            return 1
+            run.rc = 1
+            return run
         finally:
-            if inventory_path and inventory_path.exists():
-                try:
-                    inventory_path.unlink(missing_ok=True)
-                except Exception:
-                    pass
+            if inventory_path:
+                self.inventories.release(inventory_path)
 
-    def _write_temp_inventory(self, instance, task) -> Path:
+    def _wait(self, process, run: PlaybookRun):
+        if not hasattr(os, "wait4"):
+            run.rc = process.wait()
+            return
         try:
-            group = next((g for g in instance.groups if g.name == task.group), None)
-            ansible_user = (
-                task.vars.get("ansible_user") or
-                (group.vars.get("ansible_user") if group else None) or
-                instance.tags.get("ansible_user") or
-                "ubuntu"
-            )
-            ssh_key = (
-                task.key or
-                (group.key if group else None) or
-                instance.tags.get("ansible_ssh_private_key_file")
-            )
+            if self.config.detach_on_shutdown:
+                while True:
+                    pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+                    if pid:
+                        break
+                    if self._detaching.is_set():
+                        run.detached = True
+                        return
+                    self._detaching.wait(0.5)
+            else:
+                _, status, usage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            run.rc = process.wait()
+            return
+        process.returncode = os.waitstatus_to_exitcode(status)
+        run.rc = process.returncode
+        max_rss = usage.ru_maxrss
+        if sys.platform == "darwin":
+            max_rss //= 1024
+        run.resources = {
+            "cpu_user_sec": round(usage.ru_utime, 3),
+            "cpu_sys_sec": round(usage.ru_stime, 3),
+            "max_rss_kb": max_rss,
+            "io_read_blocks": usage.ru_inblock,
+            "io_write_blocks": usage.ru_oublock,
+        }
 
-            if ssh_key and "~" in str(ssh_key):
-                ssh_key = Path(ssh_key).expanduser()
+    def _pump_output(self, instance_id: str, name: str, process, lf):
+        fd = process.stdout.fileno()
+        debug = logger.isEnabledFor(logging.DEBUG)
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            lf.write(chunk)
+            self._publish(instance_id, name, chunk)
+            if debug:
+                logger.debug("[%s] %s", instance_id, chunk.decode(errors="replace").rstrip())
+        process.stdout.close()
 
-            jump_host = task.jump_host or (group.jump_host if group else None)
-            tmp = tempfile.NamedTemporaryFile(
-                mode="w",
-                suffix=".ini",
-                delete=False,
-                encoding='utf-8'
-            )
+    def _track(self, instance_id: str, name: str, process, run: PlaybookRun):
+        with self._lock:
+            self._processes.setdefault(instance_id, {})[name] = (process, run)
+            cancel_status = self._cancelled.get(instance_id)
+        if cancel_status is not None:
+            self._stop_run(process, run, cancel_status)
+        timer = None
+        if run.timeout:
+            timer = threading.Timer(run.timeout, self._expire, args=(process, run))
+            timer.daemon = True
+            timer.start()
+        return timer
+
+    def _untrack(self, instance_id: str, name: str, timer):
+        if timer:
+            timer.cancel()
+        with self._lock:
+            processes = self._processes.get(instance_id, {})
+            processes.pop(name, None)
+            if not processes:
+                self._processes.pop(instance_id, None)
+
+    def _expire(self, process, run: PlaybookRun):
+        if run.finished.is_set():
+            return
+        logger.warning(f"Playbook timed out after {run.timeout}s (pid {process.pid})")
+        run.timed_out = True
+        self._terminate(process, run)
+
+    def _terminate(self, process, run: PlaybookRun):
+        self._signal_group(process, signal.SIGTERM)
+
+        def kill():
+            if not run.finished.wait(self.config.playbook_kill_grace):
+                logger.warning(f"Killing process group {process.pid}")
+                self._signal_group(process, signal.SIGKILL)
 
-            tmp.write(f"[{task.group}]\n{instance.ip_address}\n\n[all:vars]\n")
-            tmp.write(f"ansible_user={ansible_user}\n")
-            tmp.write("ansible_python_interpreter=/usr/bin/python3\n")
-            tmp.write("ansible_host_key_checking=False\n")
-            tmp.write("ansible_ssh_timeout=30\n")
-
-            if ssh_key and Path(ssh_key).exists():
-                tmp.write(f"ansible_ssh_private_key_file={ssh_key}\n")
-
-            ssh_args = ["-o StrictHostKeyChecking=no", "-o UserKnownHostsFile=/dev/null"]
-            if jump_host:
-                proxy_cmd = self._get_proxy_command(jump_host, ansible_user, ssh_key)
-                if proxy_cmd:
-                    ssh_args.append(f'-o ProxyCommand="{proxy_cmd}"')
-
-            tmp.write(f"ansible_ssh_common_args='{' '.join(ssh_args)}'\n")
-            for k, v in instance.tags.items():
-                if isinstance(v, (str, int, float, bool)):
-                    tmp.write(f"{k}={v}\n")
-
-            tmp.flush()
-            tmp.close()
-            return Path(tmp.name)
+        threading.Thread(target=kill, daemon=True).start()
+
+    @staticmethod
+    def _signal_group(process, sig):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _build_env(self, instance, events_file: str) -> dict:
+        env = os.environ.copy()
+        env.update(self.facts.env(instance))
+        env.update(callback_env(events_file, env))
+        return env
+
+    def recover(self):
+        running = self.state.get_instances(status=InstanceStatus.RUNNING)
+        if not running:
+            return
+        if self.config.restart_policy != "resume":
+            logger.warning(f"Failing {len(running)} instances interrupted by restart")
+            self.state.mark_all_running_failed()
+            return
+        for inst in running:
+            self._recover_instance(inst)
+
+    def _recover_instance(self, inst):
+        tasks = {t.name: t for t in inst.playbook_tasks}
+        detached = []
+        for result in list(inst.playbook_results.values()):
+            if result.status != PlaybookStatus.RUNNING:
+                continue
+            task = tasks.get(result.name)
+            if task and result.rc_file and self._detached_alive(result.pid, result.rc_file):
+                detached.append((task, result))
+            elif task and result.rc_file and os.path.exists(result.rc_file):
+                self._collect_detached(inst, task, result)
+            else:
+                self.state.interrupt_playbook(inst.instance_id, result.name)
+        if detached:
+            logger.info(f"Adopting {len(detached)} detached runs on {inst.instance_id}")
+            with self._lock:
+                self._active.add(inst.instance_id)
+            self.pool.submit(self._watch_detached, inst, detached)
+        else:
+            logger.info(f"Resuming {inst.instance_id}")
+            self.state.requeue_instance(inst.instance_id)
+
+    def _watch_detached(self, instance, detached: list):
+        try:
+            remaining = list(detached)
+            while remaining and not self._stopping.is_set():
+                for task, result in list(remaining):
+                    if not self._detached_alive(result.pid, result.rc_file):
+                        self._collect_detached(instance, task, result)
+                        remaining.remove((task, result))
+                if remaining:
+                    self._stopping.wait(1.0)
+            status = InstanceStatus.RUNNING if remaining else InstanceStatus.PENDING
+            self._finish_instance(instance.instance_id, status)
         except Exception:
-            logger.exception("Inv error")
-            raise
-
-    def _get_proxy_command(self, jump_host, ansible_user, ssh_key) -> str:
-        if isinstance(jump_host, str):
-            return f'ssh -W %h:%p -q {jump_host}'
-        if isinstance(jump_host, dict):
-            u = jump_host.get('user', ansible_user)
-            h = jump_host.get('host')
-            p = jump_host.get('port', 22)
-            ident = ""
-            if ssh_key and Path(ssh_key).exists():
-                ident = f"-i {ssh_key}"
-            return f'ssh {ident} -W %h:%p -q -p {p} {u}@{h}'
-        return ""
+            logger.exception(f"Error watching detached runs on {instance.instance_id}")
+            self._finish_instance(instance.instance_id, InstanceStatus.PENDING)
+
+    def _collect_detached(self, instance, task, result):
+        try:
+            rc = int(Path(result.rc_file).read_text().strip())
+        except (OSError, ValueError):
+            self.state.interrupt_playbook(instance.instance_id, result.name)
+            return
+        events_file = Path(self.config.log_dir) / instance.instance_id / f"{task.name}.events.jsonl"
+        status, error = self._outcome(PlaybookRun(rc=rc))
+        logger.info(f"Detached {task.name} on {instance.instance_id} finished rc={rc}")
+        self.state.finish_playbook(
+            instance.instance_id,
+            result,
+            status,
+            error=error,
+            content_hash=self._task_digest(instance, task),
+            task_timings=read_task_timings(events_file),
+        )
+
+    @staticmethod
+    def _detached_alive(pid: Optional[int], rc_file: str) -> bool:
+        if not pid:
+            return False
+        try:
+            cmdline = Path(f"/proc/{pid}/cmdline").read_bytes()
+            return rc_file.encode() in cmdline
+        except FileNotFoundError:
+            return False
+        except OSError:
+            pass
+        try:
+            os.kill(pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
 
     def shutdown(self):
-        self.pool.shutdown(wait=True)
-        logger.info("Executor shutdown")
\ No newline at end of file
+        self._stopping.set()
+        grace = self.config.shutdown_grace
+        if grace > 0:
+            deadline = time.monotonic() + grace
+            if self._has_processes():
+                logger.info(f"Waiting up to {grace}s for running playbooks")
+            while self._has_processes() and time.monotonic() < deadline:
+                time.sleep(0.5)
+        if self.config.detach_on_shutdown:
+            status = InstanceStatus.RUNNING
+            self._detaching.set()
+        elif self.config.restart_policy == "resume":
+            status = InstanceStatus.PENDING
+        else:
+            status = InstanceStatus.FAILED
+        with self._lock:
+            active = list(self._active)
+        for instance_id in active:
+            self.cancel(instance_id, status=status)
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        logger.info("Executor shutdown")
+
+    def _has_processes(self) -> bool:
+        with self._lock:
+            return bool(self._processes)
+
+
+def create_executor(state, config: DaemonConfig) -> AnsibleExecutor:
+    if config.executor == "queue":
+        from ansible_autoprovisioner.worker import QueueExecutor
+        return QueueExecutor(state, config)
+    if config.executor == "fake":
+        from ansible_autoprovisioner.fake import FakeExecutor
+        return FakeExecutor(state, config)
+    return AnsibleExecutor(state, config)
+
+
+def detachable_command(cmd: List[str], rc_file: str) -> List[str]:
+    script = 'rm -f "$0"; "$@"; rc=$?; echo $rc > "$0.tmp" && mv "$0.tmp" "$0"; exit $rc'
+    return ["sh", "-c", script, rc_file, *cmd]
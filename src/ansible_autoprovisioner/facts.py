@@ -0,0 +1,52 @@
+import logging
+import shutil
+from pathlib import Path
+from typing import Dict
+
+from ansible_autoprovisioner.digest import instance_fingerprint
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_FILE = ".fingerprint"
+
+
+class FactCache:
+    def __init__(self, cache_dir: str, ttl: int = 3600):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def path_for(self, instance_id: str) -> Path:
+        return self.cache_dir / instance_id
+
+    def prepare(self, instance) -> Path:
+        path = self.path_for(instance.instance_id)
+        marker = path / FINGERPRINT_FILE
+        fingerprint = instance_fingerprint(instance.ip_address, instance.tags)
+        if marker.exists() and marker.read_text().strip() != fingerprint:
+            logger.info(f"Facts invalidated for {instance.instance_id}")
+            shutil.rmtree(path, ignore_errors=True)
+        path.mkdir(parents=True, exist_ok=True)
+        if not marker.exists():
+            marker.write_text(fingerprint)
+        return path
+
+    def env(self, instance) -> Dict[str, str]:
+        if not self.enabled:
+            return {}
+        path = self.path_for(instance.instance_id)
+        return {
+            "ANSIBLE_GATHERING": "smart",
+            "ANSIBLE_CACHE_PLUGIN": "jsonfile",
+            "ANSIBLE_CACHE_PLUGIN_CONNECTION": str(path),
+            "ANSIBLE_CACHE_PLUGIN_TIMEOUT": str(self.ttl),
+        }
+
+    def invalidate(self, instance_id: str):
+        path = self.path_for(instance_id)
+        if path.exists():
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Facts removed for {instance_id}")
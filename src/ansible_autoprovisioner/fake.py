@@ -0,0 +1,69 @@
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+from ansible_autoprovisioner.config import DaemonConfig
+from ansible_autoprovisioner.executor import AnsibleExecutor, PlaybookRun
+from ansible_autoprovisioner.state import InstanceStatus
+
+logger = logging.getLogger(__name__)
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+class FakeExecutor(AnsibleExecutor):
+    def __init__(self, state, config: DaemonConfig, max_workers: int = 4):
+        super().__init__(state, config, max_workers=max_workers)
+        if config.fake_duration_distribution not in DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown fake_duration_distribution '{config.fake_duration_distribution}', "
+                f"expected one of: {', '.join(DISTRIBUTIONS)}"
+            )
+        self.random = random.Random(config.fake_seed)
+        self._random_lock = threading.Lock()
+        self.runs = 0
+
+    def sample(self):
+        mean = max(0.0, self.config.fake_duration)
+        distribution = self.config.fake_duration_distribution
+        with self._random_lock:
+            self.runs += 1
+            failed = self.random.random() < self.config.fake_failure_rate
+            if mean == 0 or distribution == "fixed":
+                duration = mean
+            elif distribution == "uniform":
+                duration = self.random.uniform(0, 2 * mean)
+            elif distribution == "exponential":
+                duration = self.random.expovariate(1 / mean)
+            else:
+                duration = self.random.lognormvariate(0, 0.5) * mean / 1.133
+        return duration, failed
+
+    def _run_playbook(self, instance, task) -> PlaybookRun:
+        run = PlaybookRun(timeout=task.timeout or self.config.playbook_timeout or None)
+        duration, failed = self.sample()
+        if run.timeout and duration > run.timeout:
+            duration = run.timeout
+            run.timed_out = True
+        cancel_status = self._sleep(instance.instance_id, duration)
+        if cancel_status == InstanceStatus.PENDING:
+            run.interrupted = True
+        elif cancel_status is not None:
+            run.cancelled = True
+        run.rc = 2 if failed or run.timed_out or cancel_status is not None else 0
+        run.task_timings = []
+        return run
+
+    def _sleep(self, instance_id: str, duration: float) -> Optional[InstanceStatus]:
+        deadline = time.monotonic() + duration
+        while True:
+            with self._lock:
+                cancel_status = self._cancelled.get(instance_id)
+            if cancel_status is not None and cancel_status != InstanceStatus.RUNNING:
+                return cancel_status
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(remaining, 0.5))
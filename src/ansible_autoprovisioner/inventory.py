@@ -0,0 +1,214 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shlex
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ansible_autoprovisioner.state import InstanceStatus, PlaybookTask, StateManager
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE_ENV = "AUTOPROVISIONER_STATE_FILE"
+
+
+def connection_params(instance, task):
+    group = next((g for g in instance.groups if g.name == task.group), None)
+    ansible_user = (
+        task.vars.get("ansible_user") or
+        (group.vars.get("ansible_user") if group else None) or
+        instance.tags.get("ansible_user") or
+        "ubuntu"
+    )
+    ssh_key = (
+        task.key or
+        (group.key if group else None) or
+        instance.tags.get("ansible_ssh_private_key_file")
+    )
+
+    if ssh_key and "~" in str(ssh_key):
+        ssh_key = Path(ssh_key).expanduser()
+
+    jump_host = task.jump_host or (group.jump_host if group else None)
+    return ansible_user, ssh_key, jump_host
+
+
+def proxy_command(jump_host, ansible_user, ssh_key) -> str:
+    if isinstance(jump_host, str):
+        return f'ssh -W %h:%p -q {jump_host}'
+    if isinstance(jump_host, dict):
+        u = jump_host.get('user', ansible_user)
+        h = jump_host.get('host')
+        p = jump_host.get('port', 22)
+        ident = ""
+        if ssh_key and Path(ssh_key).exists():
+            ident = f"-i {ssh_key}"
+        return f'ssh {ident} -W %h:%p -q -p {p} {u}@{h}'
+    return ""
+
+
+def host_vars(instance, task) -> List[Tuple[str, Any]]:
+    ansible_user, ssh_key, jump_host = connection_params(instance, task)
+    pairs = [
+        ("ansible_user", ansible_user),
+        ("ansible_python_interpreter", "/usr/bin/python3"),
+        ("ansible_host_key_checking", "False"),
+        ("ansible_ssh_timeout", "30"),
+    ]
+
+    if ssh_key and Path(ssh_key).exists():
+        pairs.append(("ansible_ssh_private_key_file", str(ssh_key)))
+
+    ssh_args = ["-o StrictHostKeyChecking=no", "-o UserKnownHostsFile=/dev/null"]
+    if jump_host:
+        proxy_cmd = proxy_command(jump_host, ansible_user, ssh_key)
+        if proxy_cmd:
+            ssh_args.append(f'-o ProxyCommand="{proxy_cmd}"')
+
+    pairs.append(("ansible_ssh_common_args", " ".join(ssh_args)))
+    for k, v in instance.tags.items():
+        if isinstance(v, (str, int, float, bool)):
+            pairs.append((k, v))
+    return pairs
+
+
+def render_inventory(instance, task) -> str:
+    lines = [f"[{task.group}]", instance.ip_address, "", "[all:vars]"]
+    for k, v in host_vars(instance, task):
+        if k == "ansible_ssh_common_args":
+            lines.append(f"{k}='{v}'")
+        else:
+            lines.append(f"{k}={v}")
+    return "\n".join(lines) + "\n"
+
+
+def render_batch(entries: list) -> str:
+    groups: Dict[str, List[str]] = {}
+    for instance, task in entries:
+        inline = " ".join(
+            f"{k}={shlex.quote(str(v))}" for k, v in dict(host_vars(instance, task)).items()
+        )
+        groups.setdefault(task.group, []).append(f"{instance.ip_address} {inline}")
+    lines = []
+    for group, hosts in groups.items():
+        lines += [f"[{group}]", *hosts, ""]
+    return "\n".join(lines)
+
+
+class InventoryCache:
+    def __init__(self, cache_dir: str, ttl: int = 86400):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._in_use: Dict[str, int] = {}
+
+    def path_for(self, content: str) -> Path:
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest[:32]}.ini"
+
+    def acquire(self, content: str) -> Path:
+        path = self.path_for(content)
+        with self._lock:
+            self._in_use[path.name] = self._in_use.get(path.name, 0) + 1
+            if path.exists():
+                os.utime(path)
+                return path
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp, path)
+            return path
+
+    def release(self, path: Path):
+        with self._lock:
+            count = self._in_use.get(path.name, 0) - 1
+            if count > 0:
+                self._in_use[path.name] = count
+            else:
+                self._in_use.pop(path.name, None)
+
+    def gc(self, now: Optional[float] = None) -> int:
+        if not self.cache_dir.exists():
+            return 0
+        now = time.time() if now is None else now
+        removed = 0
+        with self._lock:
+            for path in self.cache_dir.iterdir():
+                if path.name in self._in_use:
+                    continue
+                try:
+                    if now - path.stat().st_mtime > self.ttl:
+                        path.unlink()
+                        removed += 1
+                except OSError:
+                    continue
+        if removed:
+            logger.info(f"Removed {removed} stale inventories")
+        return removed
+
+
+def inventory_entries(state) -> List[Tuple[Any, PlaybookTask]]:
+    entries = []
+    for inst in state.get_instances():
+        if inst.overall_status == InstanceStatus.ORPHANED:
+            continue
+        group_names = [g.name for g in inst.groups] or [t.group for t in inst.playbook_tasks]
+        for name in dict.fromkeys(group_names):
+            task = next(
+                (t for t in inst.playbook_tasks if t.group == name),
+                PlaybookTask(name="", file="", group=name),
+            )
+            entries.append((inst, task))
+    return entries
+
+
+def dynamic_inventory(state) -> Dict[str, Any]:
+    inventory: Dict[str, Any] = {"_meta": {"hostvars": {}}}
+    hostvars = inventory["_meta"]["hostvars"]
+    for inst, task in inventory_entries(state):
+        group = inventory.setdefault(task.group, {"hosts": [], "vars": {}})
+        group["hosts"].append(inst.ip_address)
+        if inst.ip_address not in hostvars:
+            hostvars[inst.ip_address] = dict(host_vars(inst, task))
+            hostvars[inst.ip_address].update({
+                "autoprovisioner_instance_id": inst.instance_id,
+                "autoprovisioner_status": inst.overall_status.value,
+            })
+    return inventory
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Ansible dynamic inventory from ansible-autoprovisioner state"
+    )
+    parser.add_argument("--list", action="store_true", help="List all hosts")
+    parser.add_argument("--host", help="Show variables for a host")
+    parser.add_argument("--ini", action="store_true", help="Print a static INI inventory")
+    parser.add_argument(
+        "--state-file",
+        default=os.environ.get(STATE_FILE_ENV, "state.json"),
+        help=f"Path to state file (default: ${STATE_FILE_ENV} or state.json)",
+    )
+    args = parser.parse_args(argv)
+
+    state = StateManager(state_file=args.state_file)
+    if args.ini:
+        print(render_batch(inventory_entries(state)), end="")
+        return 0
+    inventory = dynamic_inventory(state)
+    if args.host:
+        print(json.dumps(inventory["_meta"]["hostvars"].get(args.host, {}), indent=2))
+    else:
+        print(json.dumps(inventory, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
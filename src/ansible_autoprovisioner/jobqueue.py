@@ -0,0 +1,215 @@
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    instance_id TEXT NOT NULL,
+    task TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until);
+CREATE INDEX IF NOT EXISTS jobs_instance ON jobs (instance_id);
+"""
+
+
+@dataclass
+class Job:
+    id: int
+    instance_id: str
+    task: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    status: str = QUEUED
+    worker: Optional[str] = None
+    lease_until: Optional[float] = None
+    attempts: int = 0
+    cancel_requested: bool = False
+    result: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_row(cls, row) -> 'Job':
+        return cls(
+            id=row["id"],
+            instance_id=row["instance_id"],
+            task=row["task"],
+            payload=json.loads(row["payload"]),
+            status=row["status"],
+            worker=row["worker"],
+            lease_until=row["lease_until"],
+            attempts=row["attempts"],
+            cancel_requested=bool(row["cancel_requested"]),
+            result=json.loads(row["result"]) if row["result"] else None,
+        )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "instance_id": self.instance_id,
+            "task": self.task,
+            "status": self.status,
+            "worker": self.worker,
+            "lease_until": self.lease_until,
+            "attempts": self.attempts,
+            "cancel_requested": self.cancel_requested,
+        }
+
+
+class JobQueue:
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def publish(self, instance_id: str, task: str, payload: Dict[str, Any]) -> int:
+        now = time.time()
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (instance_id, task, payload, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (instance_id, task, json.dumps(payload, default=str), now, now),
+            )
+            return cur.lastrowid
+
+    def claim(self, worker: str, lease_sec: float) -> Optional[Job]:
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire(conn, now)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) "
+                "ORDER BY id LIMIT 1",
+                (QUEUED, LEASED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            if row["status"] == LEASED:
+                logger.warning(f"Reclaiming job {row['id']} from {row['worker']}")
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (LEASED, worker, now + lease_sec, now, row["id"]),
+            )
+            job = Job.from_row(row)
+        job.status = LEASED
+        job.worker = worker
+        job.lease_until = now + lease_sec
+        job.attempts += 1
+        return job
+
+    def _expire(self, conn, now: float):
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, updated_at = ? "
+            "WHERE status = ? AND lease_until < ? AND cancel_requested = 1",
+            (DONE, json.dumps({"rc": 1, "cancelled": True}), now, LEASED, now),
+        )
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, updated_at = ? "
+            "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+            (DONE, json.dumps({"rc": 1, "error": "Lease expired"}), now,
+             LEASED, now, self.max_attempts),
+        )
+
+    def heartbeat(self, job_id: int, worker: str, lease_sec: float) -> str:
+        now = time.time()
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (now + lease_sec, now, job_id, worker, LEASED),
+            )
+            if cur.rowcount == 0:
+                return "lost"
+            row = conn.execute(
+                "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            return "cancel" if row["cancel_requested"] else "ok"
+
+    def complete(self, job_id: int, worker: str, result: Dict[str, Any]) -> bool:
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (DONE, json.dumps(result, default=str), time.time(), job_id, worker, LEASED),
+            )
+            return cur.rowcount == 1
+
+    def cancel(self, job_id: int):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, updated_at = ? "
+                "WHERE id = ? AND status = ?",
+                (DONE, json.dumps({"rc": 1, "cancelled": True}), now, job_id, QUEUED),
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? "
+                "WHERE id = ? AND status = ?",
+                (now, job_id, LEASED),
+            )
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def find(self, instance_id: str) -> List[Job]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE instance_id = ? ORDER BY id", (instance_id,)
+            ).fetchall()
+        return [Job.from_row(r) for r in rows]
+
+    def ack(self, job_id: int):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+            ).fetchall()
+        counts = {QUEUED: 0, LEASED: 0, DONE: 0}
+        counts.update({r["status"]: r["n"] for r in rows})
+        return counts
@@ -1,7 +1,6 @@
 import sys
 import logging
 import os
-from ansible_autoprovisioner.daemon import ProvisioningDaemon
 from ansible_autoprovisioner.config import DaemonConfig
 from ansible_autoprovisioner.utils.cli import parse_arguments
 from ansible_autoprovisioner.utils.logging import setup_logging
@@ -26,6 +25,11 @@ def main() -> int:
         if args.dry_run:
             logger.info("Configuration validated successfully (dry-run)")
             return 0
+        if args.mode == "worker":
+            from ansible_autoprovisioner.worker import Worker
+            Worker(config, worker_id=args.worker_id, concurrency=args.concurrency).run()
+            return 0
+        from ansible_autoprovisioner.daemon import ProvisioningDaemon
         daemon = ProvisioningDaemon(config)
         daemon.run()
         return 0
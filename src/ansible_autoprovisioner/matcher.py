@@ -1,10 +1,14 @@
 import fnmatch
-from typing import List, Dict, Any
+import logging
+from typing import List, Dict, Any, Optional
 
 from ansible_autoprovisioner.config import DaemonConfig, Rule
 from ansible_autoprovisioner.detectors.base import DetectedInstance
+from ansible_autoprovisioner.digest import rule_digest
 from ansible_autoprovisioner.state import GroupInfo, PlaybookTask
 
+logger = logging.getLogger(__name__)
+
 
 def match_instance_to_groups(instance: DetectedInstance, config: DaemonConfig) -> List[GroupInfo]:
     matched = []
@@ -21,7 +25,8 @@ def match_instance_to_groups(instance: DetectedInstance, config: DaemonConfig) -
     return matched
 
 
-def create_playbook_tasks(instance: DetectedInstance, config: DaemonConfig) -> List[PlaybookTask]:
+def create_playbook_tasks(instance: DetectedInstance, config: DaemonConfig,
+                          revisions: Optional[Dict[str, str]] = None) -> List[PlaybookTask]:
     matched_groups = match_instance_to_groups(instance, config)
     tasks = []
     for group_info in matched_groups:
@@ -29,7 +34,8 @@ def create_playbook_tasks(instance: DetectedInstance, config: DaemonConfig) -> L
             if rule_name in config.rules:
                 rule = config.rules[rule_name]
                 if tags_match_criteria(instance.tags, rule.match):
-                    tasks.append(create_task(rule, group_info))
+                    revision = revisions.get(rule_name) if revisions else None
+                    tasks.append(create_task(rule, group_info, revision))
 
     return tasks
 
@@ -47,7 +53,8 @@ def tags_match_criteria(tags: Dict[str, str], criteria: Dict[str, Any]) -> bool:
     return True
 
 
-def create_task(rule: Rule, group_info: GroupInfo) -> PlaybookTask:
+def create_task(rule: Rule, group_info: GroupInfo,
+                revision: Optional[str] = None) -> PlaybookTask:
     task_vars = {**group_info.vars, **rule.vars}
     return PlaybookTask(
         name=rule.name,
@@ -55,15 +62,39 @@ def create_task(rule: Rule, group_info: GroupInfo) -> PlaybookTask:
         group=group_info.name,
         key=group_info.key,
         jump_host=group_info.jump_host,
-        vars=task_vars
+        vars=task_vars,
+        depends_on=rule.depends_on,
+        timeout=rule.timeout,
+        revision=revision
     )
 
 
+def rule_revision(rule: Rule) -> str:
+    return rule_digest(rule.playbook, {
+        "match": rule.match,
+        "vars": rule.vars,
+        "depends_on": rule.depends_on,
+        "timeout": rule.timeout,
+    })
+
+
 class RuleMatcher:
     def __init__(self, config: DaemonConfig):
         self.config = config
+        self.revisions: Dict[str, str] = {}
+
+    def refresh(self) -> Dict[str, str]:
+        revisions = {name: rule_revision(rule) for name, rule in self.config.rules.items()}
+        changed = [
+            name for name, rev in revisions.items()
+            if self.revisions and self.revisions.get(name) != rev
+        ]
+        if changed:
+            logger.info(f"Rules changed: {', '.join(sorted(changed))}")
+        self.revisions = revisions
+        return revisions
 
     def match(self, instance: DetectedInstance):
         groups = match_instance_to_groups(instance, self.config)
-        tasks = create_playbook_tasks(instance, self.config)
+        tasks = create_playbook_tasks(instance, self.config, self.revisions)
         return groups, tasks
@@ -1,7 +1,7 @@
 import logging
 import os
 
-from . import slack, telegram 
+from ansible_autoprovisioner.state import FAILED_PLAYBOOK_STATUSES
 from .registry import NotifierRegistry
 
 logger = logging.getLogger(__name__)
@@ -73,7 +73,7 @@ class NotifierManager:
         try:
             failed = [
                 r for r in instance.playbook_results.values()
-                if r.status == "error" and r.log_file
+                if r.status in FAILED_PLAYBOOK_STATUSES and r.log_file
             ]
             if not failed:
                 return None
@@ -1,11 +1,38 @@
+from ansible_autoprovisioner.utils.loader import entry_points, resolve
+
+ENTRY_POINT_GROUP = "ansible_autoprovisioner.notifiers"
+
+
 class NotifierRegistry:
-    _registry = {}
+    _registry = {
+        "slack": "ansible_autoprovisioner.notifications.slack:SlackNotifier",
+        "telegram": "ansible_autoprovisioner.notifications.telegram:TelegramNotifier",
+    }
+    _discovered = False
 
     @classmethod
     def create(cls, name: str, **options):
+        return cls.load(name)(**options)
+
+    @classmethod
+    def load(cls, name: str):
+        if name not in cls._registry:
+            cls.discover()
         if name not in cls._registry:
             raise ValueError(f"Unknown notifier: {name}")
-        return cls._registry[name](**options)
+        notifier_cls = cls._registry[name]
+        if not isinstance(notifier_cls, type):
+            notifier_cls = resolve(notifier_cls)
+            cls._registry[name] = notifier_cls
+        return notifier_cls
+
+    @classmethod
+    def discover(cls):
+        if cls._discovered:
+            return
+        cls._discovered = True
+        for name, ep in entry_points(ENTRY_POINT_GROUP).items():
+            cls._registry.setdefault(name, ep)
 
     @classmethod
     def register(cls, name: str, notifier_cls):
@@ -13,4 +40,5 @@ class NotifierRegistry:
 
     @classmethod
     def available(cls):
+        cls.discover()
         return list(cls._registry.keys())
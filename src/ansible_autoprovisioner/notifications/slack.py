@@ -3,7 +3,6 @@ import logging
 import requests
 
 from .base import BaseNotifier
-from .registry import NotifierRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +25,3 @@ class SlackNotifier(BaseNotifier):
             requests.post(self.webhook_url, json=payload, timeout=5)
         except Exception:
             logger.exception("Slack notify fail")
-
-
-NotifierRegistry.register("slack", SlackNotifier)
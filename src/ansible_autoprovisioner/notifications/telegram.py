@@ -3,7 +3,6 @@ import logging
 import requests
 
 from .base import BaseNotifier
-from .registry import NotifierRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +31,3 @@ class TelegramNotifier(BaseNotifier):
             requests.post(url, json=payload, timeout=5)
         except Exception:
             logger.exception("Telegram notify fail")
-
-
-NotifierRegistry.register("telegram", TelegramNotifier)
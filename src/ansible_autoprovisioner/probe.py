@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProbeTarget:
+    instance_id: str
+    host: str
+    port: int = 22
+    jump_command: Optional[List[str]] = None
+
+
+def build_jump_command(jump_host, host: str, port: int, ansible_user: str,
+                       ssh_key=None, timeout: float = 5.0) -> List[str]:
+    cmd = [
+        "ssh",
+        "-o", "BatchMode=yes",
+        "-o", "StrictHostKeyChecking=no",
+        "-o", "UserKnownHostsFile=/dev/null",
+        "-o", f"ConnectTimeout={int(max(1, timeout))}",
+        "-q",
+        "-W", f"{host}:{port}",
+    ]
+    if isinstance(jump_host, str):
+        return cmd + [jump_host]
+    if ssh_key and Path(ssh_key).exists():
+        cmd += ["-i", str(ssh_key)]
+    user = jump_host.get("user", ansible_user)
+    cmd += ["-p", str(jump_host.get("port", 22)), f"{user}@{jump_host.get('host')}"]
+    return cmd
+
+
+async def _probe_direct(target: ProbeTarget, timeout: float, banner: bool) -> bool:
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(target.host, target.port), timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return False
+    try:
+        if not banner:
+            return True
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        return line.startswith(b"SSH-")
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+
+async def _probe_jump(target: ProbeTarget, timeout: float) -> bool:
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *target.jump_command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        logger.exception(f"Cannot start jump probe for {target.instance_id}")
+        return False
+    try:
+        line = await asyncio.wait_for(proc.stdout.readline(), timeout)
+        return line.startswith(b"SSH-")
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+        await proc.wait()
+
+
+async def _probe_targets(targets: List[ProbeTarget], timeout: float, banner: bool,
+                         concurrency: int) -> Dict[str, bool]:
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def probe(target: ProbeTarget):
+        async with semaphore:
+            if target.jump_command:
+                ok = await _probe_jump(target, timeout)
+            else:
+                ok = await _probe_direct(target, timeout, banner)
+            return target.instance_id, ok
+
+    results = await asyncio.gather(*(probe(t) for t in targets))
+    return dict(results)
+
+
+def probe_all(targets: List[ProbeTarget], timeout: float = 5.0, banner: bool = True,
+              concurrency: int = 256) -> Dict[str, bool]:
+    if not targets:
+        return {}
+    return asyncio.run(_probe_targets(targets, timeout, banner, concurrency))
+
+
+class ReachabilityProber:
+    def __init__(self, config, connection_params: Callable):
+        self.config = config
+        self.connection_params = connection_params
+
+    def target_for(self, instance) -> ProbeTarget:
+        port = int(instance.tags.get("ansible_port", 22))
+        target = ProbeTarget(instance.instance_id, instance.ip_address, port)
+        if instance.playbook_tasks:
+            ansible_user, ssh_key, jump_host = self.connection_params(
+                instance, instance.playbook_tasks[0]
+            )
+            if jump_host:
+                target.jump_command = build_jump_command(
+                    jump_host, instance.ip_address, port, ansible_user, ssh_key,
+                    timeout=self.config.ssh_probe_timeout,
+                )
+        return target
+
+    def probe(self, instances: list) -> Dict[str, bool]:
+        return probe_all(
+            [self.target_for(i) for i in instances],
+            timeout=self.config.ssh_probe_timeout,
+            banner=self.config.ssh_probe_banner,
+            concurrency=self.config.ssh_probe_concurrency,
+        )
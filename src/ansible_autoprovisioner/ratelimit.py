@@ -0,0 +1,57 @@
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive: {rate}")
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        with self._lock:
+            now = time.monotonic() if now is None else now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+class StartRateLimiter:
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None,
+                 group_rates: Optional[Dict[str, float]] = None,
+                 rule_rates: Optional[Dict[str, float]] = None):
+        self.global_bucket = TokenBucket(rate, burst) if rate else None
+        self.group_buckets = {
+            name: TokenBucket(r) for name, r in (group_rates or {}).items() if r
+        }
+        self.rule_buckets = {
+            name: TokenBucket(r) for name, r in (rule_rates or {}).items() if r
+        }
+
+    @classmethod
+    def from_config(cls, config) -> 'StartRateLimiter':
+        return cls(
+            rate=config.provision_rate,
+            burst=config.provision_burst,
+            group_rates={name: g.rate for name, g in config.groups.items()},
+            rule_rates={name: r.rate for name, r in config.rules.items()},
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.global_bucket or self.group_buckets or self.rule_buckets)
+
+    def reserve(self, group: Optional[str] = None, rule: Optional[str] = None) -> float:
+        buckets = [
+            self.global_bucket,
+            self.group_buckets.get(group),
+            self.rule_buckets.get(rule),
+        ]
+        now = time.monotonic()
+        return max((b.reserve(now) for b in buckets if b), default=0.0)
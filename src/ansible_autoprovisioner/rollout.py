@@ -0,0 +1,174 @@
+import logging
+import math
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from ansible_autoprovisioner.state import InstanceStatus, PlaybookTask
+
+logger = logging.getLogger(__name__)
+
+SETTLED = (InstanceStatus.SUCCESS, InstanceStatus.PARTIAL_FAILURE, InstanceStatus.FAILED)
+
+
+def parse_limit(value: Any, total: int) -> int:
+    if value is None:
+        return max(1, total)
+    if isinstance(value, str) and value.strip().endswith("%"):
+        percent = float(value.strip()[:-1])
+        if not 0 < percent <= 100:
+            raise ValueError(f"Percentage out of range: {value}")
+        return max(1, math.ceil(total * percent / 100))
+    limit = int(value)
+    if limit < 1:
+        raise ValueError(f"Limit must be at least 1: {value}")
+    return limit
+
+
+def changed_rules(old: List[PlaybookTask], new: List[PlaybookTask]) -> List[str]:
+    previous = {t.name: t for t in old}
+    changed = []
+    for task in new:
+        before = previous.get(task.name)
+        if before is None:
+            changed.append(task.name)
+            continue
+        a, b = before.to_dict(), task.to_dict()
+        if before.revision is None:
+            a.pop("revision")
+            b.pop("revision")
+        if a != b:
+            changed.append(task.name)
+    return changed
+
+
+@dataclass
+class Rollout:
+    rule: str
+    revision: Optional[str]
+    canary: int
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    total: int = 0
+    in_flight: Set[str] = field(default_factory=set)
+    succeeded: int = 0
+    failed: int = 0
+    halted: Optional[str] = None
+    completed_at: Optional[datetime] = None
+
+    @property
+    def finished(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failed / self.finished if self.finished else 0.0
+
+    def to_dict(self):
+        return {
+            "rule": self.rule,
+            "revision": self.revision,
+            "started_at": self.started_at.isoformat(),
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "total": self.total,
+            "in_flight": len(self.in_flight),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "failure_rate": round(self.failure_rate, 3),
+            "canary": self.canary,
+            "halted": self.halted,
+        }
+
+
+class RolloutController:
+    def __init__(self, state, config):
+        self.state = state
+        self.config = config
+        self.rollouts: Dict[str, Rollout] = {}
+
+    def step(self, revisions: Dict[str, str],
+             is_active: Callable[[str], bool] = lambda instance_id: False) -> List[str]:
+        waiting: Dict[str, List] = {}
+        for inst in self.state.get_instances():
+            if inst.outdated and inst.overall_status in SETTLED and not is_active(inst.instance_id):
+                for rule in inst.outdated:
+                    waiting.setdefault(rule, []).append(inst)
+
+        for rule, rollout in list(self.rollouts.items()):
+            self._collect(rollout, is_active)
+            if rule in waiting and rollout.revision != revisions.get(rule):
+                logger.info(f"Rule {rule} changed again, restarting its rollout")
+                del self.rollouts[rule]
+            elif rule not in waiting and not rollout.in_flight and not rollout.completed_at:
+                rollout.completed_at = datetime.utcnow()
+                logger.info(
+                    f"Rollout of {rule} complete: {rollout.succeeded} ok, {rollout.failed} failed"
+                )
+
+        halted = {rule for rule, r in self.rollouts.items() if r.halted}
+        admitted = []
+        for rule in sorted(waiting):
+            rollout = self.rollouts.get(rule)
+            if rollout is None or rollout.completed_at:
+                rollout = Rollout(rule, revisions.get(rule), canary=self.config.rollout_canary)
+                self.rollouts[rule] = rollout
+                logger.info(f"Rolling out {rule} to {len(waiting[rule])} instances")
+            candidates = [
+                inst for inst in waiting[rule]
+                if inst.instance_id not in admitted and not halted.intersection(inst.outdated)
+            ]
+            rollout.total = max(
+                rollout.total, rollout.finished + len(rollout.in_flight) + len(candidates)
+            )
+            for inst in candidates[:self._capacity(rollout)]:
+                self.state.mark_final_status(inst.instance_id, InstanceStatus.PENDING)
+                rollout.in_flight.add(inst.instance_id)
+                admitted.append(inst.instance_id)
+        if admitted:
+            logger.info(f"Rollout admitted {len(admitted)} instances")
+        return admitted
+
+    def _collect(self, rollout: Rollout, is_active: Callable[[str], bool]):
+        for instance_id in list(rollout.in_flight):
+            inst = self.state.get_instance(instance_id)
+            if inst is None or inst.overall_status not in SETTLED:
+                if inst is None or inst.overall_status not in (
+                        InstanceStatus.PENDING, InstanceStatus.RUNNING):
+                    rollout.in_flight.discard(instance_id)
+                continue
+            if is_active(instance_id):
+                continue
+            rollout.in_flight.discard(instance_id)
+            if inst.overall_status == InstanceStatus.SUCCESS:
+                rollout.succeeded += 1
+            else:
+                rollout.failed += 1
+
+        threshold = self.config.rollout_max_failure_rate
+        if rollout.halted or threshold is None or not rollout.failed:
+            return
+        if rollout.finished >= max(1, rollout.canary) and rollout.failure_rate > threshold:
+            rollout.halted = (
+                f"Failure rate {rollout.failure_rate:.0%} above {threshold:.0%} "
+                f"after {rollout.finished} instances"
+            )
+            logger.error(f"Halted rollout of {rollout.rule}: {rollout.halted}")
+
+    def _capacity(self, rollout: Rollout) -> int:
+        if rollout.halted:
+            return 0
+        if rollout.finished < rollout.canary:
+            return max(0, rollout.canary - rollout.finished - len(rollout.in_flight))
+        limit = parse_limit(self.config.rollout_max_in_flight, rollout.total)
+        return max(0, limit - len(rollout.in_flight))
+
+    def resume(self, rule: str) -> bool:
+        rollout = self.rollouts.get(rule)
+        if rollout is None or not rollout.halted:
+            return False
+        logger.info(f"Resuming rollout of {rule}")
+        rollout.halted = None
+        rollout.succeeded = rollout.failed = 0
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {"rollouts": [r.to_dict() for _, r in sorted(self.rollouts.items())]}
@@ -0,0 +1,286 @@
+import bisect
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    member_id TEXT PRIMARY KEY,
+    host TEXT,
+    started_at REAL NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    instance_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leases_owner ON leases (owner);
+CREATE TABLE IF NOT EXISTS handoffs (
+    instance_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, members: Iterable[str], vnodes: int = 64):
+        self.members = sorted(set(members))
+        self._points = []
+        self._owners = []
+        for point, member in sorted(
+            (_point(f"{member}#{i}"), member)
+            for member in self.members
+            for i in range(vnodes)
+        ):
+            self._points.append(point)
+            self._owners.append(member)
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _point(key)) % len(self._points)
+        return self._owners[index]
+
+
+class ClusterMembership:
+    def __init__(self, path: str, member_id: str, ttl: float = 30):
+        self.path = path
+        self.member_id = member_id
+        self.ttl = ttl
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def heartbeat(self) -> List[str]:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO members (member_id, host, started_at, heartbeat) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(member_id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (self.member_id, socket.gethostname(), now, now),
+            )
+            conn.execute("DELETE FROM members WHERE heartbeat < ?", (now - self.ttl,))
+            conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+            rows = conn.execute("SELECT member_id FROM members ORDER BY member_id").fetchall()
+        return [r[0] for r in rows]
+
+    def acquire(self, instance_ids: Iterable[str]) -> Set[str]:
+        now = time.time()
+        held = set()
+        with self._transaction() as conn:
+            for instance_id in instance_ids:
+                cur = conn.execute(
+                    "INSERT INTO leases (instance_id, owner, expires) VALUES (?, ?, ?) "
+                    "ON CONFLICT(instance_id) DO UPDATE SET owner = excluded.owner, "
+                    "expires = excluded.expires "
+                    "WHERE leases.owner = excluded.owner OR leases.expires < ?",
+                    (instance_id, self.member_id, now + self.ttl, now),
+                )
+                if cur.rowcount:
+                    held.add(instance_id)
+        return held
+
+    def release(self, instance_ids: Iterable[str]):
+        with self._transaction() as conn:
+            conn.executemany(
+                "DELETE FROM leases WHERE instance_id = ? AND owner = ?",
+                [(i, self.member_id) for i in instance_ids],
+            )
+
+    def export(self, records: Dict[str, Dict]):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO handoffs (instance_id, data, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(instance_id) DO UPDATE SET data = excluded.data, "
+                "updated = excluded.updated",
+                [(i, json.dumps(data, default=str), now) for i, data in records.items()],
+            )
+
+    def adopt(self, instance_ids: Iterable[str]) -> Dict[str, Dict]:
+        records = {}
+        with self._transaction() as conn:
+            for instance_id in instance_ids:
+                row = conn.execute(
+                    "SELECT data FROM handoffs WHERE instance_id = ?", (instance_id,)
+                ).fetchone()
+                if row:
+                    records[instance_id] = json.loads(row[0])
+            conn.executemany(
+                "DELETE FROM handoffs WHERE instance_id = ?", [(i,) for i in records]
+            )
+        return records
+
+    def held(self) -> Set[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT instance_id FROM leases WHERE owner = ? AND expires >= ?",
+                (self.member_id, time.time()),
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def members(self) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT m.member_id, m.host, m.started_at, m.heartbeat, COUNT(l.instance_id) "
+                "FROM members m LEFT JOIN leases l ON l.owner = m.member_id "
+                "GROUP BY m.member_id ORDER BY m.member_id"
+            ).fetchall()
+        return [
+            {"member_id": r[0], "host": r[1], "started_at": r[2], "heartbeat": r[3],
+             "leases": r[4]}
+            for r in rows
+        ]
+
+    def leave(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE owner = ?", (self.member_id,))
+            conn.execute("DELETE FROM members WHERE member_id = ?", (self.member_id,))
+
+
+class ShardCoordinator:
+    def __init__(self, path: str, member_id: Optional[str] = None, ttl: float = 30,
+                 is_active: Optional[Callable[[str], bool]] = None):
+        self.member_id = member_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.membership = ClusterMembership(path, self.member_id, ttl=ttl)
+        self.ttl = ttl
+        self.is_active = is_active or (lambda instance_id: False)
+        self.ring = HashRing([self.member_id])
+        self._lock = threading.Lock()
+        self._held: Set[str] = set()
+        self._ring_changed = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config, is_active=None) -> 'ShardCoordinator':
+        return cls(config.cluster_store, member_id=config.member_id,
+                   ttl=config.member_ttl, is_active=is_active)
+
+    def start(self):
+        self.refresh()
+        self._thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._thread.start()
+        logger.info(f"Joined cluster as {self.member_id}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        try:
+            self.membership.leave()
+        except sqlite3.Error:
+            logger.exception("Cannot leave cluster")
+        logger.info(f"Left cluster as {self.member_id}")
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(max(1.0, self.ttl / 3)):
+            try:
+                self.refresh()
+                with self._lock:
+                    held = set(self._held)
+                if held:
+                    renewed = self.membership.acquire(held)
+                    lost = held - renewed
+                    if lost:
+                        logger.warning(f"Lost {len(lost)} instance leases")
+                    with self._lock:
+                        self._held -= lost
+            except sqlite3.Error:
+                logger.exception("Cluster heartbeat failed")
+
+    def refresh(self) -> bool:
+        members = self.membership.heartbeat()
+        if self.member_id not in members:
+            members.append(self.member_id)
+        with self._lock:
+            if sorted(members) == self.ring.members:
+                return False
+            logger.info(f"Cluster members changed: {', '.join(sorted(members))}")
+            self.ring = HashRing(members)
+            self._ring_changed = True
+        return True
+
+    def ring_changed(self) -> bool:
+        with self._lock:
+            changed, self._ring_changed = self._ring_changed, False
+        return changed
+
+    def assigned(self, instance_id: str) -> bool:
+        with self._lock:
+            return self.ring.owner(instance_id) == self.member_id
+
+    def claim(self, instance_ids: Iterable[str],
+              handoff: Optional[Callable[[Set[str]], None]] = None) -> Set[str]:
+        wanted = {i for i in instance_ids if self.assigned(i) or self.is_active(i)}
+        held = self.membership.acquire(wanted) if wanted else set()
+        with self._lock:
+            released = self._held - held
+            self._held = held
+        if handoff:
+            handoff(held)
+        if released:
+            self.membership.release(released)
+            logger.info(f"Released {len(released)} instances to other members")
+        return held
+
+    def export(self, records: Dict[str, Dict]):
+        if records:
+            self.membership.export(records)
+            logger.info(f"Exported {len(records)} instances to the cluster store")
+
+    def adopt(self, instance_ids: Iterable[str]) -> Dict[str, Dict]:
+        instance_ids = list(instance_ids)
+        return self.membership.adopt(instance_ids) if instance_ids else {}
+
+    def owns(self, instance_id: str) -> bool:
+        with self._lock:
+            return instance_id in self._held
+
+    def status(self) -> Dict:
+        with self._lock:
+            held = len(self._held)
+        return {
+            "member_id": self.member_id,
+            "owned": held,
+            "members": self.membership.members(),
+        }
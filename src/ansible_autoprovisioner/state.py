@@ -1,8 +1,9 @@
 import json
 import os
 import threading
+import time
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
 from typing import Dict, List, Optional, Any
 
@@ -14,6 +15,7 @@ class InstanceStatus(str, Enum):
     FAILED = "failed"
     PARTIAL_FAILURE = "partial_failure"
     ORPHANED = "orphaned"
+    CANCELLED = "cancelled"
 
 
 class PlaybookStatus(str, Enum):
@@ -21,6 +23,17 @@ class PlaybookStatus(str, Enum):
     RUNNING = "running"
     SUCCESS = "success"
     ERROR = "error"
+    SKIPPED = "skipped"
+    TIMEOUT = "timeout"
+    CANCELLED = "cancelled"
+    INTERRUPTED = "interrupted"
+
+
+FAILED_PLAYBOOK_STATUSES = (
+    PlaybookStatus.ERROR,
+    PlaybookStatus.TIMEOUT,
+    PlaybookStatus.CANCELLED,
+)
 
 
 @dataclass
@@ -34,6 +47,12 @@ class PlaybookResult:
     log_file: Optional[str] = None
     error: Optional[str] = None
     retry_count: int = 0
+    content_hash: Optional[str] = None
+    task_timings: List[Dict[str, Any]] = field(default_factory=list)
+    resources: Dict[str, float] = field(default_factory=dict)
+    queue_wait_sec: Optional[float] = None
+    pid: Optional[int] = None
+    rc_file: Optional[str] = None
 
     def to_dict(self):
         return {
@@ -46,6 +65,12 @@ class PlaybookResult:
             "log_file": self.log_file,
             "error": self.error,
             "retry_count": self.retry_count,
+            "content_hash": self.content_hash,
+            "task_timings": self.task_timings,
+            "resources": self.resources,
+            "queue_wait_sec": self.queue_wait_sec,
+            "pid": self.pid,
+            "rc_file": self.rc_file,
         }
 
     @classmethod
@@ -62,6 +87,51 @@ class PlaybookResult:
             log_file=data.get("log_file"),
             error=data.get("error"),
             retry_count=data.get("retry_count", 0),
+            content_hash=data.get("content_hash"),
+            task_timings=data.get("task_timings", []),
+            resources=data.get("resources", {}),
+            queue_wait_sec=data.get("queue_wait_sec"),
+            pid=data.get("pid"),
+            rc_file=data.get("rc_file"),
+        )
+
+
+@dataclass
+class DriftRun:
+    name: str
+    runs: int = 0
+    failures: int = 0
+    last_run_at: Optional[datetime] = None
+    last_status: Optional[PlaybookStatus] = None
+    last_error: Optional[str] = None
+    last_duration_sec: Optional[float] = None
+    changed_tasks: int = 0
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_status": self.last_status.value if self.last_status else None,
+            "last_error": self.last_error,
+            "last_duration_sec": self.last_duration_sec,
+            "changed_tasks": self.changed_tasks,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            name=data["name"],
+            runs=data.get("runs", 0),
+            failures=data.get("failures", 0),
+            last_run_at=(datetime.fromisoformat(data["last_run_at"])
+                         if data.get("last_run_at") else None),
+            last_status=(PlaybookStatus(data["last_status"])
+                         if data.get("last_status") else None),
+            last_error=data.get("last_error"),
+            last_duration_sec=data.get("last_duration_sec"),
+            changed_tasks=data.get("changed_tasks", 0),
         )
 
 
@@ -101,6 +171,9 @@ class PlaybookTask:
     key: Optional[str] = None
     jump_host: Optional[Dict[str, Any]] = None
     vars: Dict[str, Any] = field(default_factory=dict)
+    depends_on: Optional[List[str]] = None
+    timeout: Optional[int] = None
+    revision: Optional[str] = None
 
     def to_dict(self):
         return {
@@ -110,6 +183,9 @@ class PlaybookTask:
             "key": self.key,
             "jump_host": self.jump_host,
             "vars": self.vars,
+            "depends_on": self.depends_on,
+            "timeout": self.timeout,
+            "revision": self.revision,
         }
 
     @classmethod
@@ -121,6 +197,9 @@ class PlaybookTask:
             key=data.get("key"),
             jump_host=data.get("jump_host"),
             vars=data.get("vars", {}),
+            depends_on=data.get("depends_on"),
+            timeout=data.get("timeout"),
+            revision=data.get("revision"),
         )
 
 
@@ -140,6 +219,11 @@ class InstanceState:
     current_playbook: Optional[str] = None
     last_attempt_at: Optional[datetime] = None
     notified: bool = False
+    probe_failures: int = 0
+    next_probe_at: Optional[datetime] = None
+    outdated: List[str] = field(default_factory=list)
+    drift: Dict[str, DriftRun] = field(default_factory=dict)
+    orphaned_from: Optional[InstanceStatus] = None
 
     def to_dict(self):
         return {
@@ -161,6 +245,11 @@ class InstanceState:
             "last_attempt_at": (self.last_attempt_at.isoformat()
                                 if self.last_attempt_at else None),
             "notified": self.notified,
+            "probe_failures": self.probe_failures,
+            "next_probe_at": self.next_probe_at.isoformat() if self.next_probe_at else None,
+            "outdated": self.outdated,
+            "drift": {name: run.to_dict() for name, run in self.drift.items()},
+            "orphaned_from": self.orphaned_from.value if self.orphaned_from else None,
         }
 
     @classmethod
@@ -183,7 +272,15 @@ class InstanceState:
             overall_status=InstanceStatus(data.get("overall_status", InstanceStatus.PENDING)),
             current_playbook=data.get("current_playbook"),
             notified=data.get("notified", False),
+            probe_failures=data.get("probe_failures", 0),
+            outdated=data.get("outdated", []),
+            drift={
+                name: DriftRun.from_dict(run_data)
+                for name, run_data in data.get("drift", {}).items()
+            },
         )
+        if data.get("orphaned_from"):
+            instance.orphaned_from = InstanceStatus(data["orphaned_from"])
 
         if data.get("detected_at"):
             instance.detected_at = datetime.fromisoformat(data["detected_at"])
@@ -193,15 +290,23 @@ class InstanceState:
             instance.updated_at = datetime.fromisoformat(data["updated_at"])
         if data.get("last_attempt_at"):
             instance.last_attempt_at = datetime.fromisoformat(data["last_attempt_at"])
+        if data.get("next_probe_at"):
+            instance.next_probe_at = datetime.fromisoformat(data["next_probe_at"])
 
         return instance
 
 
 class StateManager:
-    def __init__(self, state_file: str = "state.json"):
+    def __init__(self, state_file: str = "state.json", flush_interval: float = 0):
         self.state_file = state_file
+        self.flush_interval = flush_interval
         self._lock = threading.RLock()
         self._instances: Dict[str, InstanceState] = {}
+        self._dirty = False
+        self._flushed_at = 0.0
+        self.writes = 0
+        self.bytes_written = 0
+        self.write_seconds = 0.0
         self.load_state()
 
     def load_state(self):
@@ -228,8 +333,37 @@ class StateManager:
                 inst.overall_status = InstanceStatus.PENDING
                 self.save_state()
 
+    def stage_update(self, instance_id, groups, playbook_tasks, changed: List[str]):
+        with self._lock:
+            inst = self.get_instance(instance_id)
+            if not inst:
+                return
+            inst.groups = groups
+            inst.playbook_tasks = playbook_tasks
+            names = {t.name for t in playbook_tasks}
+            outdated = set(inst.outdated)
+            if inst.overall_status != InstanceStatus.PENDING:
+                outdated.update(changed)
+            inst.outdated = sorted(outdated & names)
+            inst.updated_at = datetime.utcnow()
+            self.save_state()
+
     def save_state(self):
         with self._lock:
+            if (self.flush_interval > 0 and
+                    time.monotonic() - self._flushed_at < self.flush_interval):
+                self._dirty = True
+                return
+            self._write()
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._write()
+
+    def _write(self):
+        with self._lock:
+            started = time.monotonic()
             tmp_file = self.state_file + ".tmp"
             with open(tmp_file, "w") as f:
                 json.dump(
@@ -238,7 +372,12 @@ class StateManager:
                     indent=2,
                     default=str,
                 )
+                self.bytes_written += f.tell()
             os.replace(tmp_file, self.state_file)
+            self._dirty = False
+            self._flushed_at = time.monotonic()
+            self.writes += 1
+            self.write_seconds += self._flushed_at - started
 
     def detect_instance(self, instance_id: str, ip: str, detector: str = "static",
                         tags=None, groups=None, playbook_tasks=None):
@@ -275,6 +414,7 @@ class StateManager:
             if not inst or inst.overall_status == InstanceStatus.SUCCESS:
                 return
             inst.overall_status = InstanceStatus.RUNNING
+            inst.outdated = []
             inst.last_attempt_at = datetime.utcnow()
             inst.updated_at = datetime.utcnow()
             self.save_state()
@@ -293,6 +433,39 @@ class StateManager:
             inst.updated_at = datetime.utcnow()
             self.save_state()
 
+    def orphan(self, instance_id: str):
+        with self._lock:
+            inst = self._instances.get(instance_id)
+            if not inst or inst.overall_status == InstanceStatus.ORPHANED:
+                return
+            inst.orphaned_from = inst.overall_status
+            inst.overall_status = InstanceStatus.ORPHANED
+            inst.updated_at = datetime.utcnow()
+            self.save_state()
+
+    def resurrect(self, instance_id: str, ip: str, tags=None) -> Optional[InstanceStatus]:
+        with self._lock:
+            inst = self._instances.get(instance_id)
+            if not inst or inst.overall_status != InstanceStatus.ORPHANED:
+                return None
+            status = inst.orphaned_from or InstanceStatus.PENDING
+            if status == InstanceStatus.RUNNING or inst.ip_address != ip:
+                status = InstanceStatus.PENDING
+                for p in inst.playbook_results.values():
+                    p.retry_count = 0
+                    if inst.ip_address != ip:
+                        p.status = PlaybookStatus.PENDING
+                        p.content_hash = None
+                inst.notified = False
+            inst.ip_address = ip
+            if tags is not None:
+                inst.tags = dict(tags)
+            inst.overall_status = status
+            inst.orphaned_from = None
+            inst.last_seen_at = inst.updated_at = datetime.utcnow()
+            self.save_state()
+            return status
+
     def reset_playbook(self, instance_id: str, playbook_name: str):
         with self._lock:
             inst = self._instances.get(instance_id)
@@ -305,6 +478,7 @@ class StateManager:
             playbook.error = None
             playbook.completed_at = None
             playbook.duration_sec = None
+            playbook.content_hash = None
 
             if inst.overall_status in (InstanceStatus.SUCCESS,
                                        InstanceStatus.PARTIAL_FAILURE,
@@ -316,6 +490,38 @@ class StateManager:
             self.save_state()
             return True
 
+    def clear_applied(self, instance_id: str):
+        with self._lock:
+            inst = self._instances.get(instance_id)
+            if not inst:
+                return False
+            for playbook in inst.playbook_results.values():
+                playbook.content_hash = None
+                if playbook.status == PlaybookStatus.SUCCESS:
+                    playbook.status = PlaybookStatus.PENDING
+            inst.updated_at = datetime.utcnow()
+            self.save_state()
+            return True
+
+    def record_probe(self, instance_id: str, reachable: bool,
+                     backoff: float = 15, backoff_max: float = 600):
+        with self._lock:
+            inst = self._instances.get(instance_id)
+            if not inst:
+                return None
+            if reachable:
+                if not inst.probe_failures and inst.next_probe_at is None:
+                    return None
+                inst.probe_failures = 0
+                inst.next_probe_at = None
+            else:
+                inst.probe_failures += 1
+                delay = min(backoff_max, backoff * 2 ** (inst.probe_failures - 1))
+                inst.next_probe_at = datetime.utcnow() + timedelta(seconds=delay)
+            inst.updated_at = datetime.utcnow()
+            self.save_state()
+            return inst.next_probe_at
+
     def mark_notified(self, instance_id: str):
         with self._lock:
             inst = self._instances.get(instance_id)
@@ -325,7 +531,8 @@ class StateManager:
             inst.updated_at = datetime.utcnow()
             self.save_state()
 
-    def start_playbook(self, instance_id: str, name: str, file: str):
+    def start_playbook(self, instance_id: str, name: str, file: str,
+                       queue_wait_sec: Optional[float] = None):
         with self._lock:
             inst = self._instances.get(instance_id)
             if not inst:
@@ -342,10 +549,13 @@ class StateManager:
                 )
                 inst.playbook_results[name] = result
             else:
-                result.retry_count += 1
+                if result.status not in (PlaybookStatus.PENDING, PlaybookStatus.SUCCESS,
+                                         PlaybookStatus.SKIPPED, PlaybookStatus.INTERRUPTED):
+                    result.retry_count += 1
                 result.status = PlaybookStatus.RUNNING
                 result.started_at = now
             result.error = None
+            result.queue_wait_sec = queue_wait_sec
             inst.current_playbook = name
             inst.overall_status = InstanceStatus.RUNNING
             inst.last_attempt_at = now
@@ -354,18 +564,115 @@ class StateManager:
             return result
 
     def finish_playbook(self, instance_id: str, result: PlaybookResult,
-                        status: PlaybookStatus, error: Optional[str] = None):
+                        status: PlaybookStatus, error: Optional[str] = None,
+                        content_hash: Optional[str] = None,
+                        task_timings: Optional[List[Dict[str, Any]]] = None,
+                        resources: Optional[Dict[str, float]] = None):
         with self._lock:
             result.status = status
+            if task_timings is not None:
+                result.task_timings = task_timings
+            if resources is not None:
+                result.resources = resources
+            result.content_hash = content_hash if status == PlaybookStatus.SUCCESS else None
             result.completed_at = datetime.utcnow()
             result.duration_sec = (result.completed_at - result.started_at).total_seconds()
             result.error = error
+            result.pid = None
+            result.rc_file = None
             inst = self._instances.get(instance_id)
             if inst:
-                inst.current_playbook = None
+                if inst.current_playbook == result.name:
+                    inst.current_playbook = None
                 inst.updated_at = datetime.utcnow()
             self.save_state()
 
+    def checkpoint_playbook(self, instance_id: str, name: str, pid: int,
+                            rc_file: Optional[str] = None):
+        with self._lock:
+            inst = self._instances.get(instance_id)
+            if not inst or name not in inst.playbook_results:
+                return
+            result = inst.playbook_results[name]
+            result.pid = pid
+            result.rc_file = rc_file
+            self.save_state()
+
+    def interrupt_playbook(self, instance_id: str, name: str):
+        with self._lock:
+            inst = self._instances.get(instance_id)
+            if not inst or name not in inst.playbook_results:
+                return
+            result = inst.playbook_results[name]
+            result.status = PlaybookStatus.INTERRUPTED
+            result.error = "Interrupted by daemon restart"
+            result.completed_at = datetime.utcnow()
+            result.pid = None
+            result.rc_file = None
+            if inst.current_playbook == name:
+                inst.current_playbook = None
+            self.save_state()
+
+    def requeue_instance(self, instance_id: str):
+        with self._lock:
+            inst = self._instances.get(instance_id)
+            if not inst:
+                return
+            if inst.overall_status != InstanceStatus.PENDING:
+                inst.overall_status = InstanceStatus.PENDING
+                inst.notified = False
+            inst.current_playbook = None
+            inst.updated_at = datetime.utcnow()
+            self.save_state()
+
+    def record_drift(self, instance_id: str, name: str, status: PlaybookStatus,
+                     started_at: datetime, error: Optional[str] = None,
+                     changed_tasks: int = 0):
+        with self._lock:
+            inst = self._instances.get(instance_id)
+            if not inst:
+                return None
+            now = datetime.utcnow()
+            run = inst.drift.setdefault(name, DriftRun(name=name))
+            run.runs += 1
+            if status != PlaybookStatus.SUCCESS:
+                run.failures += 1
+            run.last_run_at = now
+            run.last_status = status
+            run.last_error = error
+            run.last_duration_sec = round((now - started_at).total_seconds(), 3)
+            run.changed_tasks = changed_tasks
+            result = inst.playbook_results.get(name)
+            if result:
+                result.pid = None
+                result.rc_file = None
+            self.save_state()
+            return run
+
+    def skip_playbook(self, instance_id: str, name: str, file: str, reason: str):
+        with self._lock:
+            inst = self._instances.get(instance_id)
+            if not inst:
+                return None
+            now = datetime.utcnow()
+            result = inst.playbook_results.get(name)
+            if result is None:
+                result = PlaybookResult(
+                    name=name,
+                    file=file,
+                    status=PlaybookStatus.SKIPPED,
+                    started_at=now,
+                )
+                inst.playbook_results[name] = result
+            result.status = PlaybookStatus.SKIPPED
+            result.completed_at = now
+            result.duration_sec = None
+            result.content_hash = None
+            result.error = reason
+            inst.updated_at = now
+            self.save_state()
+            return result
+
     def get_instances(self, status=None):
         instances = list(self._instances.values())
         if status is None:
@@ -381,6 +688,15 @@ class StateManager:
         with self._lock:
             return self._instances.get(instance_id)
 
+    def import_instance(self, data) -> Optional[InstanceState]:
+        with self._lock:
+            if data["instance_id"] in self._instances:
+                return None
+            inst = InstanceState.from_dict(data)
+            self._instances[inst.instance_id] = inst
+            self.save_state()
+            return inst
+
     def delete_instance(self, instance_id: str):
         with self._lock:
             if instance_id in self._instances:
@@ -0,0 +1,25 @@
+import tempfile
+from pathlib import Path
+from ansible_autoprovisioner.admission import AdmissionController
+
+def make_proc(load="0.50 0.40 0.30 1/100 1", mem_kb=2048000, files="1024 0 100000"):
+    root = Path(tempfile.mkdtemp())
+    (root / "sys" / "fs").mkdir(parents=True)
+    (root / "loadavg").write_text(load + "\n")
+    (root / "meminfo").write_text(f"MemTotal: 4096000 kB\nMemAvailable: {mem_kb} kB\n")
+    (root / "sys" / "fs" / "file-nr").write_text(files + "\n")
+    return str(root)
+
+def test_admission_disabled_by_default():
+    assert AdmissionController(proc_dir=make_proc(load="99.0 0 0 1/1 1")).check() is None
+
+def test_admission_thresholds():
+    proc = make_proc()
+    assert AdmissionController(max_load=1.0, min_available_memory_mb=1000,
+                               max_open_files=5000, proc_dir=proc).check() is None
+    assert "load" in AdmissionController(max_load=0.25, proc_dir=proc).check()
+    assert "memory" in AdmissionController(min_available_memory_mb=4000, proc_dir=proc).check()
+    assert "open files" in AdmissionController(max_open_files=100, proc_dir=proc).check()
+
+def test_admission_missing_proc():
+    assert AdmissionController(max_load=0.1, proc_dir="/nonexistent").check() is None
@@ -0,0 +1,39 @@
+import os
+import tempfile
+from ansible_autoprovisioner.state import StateManager, PlaybookStatus
+from ansible_autoprovisioner.utils.api import ApiInterface
+
+def make_state():
+    state_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False).name
+    os.remove(state_file)
+    state = StateManager(state_file=state_file)
+    for iid, cpu, rss in (("i-1", 1.5, 1000), ("i-2", 2.5, 3000)):
+        state.detect_instance(iid, "10.0.0.1")
+        res = state.start_playbook(iid, "nginx", "nginx.yml")
+        state.finish_playbook(
+            iid, res, PlaybookStatus.SUCCESS,
+            task_timings=[{"task": "apt", "duration_sec": cpu * 10}],
+            resources={"cpu_user_sec": cpu, "cpu_sys_sec": 0.5, "max_rss_kb": rss},
+        )
+    return state
+
+def test_rule_resources_aggregation():
+    state = make_state()
+    try:
+        rules = ApiInterface(state, None).get_rule_resources()["rules"]
+        assert rules["nginx"]["runs"] == 2
+        assert rules["nginx"]["max_rss_kb"] == 3000
+        assert rules["nginx"]["avg_cpu_sec"] == 2.5
+    finally:
+        os.remove(state.state_file)
+
+def test_slowest_tasks():
+    state = make_state()
+    try:
+        result = ApiInterface(state, None).get_slowest_tasks(limit=1)
+        assert len(result["slowest"]) == 1
+        assert result["slowest"][0]["instance_id"] == "i-2"
+        assert result["by_task"][0]["count"] == 2
+        assert result["by_task"][0]["max_sec"] == 25.0
+    finally:
+        os.remove(state.state_file)
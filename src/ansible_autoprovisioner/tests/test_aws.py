@@ -0,0 +1,124 @@
+import fnmatch
+import pytest
+from datetime import datetime, timedelta, timezone
+from ansible_autoprovisioner.detectors.aws import AWSDetector, plan_queries
+
+FILTER_FIELDS = {
+    "instance-state-name": lambda i: [i["State"]["Name"]],
+    "instance-id": lambda i: [i["InstanceId"]],
+    "availability-zone": lambda i: [i["Placement"]["AvailabilityZone"]],
+}
+
+def matches(inst, f):
+    if f["Name"].startswith("tag:"):
+        key = f["Name"][4:]
+        values = [t["Value"] for t in inst.get("Tags", []) if t["Key"] == key]
+    else:
+        values = FILTER_FIELDS[f["Name"]](inst)
+    return any(fnmatch.fnmatchcase(v, p) for v in values for p in f["Values"])
+
+class StubPaginator:
+    def __init__(self, client):
+        self.client = client
+    def paginate(self, Filters, PaginationConfig):
+        self.client.calls.append(Filters)
+        found = [i for i in self.client.instances if all(matches(i, f) for f in Filters)]
+        size = PaginationConfig["PageSize"]
+        for start in range(0, len(found), size):
+            self.client.pages += 1
+            yield {"Reservations": [{"Instances": found[start:start + size]}]}
+
+class StubEC2:
+    def __init__(self, instances):
+        self.instances = instances
+        self.calls = []
+        self.pages = 0
+    def get_paginator(self, name):
+        assert name == "describe_instances"
+        return StubPaginator(self)
+
+class StubSTS:
+    def get_caller_identity(self):
+        return {"Account": "111111111111"}
+    def assume_role(self, RoleArn, RoleSessionName, **kwargs):
+        return {"Credentials": {
+            "AccessKeyId": RoleArn, "SecretAccessKey": "x", "SessionToken": "y",
+            "Expiration": datetime.now(timezone.utc) + timedelta(hours=1),
+        }}
+
+class StubCloud:
+    def __init__(self, fleets):
+        self.fleets = fleets
+        self.clients = []
+    def session(self, **kwargs):
+        cloud = self
+        account = kwargs.get("aws_access_key_id", "base")
+        class Session:
+            def client(self, service, region_name=None, config=None):
+                client = StubSTS() if service == "sts" else StubEC2(
+                    cloud.fleets.get((account, region_name), [])
+                )
+                cloud.clients.append((service, account, region_name, client))
+                return client
+        return Session()
+
+def make_fleet(prefix, count, zone):
+    return [{
+        "InstanceId": f"i-{prefix}{n:04d}",
+        "PrivateIpAddress": f"10.0.{n // 250}.{n % 250}",
+        "State": {"Name": "running" if n % 10 else "stopped"},
+        "Placement": {"AvailabilityZone": zone},
+        "Tags": [{"Key": "role", "Value": "web" if n % 2 else "db"}],
+    } for n in range(count)]
+
+ROLE = "arn:aws:iam::222222222222:role/autoprovisioner"
+
+def test_plan_queries():
+    assert plan_queries([{"role": "web"}, {}], 5) == [[]]
+    assert plan_queries([{"role": "web", "env": "prod"}, {"role": "db"}], 5) == [
+        [{"Name": "tag:role", "Values": ["web"]}, {"Name": "tag:env", "Values": ["prod"]}],
+        [{"Name": "tag:role", "Values": ["db"]}],
+    ]
+    assert plan_queries([{"role": f"r{i}"} for i in range(8)], 5) == [
+        [{"Name": "tag:role", "Values": [f"r{i}" for i in range(8)]}]
+    ]
+    assert plan_queries([{"role": "[wd]*"}], 5) == [[]]
+    assert plan_queries([{"aws_az": "us-east-1a"}], 5) == [
+        [{"Name": "availability-zone", "Values": ["us-east-1a"]}]
+    ]
+
+def test_detect_paginates_regions_and_accounts():
+    cloud = StubCloud({
+        ("base", "us-east-1"): make_fleet("a", 25, "us-east-1a"),
+        ("base", "eu-west-1"): make_fleet("b", 5, "eu-west-1a"),
+        (ROLE, "us-east-1"): make_fleet("c", 12, "us-east-1b"),
+    })
+    detector = AWSDetector(
+        regions=["us-east-1", "eu-west-1"], page_size=10, session_factory=cloud.session,
+        accounts=[{"name": "main"}, {"name": "prod", "role_arn": ROLE, "regions": ["us-east-1"]}],
+    )
+    found = {i.instance_id: i for i in detector.detect()}
+    assert len(found) == 22 + 4 + 10
+    assert found["aws-i-c0001"].tags["aws_account"] == "prod"
+    assert found["aws-i-b0001"].tags["aws_region"] == "eu-west-1"
+    ec2 = {(c[1], c[2]): c[3] for c in cloud.clients if c[0] == "ec2"}
+    assert ec2[("base", "us-east-1")].pages == 3
+    detector.detect()
+    assert len([c for c in cloud.clients if c[0] == "ec2"]) == 3
+
+def test_detect_pushes_down_group_filters():
+    cloud = StubCloud({("base", "us-east-1"): make_fleet("a", 40, "us-east-1a")})
+    detector = AWSDetector(region="us-east-1", session_factory=cloud.session)
+    detector.configure_matching([{"role": "web"}])
+    found = detector.detect()
+    assert len(found) == 20 and all(i.tags["role"] == "web" for i in found)
+    client = [c[3] for c in cloud.clients if c[0] == "ec2"][0]
+    assert {"Name": "tag:role", "Values": ["web"]} in client.calls[0]
+
+def test_close_stops_pool():
+    cloud = StubCloud({("base", "us-east-1"): make_fleet("a", 5, "us-east-1a")})
+    detector = AWSDetector(region="us-east-1", session_factory=cloud.session)
+    assert detector.detect()
+    detector.close()
+    with pytest.raises(RuntimeError):
+        detector.pool.submit(print)
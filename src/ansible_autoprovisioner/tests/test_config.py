@@ -336,6 +336,31 @@ def test_complete_example():
         print("✓ Complete example passed")
     finally:
         Path(config_file).unlink()
+
+def test_rule_dependencies():
+    config_data = {
+        'rules': {
+            'base': {'playbook': 'base.yml'},
+            'app': {'playbook': 'app.yml', 'depends_on': 'base'},
+            'agent': {'playbook': 'agent.yml', 'depends_on': []}
+        },
+        'groups': {'web': {'rules': ['base', 'app', 'agent']}}
+    }
+    config_file = create_test_config(config_data)
+    try:
+        config = DaemonConfig.load(config_file)
+        assert config.rules['app'].depends_on == ['base']
+        assert config.rules['agent'].depends_on == []
+        assert config.rules['base'].depends_on is None
+        config.rules['base'].depends_on = ['app']
+        try:
+            config.validate()
+            assert False, "Expected dependency cycle error"
+        except ValueError as e:
+            assert "cycle" in str(e)
+    finally:
+        Path(config_file).unlink()
+
 if __name__ == '__main__':
     print("Testing Simplified Config - Phase 1")
     print("=" * 60)
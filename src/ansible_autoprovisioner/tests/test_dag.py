@@ -0,0 +1,22 @@
+from ansible_autoprovisioner.dag import build_dependencies, find_cycle
+from ansible_autoprovisioner.state import PlaybookTask
+
+def test_implicit_order_is_sequential():
+    tasks = [PlaybookTask("a", "a.yml", "g"), PlaybookTask("b", "b.yml", "g"), PlaybookTask("c", "c.yml", "g")]
+    assert build_dependencies(tasks) == {"a": [], "b": ["a"], "c": ["b"]}
+
+def test_explicit_dependencies():
+    tasks = [
+        PlaybookTask("base", "base.yml", "g", depends_on=[]),
+        PlaybookTask("monitoring", "mon.yml", "g", depends_on=[]),
+        PlaybookTask("app", "app.yml", "g", depends_on=["base", "unmatched"]),
+        PlaybookTask("app", "app.yml", "other", depends_on=[]),
+    ]
+    deps = build_dependencies(tasks)
+    assert deps == {"base": [], "monitoring": [], "app": ["base"]}
+
+def test_find_cycle():
+    assert find_cycle({"a": [], "b": ["a"]}) is None
+    cycle = find_cycle({"a": ["c"], "b": ["a"], "c": ["b"]})
+    assert cycle[0] == cycle[-1]
+    assert set(cycle) == {"a", "b", "c"}
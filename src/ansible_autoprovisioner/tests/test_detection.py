@@ -0,0 +1,253 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from ansible_autoprovisioner.config import DetectorConfig
+from ansible_autoprovisioner.detectors import DetectorManager, DetectorRegistry
+from ansible_autoprovisioner.notifications.registry import NotifierRegistry
+from ansible_autoprovisioner.detectors.base import (
+    STREAMING,
+    BaseDetector,
+    DetectedInstance,
+    capabilities,
+    diff_instances,
+)
+from ansible_autoprovisioner.detectors.static import StaticDetector
+from ansible_autoprovisioner.detectors.webhook import WebhookDetector
+from ansible_autoprovisioner.watch import FileWatcher
+
+def write_inventory(path, hosts):
+    with open(path, "w") as f:
+        f.write("[all]\n")
+        for ip, role in hosts.items():
+            f.write(f"{ip} role={role}\n")
+
+def test_diff_instances():
+    a = DetectedInstance("a", "10.0.0.1", "x", {})
+    b = DetectedInstance("b", "10.0.0.2", "x", {})
+    b2 = DetectedInstance("b", "10.0.0.2", "x", {"role": "web"})
+    c = DetectedInstance("c", "10.0.0.3", "x", {})
+    delta = diff_instances({"a": a, "b": b}, {"b": b2, "c": c}, "t")
+    assert delta.added == [c] and delta.modified == [b2] and delta.removed == ["a"]
+    assert not delta.full
+
+def test_static_detect_changes():
+    path = os.path.join(tempfile.mkdtemp(), "inventory.ini")
+    write_inventory(path, {"10.0.0.1": "web", "10.0.0.2": "web"})
+    detector = StaticDetector(inventory=path)
+    first = detector.detect_changes(None)
+    assert first.full and len(first.added) == 2
+    same = detector.detect_changes(first.token)
+    assert not same.full and not (same.added or same.modified or same.removed)
+    write_inventory(path, {"10.0.0.1": "db", "10.0.0.3": "web"})
+    delta = detector.detect_changes(same.token)
+    assert [i.ip_address for i in delta.added] == ["10.0.0.3"]
+    assert [i.tags["role"] for i in delta.modified] == ["db"]
+    assert delta.removed == ["static-10.0.0.2"]
+    assert detector.detect_changes("stale").full
+
+def consume(result):
+    return {inst.instance_id: changed for inst, changed in result.instances}
+
+def test_manager_polls_deltas_and_resyncs():
+    store = os.path.join(tempfile.mkdtemp(), "fleet.json")
+    manager = DetectorManager(
+        [DetectorConfig("webhook", {"port": None, "store": store})], resync_interval=3600
+    )
+    webhook = manager.detectors[0]
+    webhook.push([{"instance_id": "a", "ip_address": "10.0.0.1"},
+                  {"instance_id": "b", "ip_address": "10.0.0.2"}])
+    first = manager.poll()
+    assert first.resync and consume(first) == {"a": True, "b": True} and first.complete
+    assert consume(manager.poll()) == {}
+    webhook.push([{"instance_id": "a", "action": "remove"},
+                  {"instance_id": "b", "ip_address": "10.0.0.2", "tags": {"role": "db"}}])
+    result = manager.poll()
+    assert consume(result) == {"b": True}
+    assert not result.resync and not result.complete and result.removed == {"a"}
+    assert set(manager.known_ids()) == {"b"}
+    manager.request_resync()
+    resync = manager.poll()
+    assert resync.resync and consume(resync) == {"b": True}
+    restored = WebhookDetector(port=None, store=store)
+    assert [i.tags for i in restored.detect()] == [{"role": "db"}]
+
+class StreamingDetector(BaseDetector):
+    capabilities = frozenset({STREAMING})
+    def __init__(self, hosts, fail=False):
+        self.hosts = hosts
+        self.fail = fail
+    def iter_instances(self):
+        for name, role in self.hosts.items():
+            if self.fail:
+                raise RuntimeError("listing failed")
+            yield DetectedInstance(name, "10.0.0.1", "stream", {"role": role})
+
+class AsyncDetector(BaseDetector):
+    async def iter_instances(self):
+        for n in range(3):
+            yield DetectedInstance(f"async-{n}", f"10.1.0.{n}", "async", {})
+
+def test_manager_streams_with_generations():
+    manager = DetectorManager([])
+    stream = StreamingDetector({"a": "web", "b": "web", "x": "web"})
+    manager.detectors = [stream, StreamingDetector({"b": "db", "c": "db"})]
+    manager._tokens = [None, None]
+    manager.capabilities = [capabilities(d) for d in manager.detectors]
+    first = manager.poll()
+    assert consume(first) == {"a": True, "b": True, "x": True, "c": True}
+    assert first.complete and first.seen == 4
+    stream.hosts = {"a": "api"}
+    second = manager.poll()
+    assert consume(second) == {"a": True, "b": True, "c": False}
+    assert second.removed == {"x"} and manager.is_current("c", second.generation)
+    stream.fail = True
+    third = manager.poll()
+    assert consume(third) == {"b": False, "c": False}
+    assert not third.complete and not third.removed and "a" in manager.known_ids()
+    assert not manager.is_current("a", third.generation)
+
+def test_async_detector():
+    detector = AsyncDetector()
+    assert [i.instance_id for i in detector.detect()] == ["async-0", "async-1", "async-2"]
+
+def test_detector_must_implement_a_listing():
+    with pytest.raises(TypeError, match="Empty must implement detect"):
+        class Empty(BaseDetector):
+            pass
+
+def test_webhook_log_overflow_forces_full():
+    detector = WebhookDetector(port=None, max_log=2)
+    token = detector.detect_changes(None).token
+    for n in range(4):
+        detector.push([{"instance_id": f"h{n}", "ip_address": f"10.0.0.{n}"}])
+    delta = detector.detect_changes(token)
+    assert delta.full and len(delta.added) == 4
+    detector.push([{"instance_id": "h0", "action": "remove"}])
+    assert detector.detect_changes(delta.token).removed == ["h0"]
+
+def test_webhook_rejects_whole_batch():
+    store = os.path.join(tempfile.mkdtemp(), "fleet.json")
+    detector = WebhookDetector(port=None, store=store)
+    detector.push([{"instance_id": "a", "ip_address": "10.0.0.1"}])
+    with pytest.raises(ValueError):
+        detector.push([{"instance_id": "a", "action": "remove"},
+                       {"instance_id": "b", "ip_address": "10.0.0.2"},
+                       {"instance_id": "c"}])
+    assert [i.instance_id for i in detector.detect()] == ["a"]
+    assert list(WebhookDetector(port=None, store=store)._instances) == ["a"]
+
+def test_webhook_http():
+    detector = WebhookDetector(port=0, secret="s3cret")
+    url = f"http://127.0.0.1:{detector.server.server_address[1]}/events"
+    body = json.dumps({"events": [{"instance_id": "web1", "ip": "10.1.1.1"}]}).encode()
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(urllib.request.Request(url, data=body))
+    assert e.value.code == 401
+    request = urllib.request.Request(url, data=body,
+                                     headers={"Authorization": "Bearer s3cret"})
+    with urllib.request.urlopen(request) as resp:
+        assert resp.status == 202 and json.load(resp) == {"accepted": 1}
+    bad = urllib.request.Request(url, data=b"[{}]", headers={"Authorization": "Bearer s3cret"})
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(bad)
+    assert e.value.code == 400
+    assert [i.ip_address for i in detector.detect()] == ["10.1.1.1"]
+    detector.close()
+
+def test_static_parse_cache():
+    root = tempfile.mkdtemp()
+    path = os.path.join(root, "inventory.ini")
+    write_inventory(path, {"10.0.0.1": "web"})
+    detector = StaticDetector(inventory=path)
+    token = detector.detect_changes(None).token
+    assert detector.detect_changes(token).token == token
+    detector.detect()
+    assert detector.parses == 1
+    os.makedirs(os.path.join(root, "group_vars"))
+    with open(os.path.join(root, "group_vars", "all.yml"), "w") as f:
+        f.write("env: prod\n")
+    detector.detect()
+    assert detector.parses == 2
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_file_watcher_fires_on_change(use_inotify):
+    root = tempfile.mkdtemp()
+    path = os.path.join(root, "inventory.ini")
+    write_inventory(path, {"10.0.0.1": "web"})
+    changed = threading.Event()
+    watcher = FileWatcher([path], changed.set, poll_interval=0.05, use_inotify=use_inotify)
+    watcher.start()
+    try:
+        write_inventory(path, {"10.0.0.1": "web", "10.0.0.2": "db"})
+        assert changed.wait(5)
+    finally:
+        watcher.stop()
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_file_watcher_ignores_siblings(use_inotify):
+    root = tempfile.mkdtemp()
+    path = os.path.join(root, "inventory.ini")
+    write_inventory(path, {"10.0.0.1": "web"})
+    changed = threading.Event()
+    watcher = FileWatcher([path], changed.set, poll_interval=0.05, use_inotify=use_inotify)
+    watcher.start()
+    try:
+        for n in range(3):
+            with open(os.path.join(root, "state.json"), "w") as f:
+                f.write(json.dumps({"n": n}))
+        assert not changed.wait(0.5)
+    finally:
+        watcher.stop()
+
+def test_registry_imports_lazily():
+    code = (
+        "import sys, ansible_autoprovisioner.main, ansible_autoprovisioner.daemon\n"
+        "print(sorted(m for m in sys.modules if m.split('.')[0] in ('ansible', 'requests')))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+    assert out.stdout.strip() == "[]", out.stderr
+    assert DetectorRegistry.load("static") is StaticDetector
+    with pytest.raises(ValueError):
+        DetectorRegistry.create("missing")
+
+def test_entry_point_plugins(monkeypatch):
+    root = tempfile.mkdtemp()
+    with open(os.path.join(root, "acme_plugins.py"), "w") as f:
+        f.write(
+            "from ansible_autoprovisioner.detectors.base import DetectedInstance\n"
+            "class CMDBDetector:\n"
+            "    capabilities = ('incremental', 'streaming')\n"
+            "    def __init__(self, hosts):\n"
+            "        self.hosts = hosts\n"
+            "    def detect(self):\n"
+            "        return [DetectedInstance(h, '10.0.0.1', 'cmdb', {}) for h in self.hosts]\n"
+            "class PagerNotifier:\n"
+            "    def notify(self, instance_id, status, details=None):\n"
+            "        pass\n"
+        )
+    dist = os.path.join(root, "acme_plugins-1.0.dist-info")
+    os.makedirs(dist)
+    with open(os.path.join(dist, "METADATA"), "w") as f:
+        f.write("Metadata-Version: 2.1\nName: acme-plugins\nVersion: 1.0\n")
+    with open(os.path.join(dist, "entry_points.txt"), "w") as f:
+        f.write("[ansible_autoprovisioner.detectors]\ncmdb = acme_plugins:CMDBDetector\n"
+                "[ansible_autoprovisioner.notifiers]\npager = acme_plugins:PagerNotifier\n")
+    monkeypatch.syspath_prepend(root)
+    monkeypatch.setattr(DetectorRegistry, "_registry", dict(DetectorRegistry._registry))
+    monkeypatch.setattr(DetectorRegistry, "_discovered", False)
+    monkeypatch.setattr(NotifierRegistry, "_registry", dict(NotifierRegistry._registry))
+    monkeypatch.setattr(NotifierRegistry, "_discovered", False)
+    assert "cmdb" in DetectorRegistry.available()
+    manager = DetectorManager([DetectorConfig("cmdb", {"hosts": ["a", "b"]})])
+    assert manager.capabilities == [frozenset()]
+    assert consume(manager.poll()) == {"a": True, "b": True}
+    manager.watch(lambda: None)
+    manager.close()
+    assert NotifierRegistry.create("pager").__class__.__name__ == "PagerNotifier"
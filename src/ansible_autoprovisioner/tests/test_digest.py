@@ -0,0 +1,34 @@
+import tempfile
+from pathlib import Path
+from ansible_autoprovisioner.digest import playbook_digest, task_digest, instance_fingerprint
+
+def write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+def test_playbook_digest_follows_includes():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        write(root / "site.yml", "- hosts: all\n  roles:\n    - web\n  tasks:\n    - include_tasks: extra.yml\n")
+        write(root / "extra.yml", "- debug: msg=one\n")
+        write(root / "roles" / "web" / "tasks" / "main.yml", "- debug: msg=web\n")
+        first = playbook_digest(str(root / "site.yml"))
+        assert first == playbook_digest(str(root / "site.yml"))
+        write(root / "extra.yml", "- debug: msg=two\n")
+        second = playbook_digest(str(root / "site.yml"))
+        assert second != first
+        write(root / "roles" / "web" / "tasks" / "main.yml", "- debug: msg=changed\n")
+        assert playbook_digest(str(root / "site.yml")) != second
+
+def test_task_digest_depends_on_vars_and_inventory():
+    with tempfile.TemporaryDirectory() as tmp:
+        playbook = Path(tmp) / "site.yml"
+        write(playbook, "- hosts: all\n")
+        base = task_digest(str(playbook), {"a": 1}, "[web]\n10.0.0.1\n")
+        assert base == task_digest(str(playbook), {"a": 1}, "[web]\n10.0.0.1\n")
+        assert base != task_digest(str(playbook), {"a": 2}, "[web]\n10.0.0.1\n")
+        assert base != task_digest(str(playbook), {"a": 1}, "[web]\n10.0.0.2\n")
+
+def test_instance_fingerprint():
+    assert instance_fingerprint("10.0.0.1", {"a": "1"}) == instance_fingerprint("10.0.0.1", {"a": "1"})
+    assert instance_fingerprint("10.0.0.1", {"a": "1"}) != instance_fingerprint("10.0.0.2", {"a": "1"})
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import yaml
+from ansible_autoprovisioner.config import DaemonConfig
+from ansible_autoprovisioner.drift import DriftScheduler, next_due, phase_offset
+from ansible_autoprovisioner.fake import FakeExecutor
+from ansible_autoprovisioner.state import (
+    InstanceStatus,
+    PlaybookStatus,
+    PlaybookTask,
+    StateManager,
+)
+
+def make_state(count):
+    state = StateManager(state_file=os.path.join(tempfile.mkdtemp(), "state.json"))
+    task = PlaybookTask(name="harden", file="harden.yml", group="all")
+    for i in range(count):
+        state.detect_instance(f"i-{i}", f"10.0.0.{i}", playbook_tasks=[task])
+        result = state.start_playbook(f"i-{i}", "harden", "harden.yml")
+        state.finish_playbook(f"i-{i}", result, PlaybookStatus.SUCCESS)
+        state.mark_final_status(f"i-{i}", InstanceStatus.SUCCESS)
+    return state
+
+def test_phase_offsets_spread_over_period():
+    buckets = [0] * 10
+    for i in range(10000):
+        buckets[int(phase_offset(f"i-{i}", "harden", 3600) // 360)] += 1
+    assert min(buckets) > 850 and max(buckets) < 1150
+    assert phase_offset("i-1", "harden", 3600) == phase_offset("i-1", "harden", 3600)
+
+def test_next_due_keeps_phase_and_half_period_gap():
+    last = datetime(2024, 1, 1, 0, 0, 0)
+    due = next_due(last, 3600, 600)
+    assert due == datetime(2024, 1, 1, 0, 10, 0) + timedelta(hours=1)
+    assert next_due(datetime(2024, 1, 1, 0, 5, 0), 3600, 600) == due
+    assert next_due(due, 3600, 600) == due + timedelta(hours=1)
+
+def test_scheduler_finds_due_rules():
+    state = make_state(20)
+    config = SimpleNamespace(rules={"harden": SimpleNamespace(reapply_every=3600)})
+    scheduler = DriftScheduler(state, config)
+    now = datetime.utcnow()
+    assert scheduler.due(now) == []
+    later = scheduler.due(now + timedelta(minutes=91))
+    assert len(later) == 20 and all(t[0].name == "harden" for _, t in later)
+    partial = scheduler.due(now + timedelta(minutes=50))
+    assert 0 < len(partial) < 20
+    state.record_drift("i-0", "harden", PlaybookStatus.SUCCESS, now)
+    state.get_instance("i-0").drift["harden"].last_run_at = now + timedelta(hours=2)
+    due = {inst.instance_id for inst, _ in scheduler.due(now + timedelta(minutes=91))}
+    assert len(due) == 19 and "i-0" not in due
+
+def test_reapply_records_drift_separately():
+    state = make_state(3)
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "config.yml")
+    with open(path, "w") as f:
+        yaml.safe_dump({"daemon": {
+            "log_dir": tmp, "executor": "fake", "drift_max_in_flight": 2,
+        }}, f)
+    config = DaemonConfig.load(path)
+    executor = FakeExecutor(state, config)
+    due = [(inst, inst.playbook_tasks) for inst in state.get_instances()]
+    assert executor.reapply(due) == 2
+    deadline = time.time() + 5
+    while executor._active and time.time() < deadline:
+        time.sleep(0.05)
+    executor.pool.shutdown()
+    runs = [inst.drift.get("harden") for inst in state.get_instances()]
+    assert sum(1 for r in runs if r and r.runs == 1) == 2
+    assert all(i.overall_status == InstanceStatus.SUCCESS for i in state.get_instances())
+    assert all(i.playbook_results["harden"].retry_count == 0 for i in state.get_instances())
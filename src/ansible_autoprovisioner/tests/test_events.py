@@ -0,0 +1,25 @@
+import json
+import tempfile
+from ansible_autoprovisioner.events import callback_env, read_task_timings, CALLBACK_NAME
+
+def test_read_task_timings_sorted():
+    events = [
+        {"event": "task_start", "task": "slow"},
+        {"event": "task_end", "task": "fast", "host": "h", "status": "ok", "duration": 0.5},
+        {"event": "task_end", "task": "slow", "host": "h", "status": "ok", "changed": True, "duration": 12.0},
+        {"event": "playbook_end"},
+    ]
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.jsonl', delete=False) as f:
+        for e in events:
+            f.write(json.dumps(e) + "\n")
+        f.write("not json\n")
+    timings = read_task_timings(f.name)
+    assert [t["task"] for t in timings] == ["slow", "fast"]
+    assert timings[0]["changed"] is True
+    assert read_task_timings(f.name, limit=1)[0]["duration_sec"] == 12.0
+    assert read_task_timings(f.name + ".missing") == []
+
+def test_callback_env_keeps_existing_callbacks():
+    env = callback_env("/tmp/events.jsonl", {"ANSIBLE_CALLBACKS_ENABLED": "timer"})
+    assert env["ANSIBLE_CALLBACKS_ENABLED"] == f"{CALLBACK_NAME},timer"
+    assert env["AUTOPROVISIONER_EVENTS_FILE"] == "/tmp/events.jsonl"
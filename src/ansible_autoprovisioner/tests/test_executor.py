@@ -0,0 +1,298 @@
+import logging
+import os
+import queue
+import stat
+import tempfile
+import time
+import pytest
+import yaml
+from ansible_autoprovisioner.config import DaemonConfig
+from ansible_autoprovisioner.dag import unique_tasks
+from ansible_autoprovisioner.executor import AnsibleExecutor, PlaybookRun
+from ansible_autoprovisioner.state import (
+    InstanceStatus,
+    PlaybookStatus,
+    PlaybookTask,
+    StateManager,
+)
+
+pytestmark = pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+PLAYBOOK = """#!/bin/sh
+echo "running $1"
+case "$1" in
+  *stubborn*) trap "" TERM; sleep 30 & wait ;;
+  *slow*) sleep 30 & wait ;;
+  *fail*) exit 2 ;;
+  *chatty*) for i in 1 2 3 4 5 6 7 8 9 10; do echo "line $i"; sleep 0.2; done ;;
+esac
+echo done
+"""
+
+@pytest.fixture
+def tmp(monkeypatch):
+    root = tempfile.mkdtemp()
+    bin_dir = os.path.join(root, "bin")
+    os.makedirs(bin_dir)
+    script = os.path.join(bin_dir, "ansible-playbook")
+    with open(script, "w") as f:
+        f.write(PLAYBOOK)
+    os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", bin_dir + os.pathsep + os.environ["PATH"])
+    return root
+
+def make_executor(root, max_workers=4, **options):
+    options.update(state_file=os.path.join(root, "state.json"),
+                   log_dir=os.path.join(root, "logs"), ui=False)
+    path = os.path.join(root, "config.yml")
+    with open(path, "w") as f:
+        yaml.safe_dump({"daemon": options, "rules": [], "groups": {}}, f)
+    config = DaemonConfig.load(path)
+    state = StateManager(state_file=config.state_file)
+    executor = AnsibleExecutor(state, config, max_workers=max_workers)
+    executor.pids = {}
+    checkpoint = executor._checkpoint
+    def record(instance, task, pid, rc_file):
+        executor.pids[task.name] = pid
+        checkpoint(instance, task, pid, rc_file)
+    executor._checkpoint = record
+    return executor
+
+def add_instance(executor, instance_id, *tasks):
+    return executor.state.detect_instance(
+        instance_id, "10.0.0.1",
+        playbook_tasks=[PlaybookTask(name, f"{name}.yml", "all", **opts) for name, opts in tasks],
+    )
+
+def wait_for(predicate, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+def group_alive(pgid):
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[2]) == pgid and fields[0] != "Z":
+            return True
+    return False
+
+def result(executor, instance_id, name):
+    return executor.state.get_instance(instance_id).playbook_results[name]
+
+def log_text(executor, instance_id, name):
+    with open(os.path.join(executor.config.log_dir, instance_id, f"{name}.log")) as f:
+        return f.read()
+
+def provision(executor, inst):
+    executor.provision([inst])
+    assert wait_for(lambda: not executor.is_active(inst.instance_id))
+
+def test_timeout_terminates_process_group(tmp):
+    executor = make_executor(tmp)
+    inst = add_instance(executor, "i-1", ("slow", {"timeout": 1}))
+    provision(executor, inst)
+    run = result(executor, "i-1", "slow")
+    assert run.status == PlaybookStatus.TIMEOUT and run.error == "Timed out after 1s"
+    assert "=== TIMEOUT after 1s ===" in log_text(executor, "i-1", "slow")
+    assert not group_alive(executor.pids["slow"])
+    assert executor.state.get_instance("i-1").overall_status == InstanceStatus.FAILED
+    executor.shutdown()
+
+def test_timeout_escalates_to_sigkill(tmp, caplog):
+    executor = make_executor(tmp, playbook_kill_grace=1)
+    inst = add_instance(executor, "i-1", ("stubborn", {"timeout": 1}))
+    started = time.monotonic()
+    with caplog.at_level(logging.WARNING, logger="ansible_autoprovisioner.executor"):
+        provision(executor, inst)
+    run = result(executor, "i-1", "stubborn")
+    assert run.status == PlaybookStatus.TIMEOUT
+    assert time.monotonic() - started < 10
+    pid = executor.pids["stubborn"]
+    assert f"Killing process group {pid}" in caplog.text
+    assert not group_alive(pid)
+    executor.shutdown()
+
+def test_cancel_running(tmp):
+    executor = make_executor(tmp)
+    inst = add_instance(executor, "i-1", ("slow", {}), ("after", {}))
+    executor.provision([inst])
+    assert wait_for(lambda: executor._has_processes())
+    pid = executor.pids["slow"]
+    assert group_alive(pid)
+    assert executor.cancel("i-1")
+    assert wait_for(lambda: not executor.is_active("i-1"))
+    assert result(executor, "i-1", "slow").status == PlaybookStatus.CANCELLED
+    assert result(executor, "i-1", "after").status == PlaybookStatus.SKIPPED
+    assert "=== CANCELLED ===" in log_text(executor, "i-1", "slow")
+    assert not group_alive(pid)
+    assert executor.state.get_instance("i-1").overall_status == InstanceStatus.CANCELLED
+    assert not executor.cancel("i-1")
+    executor.shutdown()
+
+def test_cancel_queued(tmp):
+    executor = make_executor(tmp, max_workers=1)
+    first = add_instance(executor, "i-1", ("slow", {}))
+    second = add_instance(executor, "i-2", ("quick", {}))
+    executor.provision([first, second])
+    assert wait_for(lambda: executor._has_processes())
+    assert executor.cancel("i-2")
+    assert executor.cancel("i-1")
+    assert wait_for(lambda: not executor.is_active("i-1") and not executor.is_active("i-2"))
+    queued = executor.state.get_instance("i-2")
+    assert queued.overall_status == InstanceStatus.CANCELLED and not queued.playbook_results
+    assert not os.path.exists(os.path.join(executor.config.log_dir, "i-2"))
+    executor.shutdown()
+
+def test_cancel_before_tracking(tmp):
+    executor = make_executor(tmp)
+    inst = add_instance(executor, "i-1", ("slow", {}))
+    checkpoint = executor._checkpoint
+    def cancel_early(instance, task, pid, rc_file):
+        checkpoint(instance, task, pid, rc_file)
+        assert executor.cancel(instance.instance_id)
+    executor._checkpoint = cancel_early
+    started = time.monotonic()
+    provision(executor, inst)
+    run = result(executor, "i-1", "slow")
+    assert run.status == PlaybookStatus.CANCELLED and time.monotonic() - started < 10
+    assert not group_alive(executor.pids["slow"])
+    executor.shutdown()
+
+def drain(q):
+    chunks = []
+    while True:
+        try:
+            chunks.append(q.get_nowait())
+        except queue.Empty:
+            return chunks
+
+def test_output_goes_straight_to_log(tmp):
+    executor = make_executor(tmp)
+    inst = add_instance(executor, "i-1", ("quick", {}))
+    seen = []
+    executor._publish = lambda *args: seen.append(args)
+    provision(executor, inst)
+    log = log_text(executor, "i-1", "quick")
+    assert "running quick.yml" in log and "done" in log and "=== END rc=0 ===" in log
+    assert seen == []
+    executor.shutdown()
+
+def test_subscriber_taps_output(tmp):
+    executor = make_executor(tmp)
+    inst = add_instance(executor, "i-1", ("quick", {}))
+    q = executor.subscribe("i-1")
+    provision(executor, inst)
+    output = b"".join(chunk for name, chunk in drain(q) if name == "quick")
+    assert b"running quick.yml" in output and b"done" in output
+    assert "running quick.yml" in log_text(executor, "i-1", "quick")
+    executor.unsubscribe("i-1", q)
+    executor.shutdown()
+
+def test_late_subscriber_tails_log(tmp):
+    executor = make_executor(tmp)
+    inst = add_instance(executor, "i-1", ("chatty", {}))
+    executor.provision([inst])
+    assert wait_for(lambda: executor._has_processes() and
+                    "line 2" in log_text(executor, "i-1", "chatty"))
+    q = executor.subscribe("i-1")
+    assert wait_for(lambda: not executor.is_active("i-1"))
+    assert wait_for(lambda: not q.empty())
+    time.sleep(0.3)
+    output = b"".join(chunk for _, chunk in drain(q)).decode()
+    assert "line 10" in output and "line 1\n" not in output
+    executor.unsubscribe("i-1", q)
+    executor.shutdown()
+
+def scripted(executor, outcomes):
+    started = []
+    def run_playbook(instance, task):
+        started.append(task.name)
+        outcome = outcomes.get(task.name, 0)
+        if outcome == "detach":
+            return PlaybookRun(detached=True)
+        return PlaybookRun(rc=outcome)
+    executor._run_playbook = run_playbook
+    return started
+
+def test_dag_skips_dependents_of_failures(tmp):
+    executor = make_executor(tmp)
+    started = scripted(executor, {"base": 2})
+    inst = add_instance(executor, "i-1", ("base", {"depends_on": []}),
+                        ("app", {"depends_on": ["base"]}), ("monitoring", {"depends_on": []}),
+                        ("smoke", {"depends_on": ["app", "monitoring"]}))
+    provision(executor, inst)
+    results = executor.state.get_instance("i-1").playbook_results
+    assert sorted(started) == ["base", "monitoring"]
+    assert results["app"].status == results["smoke"].status == PlaybookStatus.SKIPPED
+    assert results["app"].error == "Dependency failed: base"
+    assert results["monitoring"].status == PlaybookStatus.SUCCESS
+    assert executor.state.get_instance("i-1").overall_status == InstanceStatus.PARTIAL_FAILURE
+    executor.shutdown()
+
+def test_dag_waits_for_detached_dependencies(tmp):
+    executor = make_executor(tmp)
+    started = scripted(executor, {"base": "detach"})
+    inst = add_instance(executor, "i-1", ("base", {}), ("app", {}))
+    provision(executor, inst)
+    inst = executor.state.get_instance("i-1")
+    assert started == ["base"] and "app" not in inst.playbook_results
+    assert inst.playbook_results["base"].status == PlaybookStatus.RUNNING
+    assert inst.overall_status == InstanceStatus.RUNNING
+    executor.shutdown()
+
+def test_duplicate_rule_is_logged(caplog):
+    tasks = [PlaybookTask("base", "base.yml", "web", vars={"port": 80}),
+             PlaybookTask("base", "base.yml", "db", vars={"port": 5432}),
+             PlaybookTask("base", "base.yml", "api", vars={"port": 80})]
+    with caplog.at_level(logging.WARNING, logger="ansible_autoprovisioner.dag"):
+        assert [t.group for t in unique_tasks(tasks)] == ["web"]
+    assert "Rule base matched through groups web and db" in caplog.text
+    assert "groups web and api" not in caplog.text
+
+def test_forced_rerun_keeps_retry_budget(tmp):
+    executor = make_executor(tmp, max_retries=3)
+    outcomes = {}
+    scripted(executor, outcomes)
+    inst = add_instance(executor, "i-1", ("a", {}), ("b", {}), ("c", {}))
+    provision(executor, inst)
+    assert inst.overall_status == InstanceStatus.SUCCESS
+    executor.state.clear_applied("i-1")
+    executor.state.mark_final_status("i-1", InstanceStatus.PENDING)
+    outcomes["c"] = 2
+    provision(executor, inst)
+    assert inst.overall_status == InstanceStatus.PARTIAL_FAILURE
+    assert sum(p.retry_count for p in inst.playbook_results.values()) < 3
+    outcomes["c"] = 0
+    provision(executor, inst)
+    assert inst.overall_status == InstanceStatus.SUCCESS
+    assert inst.playbook_results["c"].status == PlaybookStatus.SUCCESS
+    executor.shutdown()
+
+def test_fact_cache_prepared_once_per_instance(tmp):
+    executor = make_executor(tmp, max_parallel_playbooks=3)
+    prepared = []
+    prepare = executor.facts.prepare
+    def record_prepare(instance):
+        prepared.append(instance.instance_id)
+        return prepare(instance)
+    executor.facts.prepare = record_prepare
+    seen = []
+    build_env = executor._build_env
+    def record_env(instance, events_file):
+        env = build_env(instance, events_file)
+        seen.append(env["ANSIBLE_CACHE_PLUGIN_CONNECTION"])
+        return env
+    executor._build_env = record_env
+    inst = add_instance(executor, "i-1", ("a", {"depends_on": []}), ("b", {"depends_on": []}),
+                        ("c", {"depends_on": []}))
+    provision(executor, inst)
+    assert inst.overall_status == InstanceStatus.SUCCESS
+    assert prepared == ["i-1"] and len(seen) == 3 and len(set(seen)) == 1
+    assert os.path.isdir(seen[0])
+    executor.shutdown()
@@ -0,0 +1,29 @@
+import tempfile
+from pathlib import Path
+from ansible_autoprovisioner.facts import FactCache
+from ansible_autoprovisioner.state import InstanceState
+
+def test_fact_cache_env():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = FactCache(tmp, ttl=600)
+        inst = InstanceState(instance_id="i-1", ip_address="10.0.0.1")
+        path = cache.prepare(inst)
+        env = cache.env(inst)
+        assert env["ANSIBLE_CACHE_PLUGIN"] == "jsonfile"
+        assert env["ANSIBLE_CACHE_PLUGIN_TIMEOUT"] == "600"
+        assert Path(env["ANSIBLE_CACHE_PLUGIN_CONNECTION"]) == path and path.is_dir()
+        assert FactCache(tmp, ttl=0).env(inst) == {}
+
+def test_fact_cache_invalidation():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = FactCache(tmp, ttl=600)
+        inst = InstanceState(instance_id="i-1", ip_address="10.0.0.1")
+        path = cache.prepare(inst)
+        (path / "10.0.0.1").write_text("{}")
+        cache.prepare(inst)
+        assert (path / "10.0.0.1").exists()
+        inst.ip_address = "10.0.0.2"
+        cache.prepare(inst)
+        assert not (path / "10.0.0.1").exists()
+        cache.invalidate("i-1")
+        assert not path.exists()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+import yaml
+from ansible_autoprovisioner.config import DaemonConfig
+from ansible_autoprovisioner.daemon import ProvisioningDaemon
+from ansible_autoprovisioner.detectors.synthetic import SyntheticDetector
+from ansible_autoprovisioner.fake import FakeExecutor
+from ansible_autoprovisioner.state import InstanceStatus
+
+def make_config(detectors=None, **daemon):
+    tmp = tempfile.mkdtemp()
+    playbook = os.path.join(tmp, "site.yml")
+    with open(playbook, "w") as f:
+        f.write("- hosts: all\n  tasks: []\n")
+    daemon.update(state_file=os.path.join(tmp, "state.json"),
+                  log_dir=os.path.join(tmp, "logs"), executor="fake", ui=False)
+    path = os.path.join(tmp, "config.yml")
+    with open(path, "w") as f:
+        yaml.safe_dump({
+            "daemon": daemon,
+            "detectors": detectors or {"synthetic": {"count": 20, "seed": 1}},
+            "rules": [{"name": "site", "playbook": playbook}],
+            "groups": {"all": {"match": {}, "rules": ["site"]}},
+        }, f)
+    return DaemonConfig.load(path)
+
+def test_synthetic_churn():
+    d = SyntheticDetector(count=100, churn=0.1, tag_churn=0.2, seed=1)
+    first = {i.instance_id: i.tags["build"] for i in d.detect()}
+    second = {i.instance_id: i.tags["build"] for i in d.detect()}
+    assert len(first) == len(second) == 100
+    assert len(set(second) - set(first)) == 10
+    kept = set(first) & set(second)
+    assert any(second[i] != first[i] for i in kept)
+
+def test_fake_failure_rate():
+    config = make_config(fake_failure_rate=0.25, fake_seed=3)
+    executor = FakeExecutor(None, config)
+    failures = sum(executor.sample()[1] for _ in range(2000))
+    assert 400 < failures < 600 and executor.runs == 2000
+    executor.pool.shutdown()
+
+def test_run_once_provisions_fleet():
+    daemon = ProvisioningDaemon(make_config(fake_duration=0.01))
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        daemon.run_once()
+        statuses = {i.overall_status for i in daemon.state.get_instances()}
+        if statuses == {InstanceStatus.SUCCESS}:
+            break
+        time.sleep(0.1)
+    daemon.executor.shutdown()
+    assert len(daemon.state.get_instances()) == 20
+    assert statuses == {InstanceStatus.SUCCESS}
+    assert daemon.executor.runs == 20 and daemon.state.writes > 0
+
+def run_until_settled(daemon, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        daemon.run_once()
+        statuses = {i.overall_status for i in daemon.state.get_instances()}
+        if statuses <= {InstanceStatus.SUCCESS, InstanceStatus.ORPHANED}:
+            return
+        time.sleep(0.05)
+
+def test_orphan_debounce_and_resurrection():
+    daemon = ProvisioningDaemon(make_config(detectors={"webhook": {"port": None}},
+                                            orphan_after_misses=2))
+    webhook = daemon.detectors.detectors[0]
+    webhook.push([{"instance_id": "web-1", "ip_address": "10.0.0.1"},
+                  {"instance_id": "web-2", "ip_address": "10.0.0.2"}])
+    run_until_settled(daemon)
+    status = lambda: daemon.state.get_instance("web-1").overall_status
+    assert status() == InstanceStatus.SUCCESS and daemon.executor.runs == 2
+    webhook.push([{"instance_id": "web-1", "action": "remove"}])
+    writes = daemon.state.writes
+    daemon.run_once()
+    webhook.push([{"instance_id": "web-1", "ip_address": "10.0.0.1"}])
+    daemon.run_once()
+    assert status() == InstanceStatus.SUCCESS and daemon.state.writes == writes
+    webhook.push([{"instance_id": "web-1", "action": "remove"}])
+    daemon.run_once()
+    daemon.run_once()
+    assert status() == InstanceStatus.ORPHANED
+    webhook.push([{"instance_id": "web-1", "ip_address": "10.0.0.1"}])
+    daemon.run_once()
+    assert status() == InstanceStatus.SUCCESS and daemon.executor.runs == 2
+    webhook.push([{"instance_id": "web-1", "action": "remove"}])
+    daemon.run_once()
+    daemon.run_once()
+    webhook.push([{"instance_id": "web-1", "ip_address": "10.0.0.9"}])
+    run_until_settled(daemon)
+    daemon.executor.shutdown()
+    assert status() == InstanceStatus.SUCCESS and daemon.executor.runs == 3
+    assert daemon.state.get_instance("web-1").ip_address == "10.0.0.9"
@@ -0,0 +1,94 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from ansible_autoprovisioner.detectors.http_json import HTTPDetector, compile_path, select
+
+class Inventory(BaseHTTPRequestHandler):
+    pages = {}
+    hits = []
+    def do_GET(self):
+        url = urlparse(self.path)
+        cursor = parse_qs(url.query).get("cursor", ["0"])[0]
+        page = self.pages[url.path][cursor]
+        body = json.dumps(page["body"]).encode()
+        etag = f'"{hash(body)}"'
+        self.hits.append((url.path, cursor, self.headers.get("If-None-Match") == etag))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        if page.get("next"):
+            self.send_header("Link", f'<{page["next"]}>; rel="next"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    Inventory.pages = {}
+    Inventory.hits = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Inventory)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def host(n, role="web"):
+    return {"name": f"h{n}", "net": {"ip": f"10.0.0.{n}"}, "labels": {"role": role}}
+
+def test_paths():
+    data = {"a": [{"b": 1}, {"b": 2}], "c": {"d-e": "x"}}
+    assert select(compile_path("$.a[*].b"), data) == [1, 2]
+    assert select(compile_path("a[-1].b"), data) == [2]
+    assert select(compile_path("$['c']['d-e']"), data) == ["x"]
+    assert select(compile_path("$.c.*"), data) == ["x"]
+    assert select(compile_path("$.missing.b"), data) == []
+    with pytest.raises(ValueError):
+        compile_path("$.a[")
+
+def test_cursor_pagination_and_conditional_requests(server):
+    Inventory.pages["/hosts"] = {
+        "0": {"body": {"hosts": [host(1), host(2)], "next": "p2"}},
+        "p2": {"body": {"hosts": [host(3), {"name": "no-ip"}], "next": None}},
+    }
+    detector = HTTPDetector(
+        url=f"{server}/hosts", items="$.hosts[*]", instance_id="$.name",
+        ip_address="$.net.ip", tags_path="$.labels", tags={"name": "$.name"},
+        paginate="cursor", next_path="$.next",
+    )
+    first = detector.detect_changes(None)
+    assert first.full
+    assert sorted(i.instance_id for i in first.added) == ["http-h1", "http-h2", "http-h3"]
+    assert first.added[0].tags == {"role": "web", "name": "h1"}
+    same = detector.detect_changes(first.token)
+    assert not (same.full or same.added or same.modified or same.removed)
+    assert detector.not_modified == 2 and [h[2] for h in Inventory.hits] == [False, False, True, True]
+    Inventory.pages["/hosts"]["p2"]["body"]["hosts"] = [host(3, role="db")]
+    delta = detector.detect_changes(same.token)
+    assert [i.tags["role"] for i in delta.modified] == ["db"] and not delta.added
+    assert len(detector.detect()) == 3
+    detector.close()
+
+def test_link_header_pagination(server):
+    Inventory.pages["/list"] = {
+        "0": {"body": [host(1)], "next": "/list?cursor=2"},
+        "2": {"body": [host(2)]},
+    }
+    detector = HTTPDetector(url=f"{server}/list", instance_id="name",
+                            ip_address="net.ip", paginate="link", id_prefix="")
+    assert sorted(i.instance_id for i in detector.detect()) == ["h1", "h2"]
+    Inventory.pages["/list"]["0"]["next"] = None
+    Inventory.pages["/list"]["0"]["body"] = [host(1), host(4)]
+    assert sorted(i.instance_id for i in detector.detect()) == ["h1", "h4"]
+    detector.close()
+
+def test_invalid_pagination():
+    with pytest.raises(ValueError):
+        HTTPDetector(url="http://127.0.0.1:1/", paginate="cursor")
@@ -0,0 +1,78 @@
+import os
+import tempfile
+from ansible_autoprovisioner.inventory import (
+    InventoryCache,
+    dynamic_inventory,
+    main,
+    render_batch,
+    render_inventory,
+)
+from ansible_autoprovisioner.state import GroupInfo, InstanceStatus, PlaybookTask, StateManager
+
+def test_inventory_cache_reuse_and_gc():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = InventoryCache(tmp, ttl=60)
+        first = cache.acquire("[web]\n10.0.0.1\n")
+        second = cache.acquire("[web]\n10.0.0.1\n")
+        other = cache.acquire("[web]\n10.0.0.2\n")
+        assert first == second
+        assert first != other
+        assert first.read_text() == "[web]\n10.0.0.1\n"
+        future = first.stat().st_mtime + 120
+        assert cache.gc(now=future) == 0
+        cache.release(first)
+        cache.release(other)
+        assert cache.gc(now=future) == 1
+        assert first.exists() and not other.exists()
+        cache.release(second)
+        assert cache.gc(now=future) == 1
+        assert os.listdir(tmp) == []
+
+def test_render_inventory():
+    with tempfile.TemporaryDirectory() as tmp:
+        state = StateManager(state_file=os.path.join(tmp, "state.json"))
+        web = state.detect_instance("i-1", "10.0.0.1", tags={"env": "prod"}, groups=[GroupInfo("web")])
+        content = render_inventory(web, PlaybookTask("a", "a.yml", "web"))
+        assert content.startswith("[web]\n10.0.0.1\n\n[all:vars]\n")
+        assert "ansible_user=ubuntu" in content and "env=prod" in content
+
+def test_render_batch_groups_hosts():
+    with tempfile.TemporaryDirectory() as tmp:
+        state = StateManager(state_file=os.path.join(tmp, "state.json"))
+        web = state.detect_instance("i-1", "10.0.0.1", tags={"env": "prod"}, groups=[GroupInfo("web")])
+        db = state.detect_instance("i-2", "10.0.0.2", groups=[GroupInfo("db")])
+        content = render_batch([(web, PlaybookTask("a", "a.yml", "web")),
+                                (db, PlaybookTask("b", "b.yml", "db"))])
+        assert "[web]\n10.0.0.1 ansible_user=ubuntu" in content
+        assert "[db]\n10.0.0.2 " in content
+        assert "env=prod" in content
+
+def test_ini_inventory_from_state(capsys):
+    with tempfile.TemporaryDirectory() as tmp:
+        state_file = os.path.join(tmp, "state.json")
+        state = StateManager(state_file=state_file)
+        state.detect_instance("i-1", "10.0.0.1", groups=[GroupInfo("web"), GroupInfo("db")])
+        state.detect_instance("i-2", "10.0.0.2", groups=[GroupInfo("web")])
+        state.mark_final_status("i-2", InstanceStatus.ORPHANED)
+        state.flush()
+        assert main(["--ini", "--state-file", state_file]) == 0
+        out = capsys.readouterr().out
+        assert "[web]\n10.0.0.1 ansible_user=ubuntu" in out
+        assert "[db]\n10.0.0.1 " in out
+        assert "10.0.0.2" not in out
+
+def test_dynamic_inventory_from_state():
+    with tempfile.TemporaryDirectory() as tmp:
+        state = StateManager(state_file=os.path.join(tmp, "state.json"))
+        state.detect_instance("i-1", "10.0.0.1", tags={"env": "prod"},
+                              groups=[GroupInfo("web", vars={"ansible_user": "ec2-user"})],
+                              playbook_tasks=[PlaybookTask("a", "a.yml", "web")])
+        state.detect_instance("i-2", "10.0.0.2", groups=[GroupInfo("web")])
+        state.mark_final_status("i-2", InstanceStatus.ORPHANED)
+        inventory = dynamic_inventory(state)
+        assert inventory["web"]["hosts"] == ["10.0.0.1"]
+        hostvars = inventory["_meta"]["hostvars"]["10.0.0.1"]
+        assert hostvars["ansible_user"] == "ec2-user"
+        assert hostvars["env"] == "prod"
+        assert hostvars["autoprovisioner_instance_id"] == "i-1"
+        assert "10.0.0.2" not in inventory["_meta"]["hostvars"]
@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from ansible_autoprovisioner.jobqueue import DONE, LEASED, QUEUED, JobQueue
+from ansible_autoprovisioner.state import InstanceStatus, PlaybookStatus
+from ansible_autoprovisioner.tests.test_executor import (  # noqa: F401
+    add_instance,
+    make_executor,
+    tmp,
+    wait_for,
+)
+from ansible_autoprovisioner.worker import QueueExecutor, Worker
+
+def make_queue(**kwargs):
+    return JobQueue(os.path.join(tempfile.mkdtemp(), "jobs.db"), **kwargs)
+
+def test_job_claim_and_complete():
+    q = make_queue()
+    job_id = q.publish("i-1", "setup", {"task": {"name": "setup"}})
+    job = q.claim("w1", lease_sec=30)
+    assert job.id == job_id and job.payload == {"task": {"name": "setup"}}
+    assert job.attempts == 1
+    assert q.claim("w2", lease_sec=30) is None
+    assert q.heartbeat(job_id, "w1", 30) == "ok"
+    assert q.heartbeat(job_id, "w2", 30) == "lost"
+    assert not q.complete(job_id, "w2", {"rc": 0})
+    assert q.complete(job_id, "w1", {"rc": 0})
+    done = q.get(job_id)
+    assert done.status == DONE and done.result == {"rc": 0}
+    q.ack(job_id)
+    assert q.get(job_id) is None
+
+def test_expired_lease_is_reclaimed():
+    q = make_queue(max_attempts=2)
+    job_id = q.publish("i-1", "setup", {})
+    q.claim("w1", lease_sec=0.01)
+    time.sleep(0.05)
+    job = q.claim("w2", lease_sec=0.01)
+    assert job.id == job_id and job.worker == "w2" and job.attempts == 2
+    assert q.heartbeat(job_id, "w1", 30) == "lost"
+    time.sleep(0.05)
+    assert q.claim("w3", lease_sec=30) is None
+    assert q.get(job_id).result == {"rc": 1, "error": "Lease expired"}
+
+def test_job_cancel():
+    q = make_queue()
+    queued = q.publish("i-1", "a", {})
+    leased = q.publish("i-1", "b", {})
+    q.cancel(queued)
+    assert q.get(queued).status == DONE
+    assert q.get(queued).result["cancelled"]
+    job = q.claim("w1", lease_sec=30)
+    assert job.id == leased
+    q.cancel(leased)
+    assert q.get(leased).status == LEASED
+    assert q.heartbeat(leased, "w1", 30) == "cancel"
+    assert q.stats() == {QUEUED: 0, LEASED: 1, DONE: 1}
+    assert [j.task for j in q.find("i-1")] == ["a", "b"]
+
+def test_rollback_journal():
+    q = make_queue()
+    with sqlite3.connect(q.path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+
+def test_worker_reports_results_to_state(tmp):
+    local = make_executor(tmp, executor="queue", job_lease_sec=5)
+    local.shutdown()
+    executor = QueueExecutor(local.state, local.config)
+    worker = Worker(local.config, worker_id="w1", concurrency=1)
+    worker.poll_interval = 0.05
+    thread = threading.Thread(target=worker._loop, daemon=True)
+    thread.start()
+    try:
+        inst = add_instance(executor, "i-1", ("quick", {"depends_on": []}),
+                            ("fail", {"depends_on": []}))
+        executor.provision([inst])
+        assert wait_for(lambda: not executor.is_active("i-1"))
+    finally:
+        worker.stop()
+        thread.join(timeout=5)
+        executor.shutdown()
+    inst = executor.state.get_instance("i-1")
+    quick, fail = inst.playbook_results["quick"], inst.playbook_results["fail"]
+    assert quick.status == PlaybookStatus.SUCCESS and quick.content_hash
+    assert "cpu_user_sec" in quick.resources
+    assert fail.status == PlaybookStatus.ERROR and fail.error == "Exit 2"
+    assert inst.overall_status == InstanceStatus.PARTIAL_FAILURE
+    assert executor.queue.stats() == {QUEUED: 0, LEASED: 0, DONE: 0}
+    with open(os.path.join(local.config.log_dir, "i-1", "quick.log")) as f:
+        assert "running quick.yml" in f.read()
@@ -0,0 +1,67 @@
+import os
+import socket
+import tempfile
+import threading
+from ansible_autoprovisioner.probe import ProbeTarget, build_jump_command, probe_all
+from ansible_autoprovisioner.state import StateManager
+
+def serve(banner):
+    srv = socket.socket()
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(8)
+    def accept():
+        while True:
+            try:
+                conn, _ = srv.accept()
+            except OSError:
+                return
+            conn.sendall(banner)
+            conn.close()
+    threading.Thread(target=accept, daemon=True).start()
+    return srv
+
+def free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+def test_probe_banner():
+    ssh = serve(b"SSH-2.0-OpenSSH_9.6\r\n")
+    http = serve(b"HTTP/1.1 400 Bad Request\r\n")
+    try:
+        targets = [
+            ProbeTarget("ssh", "127.0.0.1", ssh.getsockname()[1]),
+            ProbeTarget("http", "127.0.0.1", http.getsockname()[1]),
+            ProbeTarget("closed", "127.0.0.1", free_port()),
+        ]
+        assert probe_all(targets, timeout=2) == {"ssh": True, "http": False, "closed": False}
+        assert probe_all(targets, timeout=2, banner=False)["http"] is True
+    finally:
+        ssh.close()
+        http.close()
+
+def test_build_jump_command():
+    cmd = build_jump_command({"host": "bastion", "user": "ops", "port": 2222}, "10.0.0.5", 22, "ubuntu")
+    assert cmd[-3:] == ["-p", "2222", "ops@bastion"]
+    assert "10.0.0.5:22" in cmd
+    assert build_jump_command("jump.example", "10.0.0.5", 22, "ubuntu")[-1] == "jump.example"
+
+def test_record_probe_backoff():
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    state = StateManager(state_file=path)
+    state.detect_instance("i-1", "10.0.0.1")
+    first = state.record_probe("i-1", False, backoff=10, backoff_max=25)
+    second = state.record_probe("i-1", False, backoff=10, backoff_max=25)
+    third = state.record_probe("i-1", False, backoff=10, backoff_max=25)
+    assert first < second < third
+    assert (third - second).total_seconds() < 26
+    reloaded = StateManager(state_file=path).get_instance("i-1")
+    assert reloaded.probe_failures == 3
+    assert reloaded.next_probe_at == third
+    assert state.record_probe("i-1", True) is None
+    assert state.get_instance("i-1").probe_failures == 0
+    assert all(p.retry_count == 0 for p in state.get_instance("i-1").playbook_results.values())
+    os.remove(path)
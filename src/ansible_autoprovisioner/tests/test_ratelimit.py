@@ -0,0 +1,24 @@
+import pytest
+from ansible_autoprovisioner.ratelimit import TokenBucket, StartRateLimiter
+
+def test_token_bucket_reservations():
+    bucket = TokenBucket(rate=2, burst=2)
+    now = bucket.updated
+    assert bucket.reserve(now) == 0
+    assert bucket.reserve(now) == 0
+    assert bucket.reserve(now) == pytest.approx(0.5)
+    assert bucket.reserve(now) == pytest.approx(1.0)
+    assert bucket.reserve(now + 10) == 0
+
+def test_token_bucket_rejects_bad_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+def test_start_rate_limiter_uses_slowest_bucket():
+    limiter = StartRateLimiter(rate=100, group_rates={"web": 1}, rule_rates={"nginx": None})
+    assert limiter.enabled
+    assert limiter.reserve("web", "nginx") == 0
+    assert limiter.reserve("web", "nginx") > 0.9
+    assert limiter.reserve("db", "nginx") < 0.1
+    assert not StartRateLimiter().enabled
+    assert StartRateLimiter().reserve("web", "nginx") == 0
@@ -0,0 +1,73 @@
+import os
+import tempfile
+from types import SimpleNamespace
+import pytest
+from ansible_autoprovisioner.rollout import RolloutController, changed_rules, parse_limit
+from ansible_autoprovisioner.state import InstanceStatus, PlaybookTask, StateManager
+
+def make_fleet(count, **config):
+    state = StateManager(state_file=os.path.join(tempfile.mkdtemp(), "state.json"))
+    old = [PlaybookTask(name="web", file="web.yml", group="all", revision="r1")]
+    new = [PlaybookTask(name="web", file="web.yml", group="all", revision="r2")]
+    for i in range(count):
+        state.detect_instance(f"i-{i}", f"10.0.0.{i}", playbook_tasks=old)
+        state.mark_final_status(f"i-{i}", InstanceStatus.SUCCESS)
+        state.stage_update(f"i-{i}", [], new, changed_rules(old, new))
+    settings = dict(rollout_max_in_flight="25%", rollout_canary=1, rollout_max_failure_rate=0.25)
+    settings.update(config)
+    return state, RolloutController(state, SimpleNamespace(**settings))
+
+def settle(state, ids, status=InstanceStatus.SUCCESS):
+    for instance_id in ids:
+        state.mark_running(instance_id)
+        state.mark_final_status(instance_id, status)
+
+def test_parse_limit():
+    assert parse_limit("25%", 10) == 3
+    assert parse_limit("1%", 10) == 1
+    assert parse_limit(4, 10) == 4
+    assert parse_limit(None, 10) == 10
+    with pytest.raises(ValueError):
+        parse_limit("0%", 10)
+
+def test_changed_rules():
+    a = PlaybookTask(name="web", file="web.yml", group="all", revision="r1")
+    b = PlaybookTask(name="web", file="web.yml", group="all", revision="r2")
+    c = PlaybookTask(name="db", file="db.yml", group="all")
+    legacy = PlaybookTask(name="web", file="web.yml", group="all")
+    assert changed_rules([a], [a]) == []
+    assert changed_rules([a], [b, c]) == ["web", "db"]
+    assert changed_rules([legacy], [b]) == []
+
+def test_rollout_canary_then_window():
+    state, rollouts = make_fleet(8)
+    assert state.get_instance("i-0").outdated == ["web"]
+    first = rollouts.step({"web": "r2"})
+    assert len(first) == 1
+    assert rollouts.step({"web": "r2"}) == []
+    settle(state, first)
+    assert state.get_instance(first[0]).outdated == []
+    second = rollouts.step({"web": "r2"})
+    assert len(second) == 2
+    settle(state, second)
+    while rollouts.step({"web": "r2"}):
+        settle(state, [i.instance_id for i in state.get_instances(status=InstanceStatus.PENDING)])
+    status = rollouts.status()["rollouts"][0]
+    assert status["succeeded"] == 8 and status["completed_at"] and not status["halted"]
+
+def test_rollout_halts_on_failures():
+    state, rollouts = make_fleet(6)
+    canary = rollouts.step({"web": "r2"})
+    settle(state, canary, InstanceStatus.FAILED)
+    assert rollouts.step({"web": "r2"}) == []
+    assert rollouts.status()["rollouts"][0]["halted"]
+    assert len([i for i in state.get_instances() if i.outdated]) == 5
+    assert rollouts.resume("web")
+    assert len(rollouts.step({"web": "r2"})) == 1
+
+def test_rollout_restarts_on_new_revision():
+    state, rollouts = make_fleet(4, rollout_max_failure_rate=None)
+    settle(state, rollouts.step({"web": "r2"}), InstanceStatus.FAILED)
+    assert len(rollouts.step({"web": "r2"})) == 1
+    assert len(rollouts.step({"web": "r3"})) == 1
+    assert rollouts.rollouts["web"].revision == "r3"
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import time
+from ansible_autoprovisioner.sharding import ClusterMembership, HashRing, ShardCoordinator
+
+def test_hash_ring_balance_and_stability():
+    ids = [f"i-{n}" for n in range(2000)]
+    ring = HashRing(["a", "b", "c"])
+    owners = {i: ring.owner(i) for i in ids}
+    counts = {m: list(owners.values()).count(m) for m in "abc"}
+    assert all(400 < c < 1000 for c in counts.values())
+    smaller = HashRing(["a", "b"])
+    moved = [i for i in ids if owners[i] != "c" and smaller.owner(i) != owners[i]]
+    assert moved == []
+    assert HashRing([]).owner("i-1") is None
+
+def test_leases_are_exclusive():
+    path = os.path.join(tempfile.mkdtemp(), "cluster.db")
+    a = ClusterMembership(path, "a", ttl=0.2)
+    b = ClusterMembership(path, "b", ttl=0.2)
+    assert a.acquire(["i-1", "i-2"]) == {"i-1", "i-2"}
+    assert b.acquire(["i-1", "i-3"]) == {"i-3"}
+    a.release(["i-2"])
+    assert b.acquire(["i-2"]) == {"i-2"}
+    time.sleep(0.3)
+    assert b.acquire(["i-1"]) == {"i-1"}
+    assert a.held() == set()
+
+def test_coordinators_split_and_rebalance():
+    path = os.path.join(tempfile.mkdtemp(), "cluster.db")
+    ids = [f"i-{n}" for n in range(200)]
+    a = ShardCoordinator(path, member_id="a", ttl=5)
+    b = ShardCoordinator(path, member_id="b", ttl=5)
+    a.refresh()
+    b.refresh()
+    a.refresh()
+    owned_a = a.claim(ids)
+    owned_b = b.claim(ids)
+    assert owned_a and owned_b
+    assert owned_a.isdisjoint(owned_b)
+    assert owned_a | owned_b == set(ids)
+    b.stop()
+    a.refresh()
+    assert a.claim(ids) == set(ids)
+    assert [m["member_id"] for m in a.status()["members"]] == ["a"]
+
+def test_claimed_instances_keep_applied_results():
+    from ansible_autoprovisioner.daemon import ProvisioningDaemon
+    from ansible_autoprovisioner.state import InstanceStatus
+    from ansible_autoprovisioner.tests.test_fake import make_config, run_until_settled
+    store = os.path.join(tempfile.mkdtemp(), "cluster.db")
+    a = ProvisioningDaemon(make_config(cluster_store=store, member_id="a", fake_duration=0))
+    run_until_settled(a)
+    assert len(a.state.get_instances()) == 20 and a.executor.runs == 20
+    b = ProvisioningDaemon(make_config(cluster_store=store, member_id="b", fake_duration=0))
+    try:
+        a.shards.refresh()
+        b.run_once()
+        a.run_once()
+        run_until_settled(b)
+        moved = b.state.get_instances()
+        assert moved and len(moved) + len(a.state.get_instances()) == 20
+        assert {i.overall_status for i in moved} == {InstanceStatus.SUCCESS}
+        assert all(i.playbook_results["site"].content_hash for i in moved)
+        assert b.executor.runs == 0
+    finally:
+        for daemon in (a, b):
+            daemon.executor.shutdown()
+            daemon.shards.stop()
+
+def test_ring_change_resyncs_incremental_detectors():
+    from ansible_autoprovisioner.daemon import ProvisioningDaemon
+    from ansible_autoprovisioner.tests.test_fake import make_config, run_until_settled
+    store = os.path.join(tempfile.mkdtemp(), "cluster.db")
+    events = [{"instance_id": f"i-{n}", "ip_address": f"10.0.0.{n}"} for n in range(20)]
+    daemons = [ProvisioningDaemon(make_config({"webhook": {"port": None}}, cluster_store=store,
+                                              member_id=m, member_ttl=60, fake_duration=0))
+               for m in "ab"]
+    a, b = daemons
+    try:
+        for daemon in daemons:
+            daemon.detectors.detectors[0].push(events)
+        a.shards.refresh()
+        run_until_settled(a)
+        run_until_settled(b)
+        assert b.state.get_instances()
+        assert len(a.state.get_instances()) + len(b.state.get_instances()) == 20
+        b.shards.membership.leave()
+        a.shards.refresh()
+        run_until_settled(a)
+        assert len(a.state.get_instances()) == 20
+    finally:
+        for daemon in daemons:
+            daemon.executor.shutdown()
+            daemon.shards.stop()
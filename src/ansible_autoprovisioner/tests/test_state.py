@@ -162,3 +162,66 @@ def test_state_serialization():
     finally:
         if os.path.exists(state_file):
             os.remove(state_file)
+
+def test_state_interrupted_run_keeps_retries():
+    state_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False).name
+    try:
+        state = StateManager(state_file=state_file)
+        state.detect_instance("i-1", "10.0.0.1")
+        state.start_playbook("i-1", "setup", "setup.yml")
+        state.checkpoint_playbook("i-1", "setup", 4242, "/tmp/setup.rc")
+
+        reloaded = StateManager(state_file=state_file)
+        assert reloaded.get_instance("i-1").playbook_results["setup"].pid == 4242
+        assert reloaded.get_instance("i-1").overall_status == InstanceStatus.RUNNING
+
+        reloaded.interrupt_playbook("i-1", "setup")
+        reloaded.requeue_instance("i-1")
+        inst = reloaded.get_instance("i-1")
+        assert inst.overall_status == InstanceStatus.PENDING
+        assert inst.playbook_results["setup"].status == PlaybookStatus.INTERRUPTED
+        assert inst.playbook_results["setup"].pid is None
+
+        result = reloaded.start_playbook("i-1", "setup", "setup.yml")
+        assert result.retry_count == 0
+    finally:
+        if os.path.exists(state_file):
+            os.remove(state_file)
+
+def test_state_orphan_and_resurrect():
+    state_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False).name
+    try:
+        state = StateManager(state_file=state_file)
+        state.detect_instance("i-1", "10.0.0.1")
+        result = state.start_playbook("i-1", "setup", "setup.yml")
+        state.finish_playbook("i-1", result, PlaybookStatus.ERROR, error="boom")
+        state.mark_final_status("i-1", InstanceStatus.FAILED)
+        state.orphan("i-1")
+
+        reloaded = StateManager(state_file=state_file)
+        assert reloaded.get_instance("i-1").orphaned_from == InstanceStatus.FAILED
+        assert reloaded.resurrect("i-1", "10.0.0.1") == InstanceStatus.FAILED
+        assert reloaded.resurrect("i-1", "10.0.0.1") is None
+
+        reloaded.orphan("i-1")
+        assert reloaded.resurrect("i-1", "10.0.0.2") == InstanceStatus.PENDING
+        inst = reloaded.get_instance("i-1")
+        assert inst.ip_address == "10.0.0.2" and inst.orphaned_from is None
+        assert inst.playbook_results["setup"].status == PlaybookStatus.PENDING
+        reloaded.start_playbook("i-1", "setup", "setup.yml")
+        assert inst.playbook_results["setup"].retry_count == 0
+    finally:
+        if os.path.exists(state_file):
+            os.remove(state_file)
+
+def test_flush_interval_coalesces_writes():
+    state_file = os.path.join(tempfile.mkdtemp(), "state.json")
+    state = StateManager(state_file=state_file, flush_interval=3600)
+    for n in range(5):
+        state.detect_instance(f"i-{n}", f"10.0.0.{n}")
+    assert state.writes == 1
+    assert list(StateManager(state_file=state_file)._instances) == ["i-0"]
+    state.flush()
+    state.flush()
+    assert state.writes == 2 and state.write_seconds > 0
+    assert len(StateManager(state_file=state_file).get_instances()) == 5
@@ -9,9 +9,13 @@ logger = logging.getLogger(__name__)
 
 
 class ApiInterface:
-    def __init__(self, state: StateManager, config: DaemonConfig):
+    def __init__(self, state: StateManager, config: DaemonConfig, executor=None, shards=None,
+                 rollouts=None):
         self.state = state
         self.config = config
+        self.executor = executor
+        self.shards = shards
+        self.rollouts = rollouts
 
     def get_config(self) -> Dict[str, Any]:
         return {
@@ -47,6 +51,18 @@ class ApiInterface:
             "content": content
         }
 
+    def subscribe_output(self, instance_id: str):
+        if self.executor is None or not self.state.get_instance(instance_id):
+            return None
+        return self.executor.subscribe(instance_id)
+
+    def unsubscribe_output(self, instance_id: str, subscription):
+        if self.executor is not None:
+            self.executor.unsubscribe(instance_id, subscription)
+
+    def is_provisioning(self, instance_id: str) -> bool:
+        return self.executor is not None and self.executor.is_active(instance_id)
+
     def add_instance(
         self,
         instance_id: str,
@@ -74,7 +90,7 @@ class ApiInterface:
             logger.error(f"Error adding instance {instance_id}: {e}", exc_info=True)
             return {"success": False, "error": str(e)}
 
-    def retry_instance(self, instance_id: str) -> Dict[str, Any]:
+    def retry_instance(self, instance_id: str, force: bool = False) -> Dict[str, Any]:
         try:
             instance = self.state.get_instance(instance_id)
             if not instance:
@@ -82,7 +98,8 @@ class ApiInterface:
             retryable_statuses = [
                 InstanceStatus.SUCCESS,
                 InstanceStatus.PARTIAL_FAILURE,
-                InstanceStatus.FAILED
+                InstanceStatus.FAILED,
+                InstanceStatus.CANCELLED
             ]
             if instance.overall_status not in retryable_statuses:
                 return {
@@ -92,13 +109,37 @@ class ApiInterface:
                         f"{instance.overall_status.value}"
                     ),
                 }
+            if force:
+                self.state.clear_applied(instance_id)
             self.state.mark_final_status(instance_id, InstanceStatus.PENDING)
-            logger.info(f"Retry requested for instance: {instance_id}")
-            return {"success": True, "instance_id": instance_id}
+            logger.info(f"Retry requested for instance: {instance_id} (force={force})")
+            return {"success": True, "instance_id": instance_id, "force": force}
         except Exception as e:
             logger.error(f"Error retrying instance {instance_id}: {e}", exc_info=True)
             return {"success": False, "error": str(e)}
 
+    def cancel_instance(self, instance_id: str) -> Dict[str, Any]:
+        try:
+            instance = self.state.get_instance(instance_id)
+            if not instance:
+                return {"success": False, "error": f"Instance {instance_id} not found"}
+            if instance.overall_status == InstanceStatus.PENDING:
+                self.state.mark_final_status(instance_id, InstanceStatus.CANCELLED)
+                logger.info(f"Cancelled pending instance: {instance_id}")
+                return {"success": True, "instance_id": instance_id}
+            if self.executor is None:
+                return {"success": False, "error": "Cancellation requires the running daemon"}
+            if not self.executor.cancel(instance_id):
+                return {
+                    "success": False,
+                    "error": f"Instance {instance_id} is not running",
+                }
+            logger.info(f"Cancel requested for instance: {instance_id}")
+            return {"success": True, "instance_id": instance_id}
+        except Exception as e:
+            logger.error(f"Error cancelling instance {instance_id}: {e}", exc_info=True)
+            return {"success": False, "error": str(e)}
+
     def retry_playbook(self, instance_id: str, playbook_name: str) -> Dict[str, Any]:
         try:
             instance = self.state.get_instance(instance_id)
@@ -160,6 +201,131 @@ class ApiInterface:
     def list_instances(self, status: Optional[str] = None):
         return self.state.get_instances(status=status)
 
+    def get_slowest_tasks(self, limit: int = 20) -> Dict[str, Any]:
+        samples = []
+        by_task: Dict[tuple, Dict[str, Any]] = {}
+        for inst in self.state.get_instances():
+            for result in inst.playbook_results.values():
+                for timing in result.task_timings:
+                    samples.append({
+                        **timing,
+                        "instance_id": inst.instance_id,
+                        "playbook": result.name,
+                    })
+                    key = (result.name, timing.get("task"))
+                    agg = by_task.setdefault(key, {
+                        "playbook": result.name,
+                        "task": timing.get("task"),
+                        "count": 0,
+                        "total_sec": 0.0,
+                        "max_sec": 0.0,
+                    })
+                    agg["count"] += 1
+                    agg["total_sec"] += timing["duration_sec"]
+                    agg["max_sec"] = max(agg["max_sec"], timing["duration_sec"])
+        for agg in by_task.values():
+            agg["avg_sec"] = round(agg["total_sec"] / agg["count"], 3)
+            agg["total_sec"] = round(agg["total_sec"], 3)
+        samples.sort(key=lambda t: t["duration_sec"], reverse=True)
+        return {
+            "slowest": samples[:limit],
+            "by_task": sorted(
+                by_task.values(), key=lambda a: a["avg_sec"], reverse=True
+            )[:limit],
+        }
+
+    def get_rule_resources(self) -> Dict[str, Any]:
+        rules: Dict[str, Dict[str, Any]] = {}
+        for inst in self.state.get_instances():
+            for result in inst.playbook_results.values():
+                usage = result.resources
+                if not usage:
+                    continue
+                agg = rules.setdefault(result.name, {
+                    "runs": 0,
+                    "duration_sec_total": 0.0,
+                    "cpu_user_sec_total": 0.0,
+                    "cpu_sys_sec_total": 0.0,
+                    "max_rss_kb": 0,
+                    "io_read_blocks_total": 0,
+                    "io_write_blocks_total": 0,
+                })
+                agg["runs"] += 1
+                agg["duration_sec_total"] += result.duration_sec or 0.0
+                agg["cpu_user_sec_total"] += usage.get("cpu_user_sec", 0.0)
+                agg["cpu_sys_sec_total"] += usage.get("cpu_sys_sec", 0.0)
+                agg["max_rss_kb"] = max(agg["max_rss_kb"], usage.get("max_rss_kb", 0))
+                agg["io_read_blocks_total"] += usage.get("io_read_blocks", 0)
+                agg["io_write_blocks_total"] += usage.get("io_write_blocks", 0)
+        for agg in rules.values():
+            runs = agg["runs"]
+            cpu_total = agg["cpu_user_sec_total"] + agg["cpu_sys_sec_total"]
+            agg["avg_cpu_sec"] = round(cpu_total / runs, 3)
+            agg["avg_duration_sec"] = round(agg["duration_sec_total"] / runs, 3)
+            agg["avg_cpu_utilization"] = (
+                round(cpu_total / agg["duration_sec_total"], 3)
+                if agg["duration_sec_total"] else None
+            )
+        return {"rules": rules}
+
+    def get_queue(self) -> Dict[str, Any]:
+        waits = [
+            result.queue_wait_sec
+            for inst in self.state.get_instances()
+            for result in inst.playbook_results.values()
+            if result.queue_wait_sec is not None
+        ]
+        queued = self.executor.queue_snapshot() if self.executor else []
+        result = {
+            "queued": queued,
+            "queued_count": len(queued),
+            "avg_queue_wait_sec": round(sum(waits) / len(waits), 3) if waits else None,
+            "max_queue_wait_sec": max(waits) if waits else None,
+        }
+        job_queue = getattr(self.executor, "queue", None)
+        if job_queue is not None:
+            result["jobs"] = job_queue.stats()
+        return result
+
+    def get_cluster(self) -> Dict[str, Any]:
+        if self.shards is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.shards.status()}
+
+    def get_drift(self) -> Dict[str, Any]:
+        rules: Dict[str, Dict[str, Any]] = {}
+        for inst in self.state.get_instances():
+            for name, run in inst.drift.items():
+                agg = rules.setdefault(name, {
+                    "reapply_every": getattr(self.config.rules.get(name), "reapply_every", None),
+                    "instances": 0,
+                    "runs": 0,
+                    "failures": 0,
+                    "drifted": 0,
+                    "last_run_at": None,
+                })
+                agg["instances"] += 1
+                agg["runs"] += run.runs
+                agg["failures"] += run.failures
+                if run.changed_tasks:
+                    agg["drifted"] += 1
+                if run.last_run_at:
+                    last = run.last_run_at.isoformat()
+                    agg["last_run_at"] = max(agg["last_run_at"] or last, last)
+        return {"rules": rules}
+
+    def get_rollouts(self) -> Dict[str, Any]:
+        if self.rollouts is None:
+            return {"rollouts": []}
+        return self.rollouts.status()
+
+    def resume_rollout(self, rule: str) -> Dict[str, Any]:
+        if self.rollouts is None:
+            return {"success": False, "error": "Rollouts require the running daemon"}
+        if not self.rollouts.resume(rule):
+            return {"success": False, "error": f"No halted rollout for rule {rule}"}
+        return {"success": True, "rule": rule}
+
     def get_stats(self) -> Dict[str, Any]:
         instances = self.state.get_instances()
         status_counts = {s.value: 0 for s in InstanceStatus}
@@ -173,4 +339,5 @@ class ApiInterface:
             "running": status_counts.get(InstanceStatus.RUNNING.value, 0),
             "pending": status_counts.get(InstanceStatus.PENDING.value, 0),
             "orphaned": status_counts.get(InstanceStatus.ORPHANED.value, 0),
+            "cancelled": status_counts.get(InstanceStatus.CANCELLED.value, 0),
         }
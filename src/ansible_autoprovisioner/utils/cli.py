@@ -12,6 +12,10 @@ from .api import ApiInterface
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Ansible Auto-Provisioner Daemon")
+    parser.add_argument(
+        "mode", nargs="?", choices=["daemon", "worker"], default="daemon",
+        help="Run the scheduler daemon (default) or a job queue worker"
+    )
     parser.add_argument("--config", required=True, help="Path to config YAML file")
     parser.add_argument("--state-file", help="Override state file path")
     parser.add_argument("--log-dir", help="Override log directory")
@@ -21,6 +25,8 @@ def parse_arguments():
     parser.add_argument(
         "--dry-run", action="store_true", help="Validate config and exit"
     )
+    parser.add_argument("--worker-id", help="Worker name (default: <hostname>-<pid>)")
+    parser.add_argument("--concurrency", type=int, help="Jobs a worker runs at once")
     parser.add_argument("-v", "--verbose", action="store_true", help="Verbose logging")
     return parser.parse_args()
 
@@ -67,6 +73,9 @@ def create_cli_parser() -> argparse.ArgumentParser:
     retry_parser = subparsers.add_parser('retry', help='Retry provisioning')
     retry_parser.add_argument('--config', required=True, help='Path to configuration file')
     retry_parser.add_argument('instance_id', help='Instance ID')
+    retry_parser.add_argument(
+        '--force', action='store_true', help='Re-run playbooks even if already applied'
+    )
 
     delete_parser = subparsers.add_parser('delete', help='Delete instance')
     delete_parser.add_argument('--config', required=True, help='Path to configuration file')
@@ -172,7 +181,7 @@ def main():
                 print(yaml.dump(result, default_flow_style=False))
 
         elif args.command == 'retry':
-            result = api.retry_instance(args.instance_id)
+            result = api.retry_instance(args.instance_id, force=args.force)
             if result['success']:
                 print(f"✓ Retry requested for {args.instance_id}")
             else:
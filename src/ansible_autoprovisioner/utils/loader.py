@@ -0,0 +1,37 @@
+import importlib
+import logging
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+def import_object(path: str) -> Any:
+    module_name, sep, attr = path.partition(":")
+    if not sep:
+        module_name, _, attr = path.rpartition(".")
+    if not module_name or not attr:
+        raise ValueError(f"Invalid import path: {path}")
+    obj = importlib.import_module(module_name)
+    for part in attr.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+def entry_points(group: str) -> Dict[str, Any]:
+    from importlib import metadata
+    try:
+        found = metadata.entry_points(group=group)
+    except TypeError:
+        found = metadata.entry_points().get(group, [])
+    except Exception:
+        logger.exception(f"Cannot read entry points for {group}")
+        return {}
+    return {ep.name: ep for ep in found}
+
+
+def resolve(target: Any) -> Any:
+    if isinstance(target, str):
+        return import_object(target)
+    if hasattr(target, "load") and hasattr(target, "group"):
+        return target.load()
+    return target
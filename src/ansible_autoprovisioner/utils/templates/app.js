@@ -543,6 +543,7 @@ function getPlaybookStatusIcon(status) {
         'running': 'fa-sync fa-spin',
         'pending': 'fa-clock',
         'timeout': 'fa-hourglass-end',
+        'interrupted': 'fa-pause-circle',
         'unknown': 'fa-question-circle'
     };
     return icons[status] || 'fa-file-alt';
@@ -1,8 +1,9 @@
 import json
 import logging
+import queue
 import threading
 from datetime import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from pathlib import Path
 from typing import Dict, Any, Optional
 from urllib.parse import unquote, parse_qs, urlparse
@@ -28,6 +29,18 @@ class UIRequestHandler(BaseHTTPRequestHandler):
             return self.serve_stats_json()
         if path == "/api/instances":
             return self.serve_instances_json(parsed.query)
+        if path == "/api/queue":
+            return self.send_json(self.mgmt.get_queue())
+        if path == "/api/cluster":
+            return self.send_json(self.mgmt.get_cluster())
+        if path == "/api/drift":
+            return self.send_json(self.mgmt.get_drift())
+        if path == "/api/rollouts":
+            return self.send_json(self.mgmt.get_rollouts())
+        if path == "/api/resources":
+            return self.send_json(self.mgmt.get_rule_resources())
+        if path == "/api/tasks/slowest":
+            return self.serve_slowest_tasks(parsed.query)
         if path.startswith("/api/instance/"):
             parts = path.split("/")
             if len(parts) < 4:
@@ -35,6 +48,8 @@ class UIRequestHandler(BaseHTTPRequestHandler):
             instance_id = parts[3]
             if len(parts) == 4:
                 return self.serve_instance_details(instance_id)
+            if len(parts) == 5 and parts[4] == "stream":
+                return self.serve_instance_stream(instance_id)
             if len(parts) >= 5 and parts[4] == "logs":
                 if len(parts) == 5:
                     return self.serve_instance_logs(instance_id, playbook=None)
@@ -49,6 +64,12 @@ class UIRequestHandler(BaseHTTPRequestHandler):
         if path == "/api/instances":
             data = self._read_json()
             return self.handle_add_instance(data)
+        if path.startswith("/api/rollouts/"):
+            parts = path.split("/")
+            if len(parts) == 5 and parts[4] == "resume":
+                result = self.mgmt.resume_rollout(unquote(parts[3]))
+                return self.send_json(result, status=200 if result.get("success") else 400)
+            return self.send_error(404)
         if path.startswith("/api/instance/"):
             parts = path.split("/")
             if len(parts) < 5:
@@ -56,10 +77,12 @@ class UIRequestHandler(BaseHTTPRequestHandler):
             instance_id = parts[3]
             action = parts[4]
             if action == "retry":
-                return self.handle_retry(instance_id)
+                return self.handle_retry(instance_id, parsed.query)
             if action == "playbook" and len(parts) >= 7 and parts[6] == "retry":
                 playbook_name = unquote(parts[5])
                 return self.handle_playbook_retry(instance_id, playbook_name)
+            if action == "cancel":
+                return self.handle_cancel(instance_id)
             if action == "delete":
                 return self.handle_delete(instance_id, parsed.query)
             return self.send_error(404)
@@ -95,8 +118,14 @@ class UIRequestHandler(BaseHTTPRequestHandler):
         )
         self.send_json(result, status=200 if result.get("success") else 400)
 
-    def handle_retry(self, instance_id: str):
-        result = self.mgmt.retry_instance(instance_id)
+    def handle_retry(self, instance_id: str, query: str):
+        params = parse_qs(query or "")
+        force = params.get("force", ["false"])[0].lower() == "true"
+        result = self.mgmt.retry_instance(instance_id, force=force)
+        self.send_json(result, status=200 if result.get("success") else 400)
+
+    def handle_cancel(self, instance_id: str):
+        result = self.mgmt.cancel_instance(instance_id)
         self.send_json(result, status=200 if result.get("success") else 400)
 
     def handle_playbook_retry(self, instance_id: str, playbook_name: str):
@@ -123,6 +152,14 @@ class UIRequestHandler(BaseHTTPRequestHandler):
         stats = self.mgmt.get_stats()
         self.send_json(stats)
 
+    def serve_slowest_tasks(self, query: str):
+        params = parse_qs(query or "")
+        try:
+            limit = int(params.get("limit", ["20"])[0])
+        except ValueError:
+            return self.send_error(400, "Bad limit")
+        self.send_json(self.mgmt.get_slowest_tasks(limit=limit))
+
     def serve_config_json(self):
         cfg = self.mgmt.get_config()
         self.send_json(cfg)
@@ -138,6 +175,30 @@ class UIRequestHandler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(result.get("content", "").encode("utf-8", errors="ignore"))
 
+    def serve_instance_stream(self, instance_id: str):
+        subscription = self.mgmt.subscribe_output(instance_id)
+        if subscription is None:
+            return self.send_error(404, "Streaming not available")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            idle = 0
+            while idle < 30:
+                try:
+                    _, chunk = subscription.get(timeout=1)
+                except queue.Empty:
+                    idle = 0 if self.mgmt.is_provisioning(instance_id) else idle + 1
+                    continue
+                idle = 0
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.mgmt.unsubscribe_output(instance_id, subscription)
+
     def serve_dashboard(self):
         html = self.load_template("dashboard.html")
         self.send_response(200)
@@ -181,7 +242,8 @@ class UIRequestHandler(BaseHTTPRequestHandler):
 
 class UIServer:
     def __init__(self, management, host: str = "0.0.0.0", port: int = 8080):
-        self.server = HTTPServer((host, port), UIRequestHandler)
+        self.server = ThreadingHTTPServer((host, port), UIRequestHandler)
+        self.server.daemon_threads = True
         self.server.management = management
         self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
 
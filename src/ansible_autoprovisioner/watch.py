@@ -0,0 +1,147 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT = struct.Struct("iIII")
+
+
+def tree_files(paths: Iterable[Path]) -> List[Path]:
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.append(path)
+            files.extend(sorted(path.rglob("*")))
+        elif path.exists():
+            files.append(path)
+    return files
+
+
+def fingerprint(paths: Iterable[Path]) -> Tuple:
+    result = []
+    for path in tree_files(paths):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        result.append((str(path), st.st_mtime_ns, st.st_size))
+    return tuple(result)
+
+
+def _libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class FileWatcher:
+    def __init__(self, paths: Iterable[Path], callback: Callable[[], None],
+                 poll_interval: float = 5.0, use_inotify: bool = True):
+        self.paths = [Path(p) for p in paths]
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._libc = _libc() if use_inotify else None
+        self._fd = -1
+        self._watched = set()
+        self._last: Tuple = ()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._fd >= 0 else "polling"
+
+    def start(self):
+        if self._libc:
+            fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                logger.warning(
+                    f"inotify unavailable ({os.strerror(ctypes.get_errno())}), polling instead"
+                )
+            else:
+                self._fd = fd
+                self._add_watches()
+        self._last = fingerprint(self.paths)
+        target = self._run_inotify if self._fd >= 0 else self._run_polling
+        self._thread = threading.Thread(target=target, name="file-watch", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {len(self.paths)} paths ({self.mode})")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval + 1)
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _add_watches(self):
+        dirs = {p if p.is_dir() else p.parent for p in self.paths}
+        dirs.update(p for p in tree_files(self.paths) if p.is_dir())
+        for directory in dirs - self._watched:
+            wd = self._libc.inotify_add_watch(
+                self._fd, str(directory).encode(), WATCH_MASK
+            )
+            if wd >= 0:
+                self._watched.add(directory)
+
+    def _run_inotify(self):
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._fd], [], [], 1.0)
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                continue
+            offset, mask = 0, 0
+            while offset + EVENT.size <= len(data):
+                _, event_mask, _, length = EVENT.unpack_from(data, offset)
+                mask |= event_mask
+                offset += EVENT.size + length
+            if mask & (IN_CREATE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF):
+                self._watched.clear()
+                self._add_watches()
+            current = fingerprint(self.paths)
+            if current != self._last:
+                self._last = current
+                self._fire()
+
+    def _run_polling(self):
+        while not self._stop.wait(self.poll_interval):
+            current = fingerprint(self.paths)
+            if current != self._last:
+                self._last = current
+                self._fire()
+
+    def _fire(self):
+        try:
+            self.callback()
+        except Exception:
+            logger.exception("File watch callback failed")
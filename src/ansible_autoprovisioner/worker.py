@@ -0,0 +1,267 @@
+import logging
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from ansible_autoprovisioner.config import DaemonConfig
+from ansible_autoprovisioner.executor import AnsibleExecutor, PlaybookRun
+from ansible_autoprovisioner.jobqueue import DONE, QUEUED, JobQueue
+from ansible_autoprovisioner.state import (
+    InstanceState,
+    InstanceStatus,
+    PlaybookStatus,
+    PlaybookTask,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class QueueExecutor(AnsibleExecutor):
+    def __init__(self, state, config: DaemonConfig):
+        super().__init__(state, config, max_workers=config.queue_max_in_flight)
+        self.queue = JobQueue(config.get_job_queue_path(), max_attempts=config.job_max_attempts)
+        self._jobs = set()
+
+    def _run_playbook(self, instance, task) -> PlaybookRun:
+        run = PlaybookRun(timeout=task.timeout or self.config.playbook_timeout or None)
+        try:
+            job_id = self.queue.publish(
+                instance.instance_id,
+                task.name,
+                {"instance": instance.to_dict(), "task": task.to_dict()},
+            )
+        except sqlite3.Error:
+            logger.exception(f"Cannot queue {task.name} for {instance.instance_id}")
+            run.rc = 1
+            return run
+        logger.info(f"Queued job {job_id}: {task.name} on {instance.instance_id}")
+        return self._await_job(instance.instance_id, job_id, run)
+
+    def _await_job(self, instance_id: str, job_id: int, run: PlaybookRun) -> PlaybookRun:
+        with self._lock:
+            self._jobs.add(job_id)
+        since = time.monotonic()
+        task_name = None
+        try:
+            deadline = None
+            while True:
+                job = self.queue.get(job_id)
+                if job is None:
+                    run.rc = 1
+                    return run
+                task_name = job.task
+                if job.status == DONE:
+                    break
+                if job.status == QUEUED:
+                    self._set_queued(instance_id, task_name, since, "job_queue")
+                else:
+                    self._set_queued(instance_id, task_name, None)
+                if self._detaching.is_set():
+                    run.detached = True
+                    return run
+                with self._lock:
+                    cancel_status = self._cancelled.get(instance_id)
+                if cancel_status is not None and deadline is None:
+                    if cancel_status == InstanceStatus.PENDING:
+                        run.interrupted = True
+                    else:
+                        run.cancelled = True
+                    self.queue.cancel(job_id)
+                    deadline = (time.monotonic() + self.config.job_lease_sec +
+                                self.config.playbook_kill_grace)
+                if deadline is not None and time.monotonic() > deadline:
+                    logger.warning(f"Gave up waiting for cancelled job {job_id}")
+                    run.rc = 1
+                    return run
+                self._detaching.wait(0.5)
+
+            result = job.result or {}
+            if result.get("error"):
+                logger.warning(f"Job {job_id} failed: {result['error']}")
+            run.rc = result.get("rc", 1)
+            run.timed_out = bool(result.get("timed_out"))
+            if result.get("cancelled") and not run.interrupted:
+                run.cancelled = True
+            run.resources = result.get("resources") or {}
+            run.task_timings = result.get("task_timings") or []
+            self.queue.ack(job_id)
+            return run
+        finally:
+            with self._lock:
+                self._jobs.discard(job_id)
+            if task_name:
+                self._set_queued(instance_id, task_name, None)
+
+    def _checkpoint(self, instance, task, pid: int, rc_file: Optional[str]):
+        pass
+
+    def _has_processes(self) -> bool:
+        with self._lock:
+            return bool(self._jobs)
+
+    def _recover_instance(self, inst):
+        jobs = {job.task: job for job in self.queue.find(inst.instance_id)}
+        tasks = {t.name: t for t in inst.playbook_tasks}
+        adopted = []
+        for name, job in jobs.items():
+            result = inst.playbook_results.get(name)
+            if name in tasks and result and result.status == PlaybookStatus.RUNNING:
+                adopted.append((tasks[name], result, job.id))
+            else:
+                self.queue.cancel(job.id)
+                self.queue.ack(job.id)
+        if not adopted:
+            super()._recover_instance(inst)
+            return
+        logger.info(f"Adopting {len(adopted)} queued jobs on {inst.instance_id}")
+        with self._lock:
+            self._active.add(inst.instance_id)
+        self.pool.submit(self._watch_jobs, inst, adopted)
+
+    def _watch_jobs(self, instance, adopted: list):
+        status = InstanceStatus.PENDING
+        try:
+            for task, result, job_id in adopted:
+                run = self._await_job(instance.instance_id, job_id, PlaybookRun())
+                if run.detached:
+                    status = InstanceStatus.RUNNING
+                    continue
+                outcome, error = self._outcome(run)
+                self.state.finish_playbook(
+                    instance.instance_id,
+                    result,
+                    outcome,
+                    error=error,
+                    content_hash=self._task_digest(instance, task),
+                    task_timings=run.task_timings,
+                    resources=run.resources,
+                )
+        except Exception:
+            logger.exception(f"Error watching jobs on {instance.instance_id}")
+        self._finish_instance(instance.instance_id, status)
+
+
+class JobRunner(AnsibleExecutor):
+    def _checkpoint(self, instance, task, pid: int, rc_file: Optional[str]):
+        pass
+
+    def run_job(self, instance, task) -> PlaybookRun:
+        run = self._run_playbook(instance, task)
+        run.task_timings = self._task_timings(run)
+        return run
+
+    def stop_task(self, instance_id: str, name: str) -> bool:
+        with self._lock:
+            entry = self._processes.get(instance_id, {}).get(name)
+        if not entry:
+            return False
+        process, run = entry
+        run.cancelled = True
+        self._terminate(process, run)
+        return True
+
+    def stop_all(self):
+        with self._lock:
+            entries = [
+                (instance_id, name)
+                for instance_id, processes in self._processes.items()
+                for name in processes
+            ]
+        for instance_id, name in entries:
+            self.stop_task(instance_id, name)
+
+
+class Worker:
+    def __init__(self, config: DaemonConfig, worker_id: Optional[str] = None,
+                 concurrency: Optional[int] = None):
+        self.config = config
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = max(1, concurrency or config.worker_concurrency)
+        self.queue = JobQueue(config.get_job_queue_path(), max_attempts=config.job_max_attempts)
+        self.runner = JobRunner(None, config, max_workers=1)
+        self.poll_interval = 1.0
+        self._stop = threading.Event()
+
+    def _signal_handler(self, s, f):
+        if self._stop.is_set():
+            logger.info(f"Signal {s}, stopping running jobs")
+            self.runner.stop_all()
+            return
+        logger.info(f"Signal {s}, finishing running jobs")
+        self._stop.set()
+
+    def run(self):
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+        logger.info(f"Worker {self.worker_id} started ({self.concurrency} slots)")
+        threads = [
+            threading.Thread(target=self._loop, name=f"worker-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for t in threads:
+            t.start()
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=1.0)
+        self.runner.pool.shutdown(wait=False)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(self.worker_id, self.config.job_lease_sec)
+            except sqlite3.Error:
+                logger.exception("Cannot claim job")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            try:
+                self.process(job)
+            except Exception:
+                logger.exception(f"Error running job {job.id}")
+
+    def process(self, job) -> Dict[str, Any]:
+        instance = InstanceState.from_dict(job.payload["instance"])
+        task = PlaybookTask.from_dict(job.payload["task"])
+        logger.info(f"Running job {job.id}: {task.name} on {instance.instance_id}")
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job, instance, task, done), daemon=True
+        )
+        heartbeat.start()
+        try:
+            run = self.runner.run_job(instance, task)
+        finally:
+            done.set()
+            heartbeat.join()
+        result = {
+            "rc": run.rc,
+            "timed_out": run.timed_out,
+            "cancelled": run.cancelled,
+            "resources": run.resources,
+            "task_timings": run.task_timings,
+            "worker": self.worker_id,
+        }
+        if not self.queue.complete(job.id, self.worker_id, result):
+            logger.warning(f"Lost lease on job {job.id}, result dropped")
+        return result
+
+    def _heartbeat(self, job, instance, task, done: threading.Event):
+        interval = max(1.0, self.config.job_lease_sec / 3)
+        while not done.wait(interval):
+            try:
+                status = self.queue.heartbeat(job.id, self.worker_id, self.config.job_lease_sec)
+            except sqlite3.Error:
+                logger.exception(f"Heartbeat failed for job {job.id}")
+                continue
+            if status != "ok":
+                logger.warning(f"Stopping job {job.id}: {status}")
+                self.runner.stop_task(instance.instance_id, task.name)